@@ -0,0 +1,582 @@
+"""In-process fake GitLab REST API for offline benchmarks"""
+
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from typing_extensions import Any, Optional, Self
+
+Response = tuple[int, Any, dict[str, str]]
+
+
+class FakeGitLabState:
+    """
+    Groups, projects, variables and protected branches of the fake instance,
+    plus a counter of served requests by endpoint template.
+    """
+
+    def __init__(self: Self) -> None:
+        self.lock = threading.Lock()
+        self.groups: dict[int, dict[str, Any]] = {}
+        self.projects: dict[int, dict[str, Any]] = {}
+        self.variables: dict[tuple[str, int], dict[tuple[str, str], dict[str, Any]]] = (
+            {}
+        )
+        self.protected_branches: dict[tuple[str, int], dict[str, dict[str, Any]]] = {}
+        self.requests: Counter[str] = Counter()
+        self._last_id = 1
+
+    def next_id(self: Self) -> int:
+        self._last_id += 1
+        return self._last_id
+
+    def add_group(self: Self, path: str, parent_id: Optional[int] = None) -> int:
+        group_id = self.next_id()
+        parent = self.groups.get(parent_id) if parent_id else None
+
+        self.groups[group_id] = {
+            "id": group_id,
+            "name": path,
+            "path": path,
+            "full_path": f"{parent['full_path']}/{path}" if parent else path,
+            "parent_id": parent_id,
+            "visibility": "private",
+            "description": "",
+            "archived": False,
+        }
+
+        return group_id
+
+    def add_project(self: Self, path: str, namespace_id: int) -> int:
+        project_id = self.next_id()
+        namespace = self.groups[namespace_id]
+
+        self.projects[project_id] = {
+            "id": project_id,
+            "name": path,
+            "path": path,
+            "path_with_namespace": f"{namespace['full_path']}/{path}",
+            "namespace": {
+                "id": namespace_id,
+                "kind": "group",
+                "full_path": namespace["full_path"],
+            },
+            "visibility": "private",
+            "description": "",
+            "archived": False,
+            "topics": [],
+            "updated_at": "2026-01-01T00:00:00.000Z",
+            "last_activity_at": "2026-01-01T00:00:00.000Z",
+        }
+
+        return project_id
+
+    def generate(self: Self, groups: int, projects: int, depth: int = 1) -> int:
+        """
+        Builds a hierarchy below one root group: `groups` subgroups nested up
+        to `depth` levels and `projects` projects spread evenly over all
+        groups. Returns the root group ID.
+        """
+        root = self.add_group("root")
+        parents = [root]
+        all_groups = [root]
+
+        for i in range(groups):
+            group_id = self.add_group(f"group-{i}", parents[i % len(parents)])
+            all_groups.append(group_id)
+            if len(parents) < depth:
+                parents.append(group_id)
+
+        for i in range(projects):
+            self.add_project(f"project-{i}", all_groups[i % len(all_groups)])
+
+        return root
+
+    def get_descendants(self: Self, group_id: int) -> list[dict[str, Any]]:
+        children: dict[Optional[int], list[dict[str, Any]]] = {}
+        for group in self.groups.values():
+            children.setdefault(group["parent_id"], []).append(group)
+
+        result: list[dict[str, Any]] = []
+        stack = [group_id]
+        while stack:
+            for group in children.get(stack.pop(), []):
+                result.append(group)
+                stack.append(group["id"])
+
+        return sorted(result, key=lambda group: group["id"])
+
+    def find(self: Self, kind: str, ident: str) -> Optional[dict[str, Any]]:
+        "Finds a group or project by ID or by url-encoded full path"
+        store = self.groups if kind == "groups" else self.projects
+        if ident.isdigit():
+            return store.get(int(ident))
+
+        key = "full_path" if kind == "groups" else "path_with_namespace"
+        return next((entity for entity in store.values() if entity[key] == ident), None)
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    # runs without keep-alive open a connection per request, the default
+    # backlog of 5 drops them under parallel workers
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class FakeGitLabServer:
+    """
+    Threaded HTTP server on a free local port serving `FakeGitLabState`.
+
+    Every request is delayed by `latency` seconds and answered with
+    `429 Too Many Requests` with probability `error_rate`. Without `graphql`
+    `/api/graphql` is answered with 404 like on GitLab with GraphQL disabled.
+    """
+
+    def __init__(
+        self: Self,
+        state: Optional[FakeGitLabState] = None,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        graphql: bool = True,
+    ) -> None:
+        self.state = state or FakeGitLabState()
+        self.graphql = graphql
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+        self.httpd = _HTTPServer(("127.0.0.1", 0), self._get_handler())
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self: Self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host!s}:{port}"
+
+    def __enter__(self: Self) -> Self:
+        self._thread.start()
+        return self
+
+    def __exit__(self: Self, *_: Any) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _get_handler(self: Self) -> type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # unbuffered writes split headers and body into two packets and
+            # hit the delayed ACK of the client on every request
+            wbufsize = -1
+
+            def log_message(self, *args: Any) -> None:
+                return None
+
+            def _send(self, response: Response) -> None:
+                status, body, headers = response
+                payload = json.dumps(body if body is not None else {}).encode()
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                # like real servers, confirm the close, so clients don't reuse it
+                if self.headers.get("Connection", "").lower() == "close":
+                    self.send_header("Connection", "close")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _read_body(self) -> dict[str, Any]:
+                length = int(self.headers.get("Content-Length") or 0)
+                if not length:
+                    return {}
+
+                try:
+                    return json.loads(self.rfile.read(length)) or {}
+                except ValueError:
+                    return {}
+
+            def _dispatch(self, method: str) -> None:
+                parsed = urllib.parse.urlsplit(self.path)
+                query = dict(urllib.parse.parse_qsl(parsed.query))
+                body = self._read_body()
+                # /api/v4/<kind>/<id>/<resource>/<name>
+                parts = [urllib.parse.unquote(p) for p in parsed.path.split("/")[3:]]
+
+                if server.latency:
+                    time.sleep(server.latency)
+
+                if server.error_rate and server.random.random() < server.error_rate:
+                    self._send(
+                        (
+                            429,
+                            {"message": "429 Too Many Requests"},
+                            {"Retry-After": "0"},
+                        )
+                    )
+                    return None
+
+                with server.state.lock:
+                    if parsed.path == "/api/graphql":
+                        server.state.requests[f"{method} graphql"] += 1
+                        response = (
+                            route_graphql(server.state, body)
+                            if server.graphql
+                            else (404, {"message": "404 Not Found"}, {})
+                        )
+                    else:
+                        server.state.requests[f"{method} {get_template(parts)}"] += 1
+                        response = route(
+                            server.state, method, parts, query, body, self.path
+                        )
+
+                self._send(response)
+
+            def do_GET(self) -> None:
+                self._dispatch("GET")
+
+            def do_POST(self) -> None:
+                self._dispatch("POST")
+
+            def do_PUT(self) -> None:
+                self._dispatch("PUT")
+
+            def do_PATCH(self) -> None:
+                self._dispatch("PATCH")
+
+            def do_DELETE(self) -> None:
+                self._dispatch("DELETE")
+
+        return Handler
+
+
+def get_template(parts: list[str]) -> str:
+    "`projects/1001/variables/RELEASE` -> `projects/:id/variables/:name`"
+    template = list(parts)
+    if len(template) > 1:
+        template[1] = ":id"
+    if len(template) > 3:
+        template[3] = ":name"
+
+    return "/".join(template)
+
+
+def _paginate(items: list[Any], query: dict[str, str], raw_path: str) -> Response:
+    "Offset pagination with `X-Next-Page`, keyset pagination with `Link` header"
+    per_page = int(query.get("per_page", 20))
+    headers: dict[str, str] = {}
+
+    if query.get("pagination") == "keyset":
+        id_after = int(query.get("id_after", 0))
+        items = [item for item in items if item["id"] > id_after]
+        page = items[:per_page]
+
+        if len(items) > per_page:
+            next_query = urllib.parse.urlencode(
+                dict(query, id_after=str(page[-1]["id"]))
+            )
+            next_url = f"http://fake{raw_path.split('?')[0]}?{next_query}"
+            headers["Link"] = f'<{next_url}>; rel="next"'
+
+        return 200, page, headers
+
+    page_number = int(query.get("page", 1))
+    start, end = (page_number - 1) * per_page, page_number * per_page
+    page = items[start:end]
+    has_next = len(items) > end
+
+    headers["X-Page"] = str(page_number)
+    headers["X-Next-Page"] = str(page_number + 1) if has_next else ""
+    headers["X-Total"] = str(len(items))
+
+    return 200, page, headers
+
+
+def _filter_projects(
+    items: list[dict[str, Any]], query: dict[str, str]
+) -> list[dict[str, Any]]:
+    if "archived" in query:
+        items = [p for p in items if p["archived"] == (query["archived"] == "true")]
+    if "topic" in query:
+        items = [p for p in items if query["topic"] in p["topics"]]
+    if "visibility" in query:
+        items = [p for p in items if p["visibility"] == query["visibility"]]
+    if "search" in query:
+        items = [p for p in items if query["search"] in p["path"]]
+    if "updated_after" in query:
+        updated_after = query["updated_after"].replace("Z", ".000Z")
+        items = [p for p in items if p.get("updated_at", "") > updated_after]
+
+    return items
+
+
+def _route_variables(
+    state: FakeGitLabState,
+    kind: str,
+    entity_id: int,
+    method: str,
+    rest: list[str],
+    query: dict[str, str],
+    body: dict[str, Any],
+    raw_path: str,
+) -> Response:
+    variables = state.variables.setdefault((kind, entity_id), {})
+
+    if len(rest) == 1 and method == "GET":
+        items = [dict(var, id=i) for i, var in enumerate(variables.values())]
+        status, page, headers = _paginate(items, query, raw_path)
+        return (
+            status,
+            [{k: v for k, v in var.items() if k != "id"} for var in page],
+            headers,
+        )
+
+    if len(rest) == 1 and method == "POST":
+        var = {
+            "key": body["key"],
+            "value": body.get("value"),
+            "masked": body.get("masked", False),
+            "protected": body.get("protected", False),
+            "raw": body.get("raw", False),
+            "variable_type": body.get("variable_type", "env_var"),
+            "environment_scope": body.get("environment_scope") or "*",
+            "description": body.get("description"),
+        }
+        variables[(var["key"], var["environment_scope"])] = var
+        return 201, var, {}
+
+    scope = query.get("filter[environment_scope]", body.get("environment_scope") or "*")
+    key = (rest[1], scope)
+    if key not in variables:
+        return 404, {"message": "404 Variable Not Found"}, {}
+
+    if method == "PUT":
+        variables[key].update(body)
+        return 200, variables[key], {}
+    if method == "DELETE":
+        variables.pop(key)
+        return 204, None, {}
+
+    return 200, variables[key], {}
+
+
+def _route_protected_branches(
+    state: FakeGitLabState,
+    kind: str,
+    entity_id: int,
+    method: str,
+    rest: list[str],
+    query: dict[str, str],
+    body: dict[str, Any],
+    raw_path: str,
+) -> Response:
+    branches = state.protected_branches.setdefault((kind, entity_id), {})
+
+    if len(rest) == 1 and method == "GET":
+        return _paginate(list(branches.values()), query, raw_path)
+
+    if len(rest) == 1 and method == "POST":
+        branch: dict[str, Any] = {
+            "id": state.next_id(),
+            "name": body["name"],
+            "allow_force_push": bool(body.get("allow_force_push")),
+            # Premium and Ultimate only, `allowed_to_*` params are supported
+            "code_owner_approval_required": False,
+        }
+        for access in ("merge", "push", "unprotect"):
+            branch[f"{access}_access_levels"] = [
+                {
+                    "id": state.next_id(),
+                    "access_level": body.get(f"{access}_access_level", 40),
+                }
+            ]
+        branches[body["name"]] = branch
+        return 201, branch, {}
+
+    name = rest[1]
+    if name not in branches:
+        return 404, {"message": "404 Not Found"}, {}
+
+    if method == "DELETE":
+        branches.pop(name)
+        return 204, None, {}
+
+    if method == "PATCH":
+        branch = branches[name]
+        if "allow_force_push" in body:
+            branch["allow_force_push"] = body["allow_force_push"]
+        for access in ("merge", "push", "unprotect"):
+            levels = branch[f"{access}_access_levels"]
+            for change in body.get(f"allowed_to_{access}", []):
+                if change.get("_destroy"):
+                    levels[:] = [
+                        level for level in levels if level["id"] != change["id"]
+                    ]
+                elif "id" in change:
+                    for level in levels:
+                        if level["id"] == change["id"]:
+                            level["access_level"] = change["access_level"]
+                else:
+                    levels.append(
+                        {"id": state.next_id(), "access_level": change["access_level"]}
+                    )
+        return 200, branch, {}
+
+    return 200, branches[name], {}
+
+
+def _get_camel_case(name: str) -> str:
+    first, *rest = name.split("_")
+    return first + "".join(word.capitalize() for word in rest)
+
+
+def route_graphql(state: FakeGitLabState, body: dict[str, Any]) -> Response:
+    """
+    Answers the `projects(ids:)` query of pivlabform only: the query isn't
+    parsed, project attributes and `ciVariables` are returned when their
+    GraphQL names occur in it
+    """
+    query = body.get("query", "")
+    ids = (body.get("variables") or {}).get("ids") or []
+    nodes = []
+
+    for global_id in ids:
+        project = state.projects.get(int(global_id.rsplit("/", 1)[-1]))
+        if project is None:
+            continue
+
+        node: dict[str, Any] = {"id": global_id}
+        for key, value in project.items():
+            field = _get_camel_case(key)
+            if key != "id" and re.search(rf"\b{field}\b", query):
+                node[field] = value
+
+        if "ciVariables" in query:
+            variables = state.variables.get(("projects", project["id"]), {})
+            node["ciVariables"] = {
+                "pageInfo": {"hasNextPage": False},
+                "nodes": [
+                    {
+                        "key": var["key"],
+                        "value": var["value"],
+                        "variableType": var["variable_type"].upper(),
+                        "environmentScope": var["environment_scope"],
+                        "masked": var["masked"],
+                        "protected": var["protected"],
+                        "raw": var["raw"],
+                        "description": var["description"],
+                    }
+                    for var in variables.values()
+                ],
+            }
+
+        nodes.append(node)
+
+    return 200, {"data": {"projects": {"nodes": nodes}}}, {}
+
+
+def route(
+    state: FakeGitLabState,
+    method: str,
+    parts: list[str],
+    query: dict[str, str],
+    body: dict[str, Any],
+    raw_path: str,
+) -> Response:
+    not_found: Response = (404, {"message": "404 Not Found"}, {})
+
+    if len(parts) == 1 and parts[0] in ("groups", "projects") and method == "GET":
+        store = state.groups if parts[0] == "groups" else state.projects
+        items = sorted(store.values(), key=lambda entity: entity["id"])
+        return _paginate(_filter_projects(items, query), query, raw_path)
+
+    if len(parts) < 2 or parts[0] not in ("groups", "projects"):
+        return not_found
+
+    kind = parts[0]
+    entity = state.find(kind, parts[1])
+    if entity is None:
+        return 404, {"message": f"404 {kind} Not Found"}, {}
+
+    entity_id = entity["id"]
+    rest = parts[2:]
+
+    if not rest:
+        if method == "GET":
+            return 200, entity, {}
+        if method == "PUT":
+            for key, value in body.items():
+                if key == "container_expiration_policy_attributes":
+                    entity.setdefault("container_expiration_policy", {}).update(value)
+                else:
+                    entity[key] = value
+            entity["updated_at"] = time.strftime(
+                "%Y-%m-%dT%H:%M:%S.000Z", time.gmtime()
+            )
+            return 200, entity, {}
+        if method == "DELETE":
+            (state.groups if kind == "groups" else state.projects).pop(entity_id)
+            return 202, {"message": "202 Accepted"}, {}
+        return not_found
+
+    resource = rest[0]
+
+    if (
+        kind == "groups"
+        and resource in ("subgroups", "descendant_groups")
+        and method == "GET"
+    ):
+        if resource == "subgroups":
+            items = [
+                group
+                for group in state.groups.values()
+                if group["parent_id"] == entity_id
+            ]
+            items.sort(key=lambda group: group["id"])
+        else:
+            items = state.get_descendants(entity_id)
+        if "search" in query:
+            items = [group for group in items if query["search"] in group["path"]]
+        return _paginate(items, query, raw_path)
+
+    if kind == "groups" and resource == "projects" and method == "GET":
+        namespaces = {entity_id}
+        if query.get("include_subgroups") == "true":
+            namespaces |= {group["id"] for group in state.get_descendants(entity_id)}
+        items = [
+            project
+            for project in sorted(
+                state.projects.values(), key=lambda project: project["id"]
+            )
+            if project["namespace"]["id"] in namespaces
+        ]
+        if query.get("order_by") == "updated_at":
+            items.sort(
+                key=lambda project: project.get("updated_at", ""),
+                reverse=query.get("sort") == "desc",
+            )
+        return _paginate(_filter_projects(items, query), query, raw_path)
+
+    if kind == "projects" and resource in ("archive", "unarchive") and method == "POST":
+        entity["archived"] = resource == "archive"
+        return 201, entity, {}
+
+    if resource == "variables":
+        return _route_variables(
+            state, kind, entity_id, method, rest, query, body, raw_path
+        )
+
+    if resource == "protected_branches":
+        return _route_protected_branches(
+            state, kind, entity_id, method, rest, query, body, raw_path
+        )
+
+    return not_found
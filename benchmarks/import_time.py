@@ -0,0 +1,126 @@
+"""
+Startup budget of the CLI, measured with `python -X importtime`.
+
+    PYTHONPATH=src python -m benchmarks.import_time --budget-ms 100
+
+Every scenario runs in a fresh interpreter, the best of `--repeat` runs is
+compared with the budget. The exit code is 1 when a scenario is over budget
+or loads a module it shouldn't, so the script can guard startup in CI.
+"""
+
+import re
+import subprocess
+import sys
+
+import click
+from typing_extensions import Any
+
+# code run by the interpreter, budget share and modules it must not load
+SCENARIOS: dict[str, dict[str, Any]] = {
+    "help": {
+        "code": (
+            "import sys; sys.argv = ['pivlabform', '--help']\n"
+            "from pivlabform.cli import cli\n"
+            "try:\n"
+            "    cli()\n"
+            "except SystemExit:\n"
+            "    pass\n"
+        ),
+        "budget_share": 1.0,
+        "forbidden": ["pydantic", "requests", "yaml", "colorlog", "asyncio", "httpx"],
+    },
+    "run": {
+        # what a manual run of a single project loads before the first request
+        "code": "import pivlabform.pivlabform\n",
+        "budget_share": 5.0,
+        "forbidden": ["asyncio", "httpx", "sqlite3"],
+    },
+}
+
+# `import time: self [us] | cumulative | imported package`
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def measure(code: str) -> tuple[float, list[tuple[str, float]], set[str]]:
+    "Returns total ms, direct imports of the code with ms and all loaded modules"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    # interpreter startup (site, encodings) is reported before the code runs
+    after_site = False
+    top_level: list[tuple[str, float]] = []
+    modules: set[str] = set()
+
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match is None:
+            continue
+
+        _, cumulative, indent, module = match.groups()
+        if len(indent) == 1 and module == "site":
+            after_site = True
+            continue
+
+        if after_site:
+            modules.add(module)
+            if len(indent) == 1:
+                top_level.append((module, int(cumulative) / 1000))
+
+    return sum(ms for _, ms in top_level), top_level, modules
+
+
+@click.command()
+@click.option(
+    "--scenario",
+    "scenarios",
+    type=click.Choice(list(SCENARIOS)),
+    multiple=True,
+    default=list(SCENARIOS),
+    help="`help` is `pivlabform --help`, `run` imports the run path, repeatable",
+)
+@click.option(
+    "--budget-ms",
+    type=click.FloatRange(min=0, min_open=True),
+    default=100.0,
+    help="import budget of `help`, other scenarios get a multiple of it",
+)
+@click.option("--repeat", type=click.IntRange(min=1), default=5)
+@click.option(
+    "--top", type=click.IntRange(min=0), default=8, help="slowest imports shown"
+)
+def main(scenarios: tuple[str, ...], budget_ms: float, repeat: int, top: int) -> None:
+    failed = False
+
+    for name in scenarios:
+        scenario = SCENARIOS[name]
+        budget = budget_ms * scenario["budget_share"]
+
+        runs = [measure(scenario["code"]) for _ in range(repeat)]
+        total, top_level, modules = min(runs, key=lambda run: run[0])
+
+        forbidden = sorted(
+            module
+            for module in modules
+            if module.split(".")[0] in scenario["forbidden"] and "." not in module
+        )
+        over_budget = total > budget
+        failed |= over_budget or bool(forbidden)
+
+        click.echo(
+            f"{name}: {total:.1f} ms of {budget:.0f} ms budget"
+            f"{' (OVER BUDGET)' if over_budget else ''}"
+        )
+        for module, ms in sorted(top_level, key=lambda item: -item[1])[:top]:
+            click.echo(f"  {ms:>8.1f} ms  {module}")
+        if forbidden:
+            click.echo(f"  unexpected imports: {', '.join(forbidden)}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
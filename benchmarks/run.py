@@ -0,0 +1,209 @@
+"""
+End-to-end benchmark of pivlabform against an in-process fake GitLab.
+
+    python -m benchmarks.run --groups 50 --projects 5000 --latency 0.01 --workers 8
+
+Every scenario runs in a fresh process, so peak RSS belongs to that scenario
+only (it includes the fake server, which shares the process).
+"""
+
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+from typing_extensions import Any, Optional
+
+from .fake_gitlab import FakeGitLabServer, FakeGitLabState
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(__file__), "config.yaml")
+
+
+def get_peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_scenario(mode: str, options: dict[str, Any]) -> list[dict[str, Any]]:
+    "Runs `options['runs']` configuration runs of one mode on one fake instance"
+    from pivlabform.gitlab.models import RunOptions
+    from pivlabform.gitlab.transport import TransportConfig
+    from pivlabform.pivlabform import Pivlabform
+    from pivlabform.utils._helpers import LOGGER
+
+    if not options["verbose"]:
+        LOGGER.setLevel(logging.WARNING)
+
+    state = FakeGitLabState()
+    state.generate(options["groups"], options["projects"], options["depth"])
+
+    results: list[dict[str, Any]] = []
+
+    with FakeGitLabServer(
+        state, latency=options["latency"], error_rate=options["error_rate"]
+    ) as server:
+        for run in range(1, options["runs"] + 1):
+            state.requests.clear()
+            exit_code = 0
+
+            start = time.perf_counter()
+            pl = Pivlabform(
+                options["config_file"],
+                server.url,
+                RunOptions(
+                    workers=options["workers"],
+                    fan_out=options["fan_out"],
+                    discovery=options["discovery"],
+                    read_backend=options["read_backend"],
+                    transport=TransportConfig(keep_alive=options["keep_alive"]),
+                ),
+            )
+
+            try:
+                if mode == "auto":
+                    pl.process_auto_configuration(recursive=True, validate=False)
+                else:
+                    pl.process_manual_configuration(
+                        path_type="group",
+                        path="root",
+                        id=None,
+                        recursive=True,
+                        validate=False,
+                    )
+            except SystemExit as e:
+                exit_code = e.code if isinstance(e.code, int) else 1
+
+            results.append(
+                {
+                    "mode": mode,
+                    "run": run,
+                    "wall_time": round(time.perf_counter() - start, 3),
+                    "requests": sum(state.requests.values()),
+                    "requests_by_endpoint": dict(state.requests.most_common()),
+                    "retries": pl.gl.retry_stats.total,
+                    "peak_rss_mb": get_peak_rss_mb(),
+                    "exit_code": exit_code,
+                }
+            )
+
+    return results
+
+
+def print_result(result: dict[str, Any]) -> None:
+    rss = result["peak_rss_mb"]
+    click.echo(
+        f"{result['mode']} run {result['run']}: "
+        f"{result['wall_time']:.2f}s, {result['requests']} requests, "
+        f"{result['retries']} retries, "
+        f"peak RSS {f'{rss:.1f} MiB' if rss is not None else 'n/a'}, "
+        f"exit code {result['exit_code']}"
+    )
+
+    for endpoint, count in result["requests_by_endpoint"].items():
+        click.echo(f"  {count:>8}  {endpoint}")
+
+
+@click.command()
+@click.option(
+    "--groups",
+    type=click.IntRange(min=0),
+    default=50,
+    help="subgroups below the root group",
+)
+@click.option(
+    "--projects",
+    type=click.IntRange(min=0),
+    default=5000,
+    help="projects spread over all groups",
+)
+@click.option(
+    "--depth", type=click.IntRange(min=1), default=3, help="max nesting of subgroups"
+)
+@click.option(
+    "--latency",
+    type=click.FloatRange(min=0),
+    default=0.0,
+    help="server delay per request in seconds",
+)
+@click.option(
+    "--error-rate",
+    type=click.FloatRange(0, 1),
+    default=0.0,
+    help="share of requests answered with 429",
+)
+@click.option(
+    "--mode",
+    "modes",
+    type=click.Choice(["auto", "manual"]),
+    multiple=True,
+    default=["auto", "manual"],
+    help="`process_auto_configuration` or `process_manual_configuration`, repeatable",
+)
+@click.option(
+    "--runs",
+    type=click.IntRange(min=1),
+    default=1,
+    help="runs per mode, later runs show no-op cost",
+)
+@click.option(
+    "--config-file",
+    "-c",
+    default=DEFAULT_CONFIG,
+    help="pivlabform config applied to the root group",
+)
+@click.option("--workers", "-w", type=click.IntRange(min=1), default=1)
+@click.option("--fan-out", type=click.IntRange(min=1), default=4)
+@click.option(
+    "--discovery",
+    type=click.Choice(["descendants", "recursive"]),
+    default="descendants",
+)
+@click.option(
+    "--read-backend",
+    type=click.Choice(["rest", "graphql"]),
+    default="rest",
+)
+@click.option(
+    "--keep-alive/--no-keep-alive",
+    default=True,
+    help="reuse connections, without it every request opens a new one",
+)
+@click.option(
+    "--json", "json_file", default=None, help="write results to this JSON file"
+)
+@click.option("--verbose", is_flag=True, help="keep pivlabform logs")
+def main(modes: tuple[str, ...], json_file: Optional[str], **options: Any) -> None:
+    click.echo(
+        f"fake GitLab: {options['groups']} groups, {options['projects']} projects, "
+        f"latency {options['latency']}s, 429 rate {options['error_rate']}"
+    )
+
+    results: list[dict[str, Any]] = []
+    for mode in modes:
+        # a fresh process per scenario keeps peak RSS and caches separate
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            mode_results = executor.submit(run_scenario, mode, options).result()
+
+        for result in mode_results:
+            print_result(result)
+        results.extend(mode_results)
+
+    if json_file:
+        with open(json_file, "w", encoding="utf-8") as f:
+            json.dump({"options": options, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,30 @@
 __version__ = "0.5.0"
 __author__ = "Arsenii Nikulin"
 
+import importlib
+
+from typing_extensions import TYPE_CHECKING, Any
+
 from .cli import cli
-from .gitlab.gitlab import GitLab
-from .utils._helpers import LOGGER
+
+if TYPE_CHECKING:
+    from .gitlab.gitlab import GitLab
+    from .utils._helpers import LOGGER
 
 __all__ = ["cli", "GitLab", "LOGGER"]
+
+# imported on first access, so the console script doesn't load the GitLab
+# client before parsing its options
+_LAZY_EXPORTS = {
+    "GitLab": ".gitlab.gitlab",
+    "LOGGER": ".utils._helpers",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY_EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(_LAZY_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
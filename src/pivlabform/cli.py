@@ -3,9 +3,10 @@ import sys
 import click
 from typing_extensions import Optional
 
-from .pivlabform import Pivlabform
-from .utils import _consts, _helpers
-from .utils._helpers import LOGGER
+from .utils import _consts
+
+# pydantic models, requests, yaml and logging are imported by `process`
+# only, so `--help` and option errors stay fast
 
 
 def cli():
@@ -44,8 +45,10 @@ def cli():
     @click.option(
         "--config-file",
         "-c",
-        default=_consts.Files.manual_default_config.value,
-        help="config file path",
+        "config_paths",
+        multiple=True,
+        default=[_consts.Files.manual_default_config.value],
+        help="config file path, repeatable; a directory adds all its YAML files",
     )
     @click.option(
         "--recursive",
@@ -59,20 +62,250 @@ def cli():
         is_flag=True,
         help="only validate configurations",
     )
+    @click.option(
+        "--workers",
+        "-w",
+        type=click.IntRange(min=1),
+        default=1,
+        help="number of entities configured in parallel",
+    )
+    @click.option(
+        "--fan-out",
+        type=click.IntRange(min=1),
+        default=4,
+        help="parallel write requests inside one entity, shared by all workers",
+    )
+    @click.option(
+        "--discovery",
+        type=click.Choice([mode.value for mode in _consts.DiscoveryMode]),
+        default=_consts.DiscoveryMode.descendants.value,
+        help=(
+            "how recursive runs find subgroups and projects: "
+            "`descendants` lists the whole tree in one pass, "
+            "`recursive` walks every subgroup (for old GitLab versions)"
+        ),
+    )
+    @click.option(
+        "--archived/--no-archived",
+        default=None,
+        help="only archived (`--archived`) or not archived (`--no-archived`) projects",
+    )
+    @click.option(
+        "--topic",
+        default=None,
+        help="only projects with this topic",
+    )
+    @click.option(
+        "--visibility",
+        type=click.Choice(["private", "internal", "public"]),
+        default=None,
+        help="only projects with this visibility",
+    )
+    @click.option(
+        "--min-access-level",
+        type=click.Choice(["10", "20", "30", "40", "50"]),
+        default=None,
+        help="only projects where the token user has at least this access level",
+    )
+    @click.option(
+        "--search",
+        default=None,
+        help="only projects whose path or name contains this string",
+    )
+    @click.option(
+        "--exclude-path",
+        "exclude_paths",
+        multiple=True,
+        help="regular expression, groups and projects with a matching full path are skipped, repeatable",
+    )
+    @click.option(
+        "--exclude-id",
+        "exclude_ids",
+        type=int,
+        multiple=True,
+        help="group or project ID which is skipped, repeatable",
+    )
+    @click.option(
+        "--shard",
+        default=None,
+        help="`INDEX/TOTAL` slice of entities, e.g. `$CI_NODE_INDEX/$CI_NODE_TOTAL` of `parallel` jobs",
+    )
+    @click.option(
+        "--discovery-file",
+        default=None,
+        help="JSON file of discovered entities: loaded if present, written after discovery otherwise",
+    )
+    @click.option(
+        "--read-backend",
+        type=click.Choice([backend.value for backend in _consts.ReadBackend]),
+        default=_consts.ReadBackend.rest.value,
+        help=(
+            "how current state is read: `rest` per entity, "
+            "`graphql` reads project variables and settings in batches of 100"
+        ),
+    )
+    @click.option(
+        "--inventory",
+        default=None,
+        help="SQLite inventory file for path resolution and recursive discovery",
+    )
+    @click.option(
+        "--inventory-ttl",
+        type=click.FloatRange(min=0),
+        default=3600,
+        help="seconds the inventory is used without refresh",
+    )
+    @click.option(
+        "--state-file",
+        default=None,
+        help="JSON file of applied config fingerprints, unchanged entities are skipped",
+    )
+    @click.option(
+        "--full",
+        is_flag=True,
+        help="reconcile every entity even if unchanged since last apply",
+    )
+    @click.option(
+        "--journal",
+        default=None,
+        help="append-only file of applied entity resources, removed after a successful run",
+    )
+    @click.option(
+        "--resume",
+        is_flag=True,
+        help="skip resources which `--journal` of an interrupted run already applied",
+    )
+    @click.option(
+        "--plan",
+        "plan",
+        default=None,
+        help="only read GitLab and write the changes a run would make to this file",
+    )
+    @click.option(
+        "--plan-file",
+        default=None,
+        help="apply changes of a plan written by `--plan`, without reading GitLab",
+    )
+    @click.option(
+        "--config-cache",
+        default=None,
+        help="directory of validated configs, an unchanged config file is not parsed again",
+    )
+    @click.option(
+        "--dedup-inherited",
+        is_flag=True,
+        help="don't write variables which entities already inherit from ancestor groups",
+    )
+    @click.option(
+        "--metrics-json",
+        default=None,
+        help="write per-endpoint request metrics to this JSON file at exit",
+    )
+    @click.option(
+        "--metrics-prom",
+        default=None,
+        help="write request metrics in Prometheus text format (node exporter textfile collector)",
+    )
+    @click.option(
+        "--async",
+        "use_async",
+        is_flag=True,
+        help="run auto configuration on asyncio client (requires `pivlabform[async]`)",
+    )
+    @click.option(
+        "--concurrency",
+        type=click.IntRange(min=1),
+        default=None,
+        help="requests in flight of `--async` client (default: 100)",
+    )
+    @click.option(
+        "--max-retries",
+        type=click.IntRange(min=0),
+        default=None,
+        help="retries of failed requests (default: `GITLAB_MAX_RETRIES` or 5)",
+    )
+    @click.option(
+        "--request-timeout",
+        type=click.FloatRange(min=0, min_open=True),
+        default=None,
+        help="timeout of a single request in seconds (default: `GITLAB_REQUEST_TIMEOUT` or 60)",
+    )
+    @click.option(
+        "--connect-timeout",
+        type=click.FloatRange(min=0, min_open=True),
+        default=None,
+        help="timeout of opening a connection in seconds (default: `GITLAB_CONNECT_TIMEOUT` or 10)",
+    )
+    @click.option(
+        "--pool-size",
+        type=click.IntRange(min=1),
+        default=None,
+        help="pooled connections per worker thread, in total with `--async` (default: `GITLAB_POOL_SIZE`)",
+    )
+    @click.option(
+        "--compression/--no-compression",
+        default=None,
+        help="ask for gzip-compressed responses (default: `GITLAB_COMPRESSION` or on)",
+    )
+    @click.option(
+        "--keep-alive/--no-keep-alive",
+        default=None,
+        help="reuse connections between requests (default: `GITLAB_KEEP_ALIVE` or on)",
+    )
+    @click.option(
+        "--http2",
+        is_flag=True,
+        default=None,
+        help="use HTTP/2 with `--async` (requires `httpx[http2]`, default: `GITLAB_HTTP2`)",
+    )
     @click.option(
         "--gitlab-host",
-        default=_helpers.get_gitlab_host(),
-        help="gitlab host url (example: `https://pivlab.space`)",
+        default=None,
+        help="gitlab host url (default: `https://` + `CI_SERVER_HOST` or pivlab.space)",
     )
     def process(
         manual: Optional[bool],
         type: Optional[str],
         path: Optional[str],
         id: Optional[int],
-        config_file: str,
+        config_paths: tuple[str, ...],
         recursive: bool,
-        gitlab_host: str,
+        gitlab_host: Optional[str],
         validate: bool,
+        workers: int,
+        use_async: bool,
+        concurrency: Optional[int],
+        discovery: str,
+        archived: Optional[bool],
+        topic: Optional[str],
+        visibility: Optional[str],
+        min_access_level: Optional[str],
+        search: Optional[str],
+        exclude_paths: tuple[str, ...],
+        exclude_ids: tuple[int, ...],
+        shard: Optional[str],
+        discovery_file: Optional[str],
+        read_backend: str,
+        fan_out: int,
+        inventory: Optional[str],
+        inventory_ttl: float,
+        state_file: Optional[str],
+        full: bool,
+        journal: Optional[str],
+        resume: bool,
+        plan: Optional[str],
+        plan_file: Optional[str],
+        dedup_inherited: bool,
+        config_cache: Optional[str],
+        metrics_json: Optional[str],
+        metrics_prom: Optional[str],
+        max_retries: Optional[int],
+        request_timeout: Optional[float],
+        connect_timeout: Optional[float],
+        pool_size: Optional[int],
+        compression: Optional[bool],
+        keep_alive: Optional[bool],
+        http2: Optional[bool],
         ci: bool = False,
     ):
         if not ci:
@@ -85,9 +318,128 @@ def cli():
                 print("python-dotenv not installed, skipping .env loading")
                 pass
 
-        pl = Pivlabform(config_file, gitlab_host)
+        from .gitlab.models import DiscoveryFilters, RunOptions
+        from .gitlab.transport import RetryPolicy, TransportConfig
+        from .pivlabform import Pivlabform
+        from .utils import _helpers
+        from .utils._helpers import LOGGER
+
+        config_files = _helpers.get_config_files(config_paths)
+        batch = len(config_files) > 1
+
+        if batch and (manual or use_async or plan_file):
+            LOGGER.error(
+                "ERROR: several configs are supported by auto runs only, "
+                "without `--manual`, `--async` and `--plan-file`"
+            )
+            sys.exit(1)
+
+        if not config_files and not plan_file:
+            LOGGER.error(f"ERROR: no config files found in {', '.join(config_paths)}")
+            sys.exit(1)
+
+        transport = TransportConfig.from_env(
+            connect_timeout=connect_timeout,
+            pool_size=pool_size,
+            compression=compression,
+            keep_alive=keep_alive,
+            http2=http2,
+        )
+
+        if transport.http2 and not use_async:
+            LOGGER.error("ERROR: HTTP/2 is supported by `--async` client only")
+            sys.exit(1)
+
+        if concurrency and not use_async:
+            LOGGER.error("ERROR: `--concurrency` is supported by `--async` client only")
+            sys.exit(1)
+
+        if read_backend == _consts.ReadBackend.graphql.value and use_async:
+            LOGGER.error(
+                "ERROR: `--read-backend graphql` is not supported by `--async`"
+            )
+            sys.exit(1)
+
+        if shard and (plan_file or dedup_inherited):
+            # shards run in parallel, inherited variables may not be applied yet
+            LOGGER.error(
+                "ERROR: `--shard` can't be used with `--plan-file` and `--dedup-inherited`"
+            )
+            sys.exit(1)
+
+        if resume and not journal:
+            LOGGER.error("ERROR: `--resume` requires `--journal`")
+            sys.exit(1)
+
+        if journal and (plan or plan_file):
+            LOGGER.error(
+                "ERROR: `--journal` can't be used with `--plan` and `--plan-file`"
+            )
+            sys.exit(1)
+
+        if plan and plan_file:
+            LOGGER.error("ERROR: `--plan` and `--plan-file` can't be used together")
+            sys.exit(1)
+
+        if plan and dedup_inherited:
+            # dedup compares with ancestor groups after their apply
+            LOGGER.error("ERROR: `--dedup-inherited` can't be used with `--plan`")
+            sys.exit(1)
+
+        pl = Pivlabform(
+            None if plan_file or batch else config_files[0],
+            gitlab_host or _helpers.get_gitlab_host(),
+            RunOptions(
+                workers=workers,
+                concurrency=concurrency or 100,
+                discovery=discovery,
+                read_backend=read_backend,
+                filters=DiscoveryFilters.model_validate(
+                    {
+                        "archived": archived,
+                        "topic": topic,
+                        "visibility": visibility,
+                        "min_access_level": (
+                            int(min_access_level) if min_access_level else None
+                        ),
+                        "search": search,
+                        "exclude_paths": list(exclude_paths) or None,
+                        "exclude_ids": list(exclude_ids) or None,
+                    }
+                ),
+                shard=_helpers.parse_shard(shard) if shard else None,
+                discovery_file=discovery_file,
+                fan_out=fan_out,
+                inventory=inventory,
+                inventory_ttl=inventory_ttl,
+                state_file=state_file,
+                full=full,
+                journal=journal,
+                resume=resume,
+                plan_file=plan,
+                metrics_json=metrics_json,
+                metrics_prometheus=metrics_prom,
+                dedup_inherited=dedup_inherited,
+                config_cache=config_cache,
+                retry_policy=RetryPolicy.from_env(
+                    max_retries=max_retries,
+                    timeout=request_timeout,
+                ),
+                transport=transport,
+            ),
+        )
 
-        if manual:
+        if plan_file:
+            LOGGER.info("apply plan")
+            pl.apply_plan(plan_file)
+        elif batch:
+            LOGGER.info(f"process batch of {len(config_files)} configs")
+            pl.process_batch_configuration(
+                config_files=config_files,
+                recursive=recursive,
+                validate=validate,
+            )
+        elif manual:
             LOGGER.info("process manual run")
             pl.process_manual_configuration(
                 path_type=type,
@@ -96,6 +448,24 @@ def cli():
                 recursive=recursive,
                 validate=validate,
             )
+        elif use_async:
+            import asyncio
+
+            from .gitlab.transport import GitLabRequestError
+
+            try:
+                asyncio.run(
+                    pl.process_auto_configuration_async(
+                        recursive=recursive,
+                        validate=validate,
+                    )
+                )
+            except GitLabRequestError:
+                # logged by the client, failures of entities don't get here
+                sys.exit(1)
+            except ImportError as e:
+                LOGGER.error(f"ERROR: {e}")
+                sys.exit(1)
         else:
             pl.process_auto_configuration(
                 recursive=recursive,
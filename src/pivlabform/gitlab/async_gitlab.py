@@ -0,0 +1,560 @@
+import asyncio
+import json
+import time
+
+from typing_extensions import Any, AsyncIterator, Optional, Self
+
+from ..utils import _helpers
+from ..utils._helpers import LOGGER
+from .gitlab import Entity, EntityCache
+from .metrics import RequestMetrics
+from .models import EntityMetadata, PlannedChange
+from .transport import (
+    IDEMPOTENT_METHODS,
+    GitLabRequestError,
+    RateLimiter,
+    RetryPolicy,
+    RetryStats,
+    TransportConfig,
+    record_request_error,
+)
+
+try:
+    import httpx
+except ImportError:
+    httpx = None  # type: ignore
+
+
+class AsyncGitLab:
+    """
+    asyncio counterpart of `GitLab`, built on `httpx.AsyncClient`.
+    Requires the optional `async` extra: `pip install pivlabform[async]`.
+
+    All requests share one connection pool; `concurrency` limits
+    the number of requests in flight at the same time.
+    """
+
+    def __init__(
+        self: Self,
+        gitlab_host: str = "",
+        concurrency: int = 100,
+        retry_policy: Optional[RetryPolicy] = None,
+        transport: Optional[TransportConfig] = None,
+    ):
+        if httpx is None:
+            raise ImportError("httpx not installed, install `pivlabform[async]`")
+
+        self.retry_policy = retry_policy or RetryPolicy.from_env()
+        self.transport = transport or TransportConfig.from_env()
+
+        gitlab_host = _helpers.get_gitlab_host() if not gitlab_host else gitlab_host
+        self.gitlab_api_url = f"{gitlab_host}/api/v4"
+        pool_size = self.transport.pool_size or concurrency
+        try:
+            self.gitlab_client = httpx.AsyncClient(
+                headers={
+                    "PRIVATE-TOKEN": _helpers.get_gitlab_token(),
+                    **self.transport.get_headers(),
+                },
+                # `concurrency` requests in flight share the pool, with HTTP/2
+                # they are multiplexed over few connections
+                limits=httpx.Limits(
+                    max_connections=pool_size,
+                    max_keepalive_connections=(
+                        pool_size if self.transport.keep_alive else 0
+                    ),
+                ),
+                timeout=httpx.Timeout(
+                    self.retry_policy.timeout, connect=self.transport.connect_timeout
+                ),
+                http2=self.transport.http2,
+            )
+        except ImportError as e:
+            raise ImportError(
+                "h2 not installed, install `httpx[http2]` for HTTP/2"
+            ) from e
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.rate_limiter = RateLimiter()
+        self.retry_stats = RetryStats()
+
+        self.entity_cache = EntityCache()
+        self.metrics = RequestMetrics()
+
+    async def __aenter__(self: Self) -> Self:
+        return self
+
+    async def __aexit__(self: Self, *_: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self: Self) -> None:
+        await self.gitlab_client.aclose()
+
+    async def _send_gitlab_request(
+        self: Self,
+        method: str = "GET",
+        url_postfix: str = "",
+        data: dict[str, Any] | Any = {},
+        params: Optional[dict[str, Any]] = None,
+    ) -> "httpx.Response":
+        url = f"{self.gitlab_api_url}/{url_postfix}"
+        attempt = 0
+
+        while True:
+            delay = self.rate_limiter.reserve()
+            if delay > 0:
+                self.retry_stats.add_paced()
+                await asyncio.sleep(delay)
+
+            start = time.perf_counter()
+            try:
+                async with self._semaphore:
+                    start = time.perf_counter()
+                    r = await self.gitlab_client.request(
+                        method=method,
+                        url=url,
+                        json=data if data else None,
+                        params=params,
+                    )
+            except httpx.TransportError as e:
+                self.metrics.record(
+                    method, url_postfix, "error", 0, 0, time.perf_counter() - start
+                )
+
+                # see GitLab._send_gitlab_request
+                retryable = not isinstance(e, httpx.ReadTimeout) or (
+                    method.upper() in IDEMPOTENT_METHODS
+                )
+
+                if not retryable or attempt >= self.retry_policy.max_retries:
+                    error = f"{method} {url}: {type(e).__name__}"
+                    record_request_error(error)
+                    LOGGER.error(f"ERROR: {type(e).__name__}: {e}")
+                    LOGGER.error(f"URL: {url}")
+                    if not _helpers.ignore_errors():
+                        raise GitLabRequestError(error) from e
+                    raise
+
+                delay = self.retry_policy.get_backoff(attempt)
+                reason = type(e).__name__
+            else:
+                self.metrics.record(
+                    method,
+                    url_postfix,
+                    str(r.status_code),
+                    len(r.request.content),
+                    len(r.content),
+                    time.perf_counter() - start,
+                )
+                self.rate_limiter.update(r.headers)
+
+                if (
+                    not self.retry_policy.should_retry(method, r.status_code)
+                    or attempt >= self.retry_policy.max_retries
+                ):
+                    break
+
+                delay = self.retry_policy.get_retry_delay(attempt, r.headers)
+                reason = str(r.status_code)
+
+            attempt += 1
+            self.retry_stats.add_retry(reason)
+            LOGGER.warning(
+                f"RETRY: {method} {url} failed with {reason}, "
+                f"attempt {attempt}/{self.retry_policy.max_retries} in {delay:.1f}s"
+            )
+            await asyncio.sleep(delay)
+
+        if r.is_error:
+            error = f"{method} {url}: {r.status_code}"
+            record_request_error(error)
+            LOGGER.error(f"ERROR: {r.status_code}:{r.text}")
+            LOGGER.error(f"URL: {url}")
+            LOGGER.error(f"DATA:\n{json.dumps(data, indent=4)}")
+            if not _helpers.ignore_errors():
+                raise GitLabRequestError(error, r.status_code)
+
+        return r
+
+    async def paginate(
+        self: Self,
+        url_postfix: str,
+        params: Optional[dict[str, Any]] = None,
+        per_page: int = 100,
+    ) -> AsyncIterator[dict[str, Any]]:
+        "see `GitLab.paginate`"
+        params = {**(params or {}), "per_page": per_page}
+
+        r = await self._send_gitlab_request(
+            method="GET",
+            url_postfix=url_postfix,
+            params=params,
+        )
+
+        while True:
+            if r.is_error:
+                raise RuntimeError(f"ERROR: {r.text}" f"STATUS: {r.status_code}")
+
+            for item in r.json():
+                yield item
+
+            next_url = r.links.get("next", {}).get("url")
+            next_page = r.headers.get("X-Next-Page")
+
+            if next_url:
+                r = await self._send_gitlab_request(
+                    method="GET",
+                    url_postfix=next_url.split("/api/v4/", 1)[-1],
+                )
+            elif next_page:
+                r = await self._send_gitlab_request(
+                    method="GET",
+                    url_postfix=url_postfix,
+                    params={**params, "page": next_page},
+                )
+            else:
+                return
+
+    async def get_all_projects_from_group(
+        self: Self,
+        target_group: int,
+        params: Optional[dict[str, Any]] = None,
+    ) -> list[int]:
+        return [
+            self.entity_cache.add(Entity.PROJECT, project).id
+            async for project in self.paginate(
+                f"{Entity.GROUP.value}/{target_group}/{Entity.PROJECT.value}",
+                params,
+            )
+        ]
+
+    async def get_group_variables(self: Self, group_id: int) -> list[dict[str, Any]]:
+        "see `GitLab.get_group_variables`"
+        return [
+            var
+            async for var in self.paginate(f"{Entity.GROUP.value}/{group_id}/variables")
+        ]
+
+    async def get_all_groups_from_group(
+        self: Self,
+        target_group: int,
+    ) -> list[int]:
+        return [
+            self.entity_cache.add(Entity.GROUP, group).id
+            async for group in self.paginate(
+                f"{Entity.GROUP.value}/{target_group}/{Entity.SUBGROUP.value}"
+            )
+        ]
+
+    async def get_group_hierarchy(
+        self: Self,
+        target_group: int,
+        params: Optional[dict[str, Any]] = None,
+    ) -> tuple[list[int], list[int]]:
+        "see `GitLab.get_group_hierarchy`"
+        LOGGER.debug("finding descendant groups and projects in %s", target_group)
+
+        async def collect(
+            url_postfix: str,
+            params: Optional[dict[str, Any]] = None,
+        ) -> list[dict[str, Any]]:
+            return [item async for item in self.paginate(url_postfix, params)]
+
+        groups, projects = await asyncio.gather(
+            collect(f"{Entity.GROUP.value}/{target_group}/descendant_groups"),
+            collect(
+                f"{Entity.GROUP.value}/{target_group}/{Entity.PROJECT.value}",
+                params={**(params or {}), "include_subgroups": "true"},
+            ),
+        )
+
+        LOGGER.debug("found %s groups and %s projects", len(groups), len(projects))
+
+        return [self.entity_cache.add(Entity.GROUP, group).id for group in groups], [
+            self.entity_cache.add(Entity.PROJECT, project).id for project in projects
+        ]
+
+    async def get_all_groups_recursive(
+        self: Self,
+        target_group: int,
+    ) -> list[int]:
+        LOGGER.debug("finding subgroups in %s", target_group)
+        subgroups = await self.get_all_groups_from_group(target_group)
+        LOGGER.debug("found subgroups: %s", subgroups)
+
+        groups = list(subgroups)
+        for nested in await asyncio.gather(
+            *(self.get_all_groups_recursive(subgroup) for subgroup in subgroups)
+        ):
+            groups.extend(nested)
+
+        return groups
+
+    async def get_all_projects_recursive(
+        self: Self,
+        target_group: int,
+        params: Optional[dict[str, Any]] = None,
+    ) -> list[int]:
+        LOGGER.debug("finding projects in %s", target_group)
+        projects, subgroups = await asyncio.gather(
+            self.get_all_projects_from_group(target_group, params),
+            self.get_all_groups_from_group(target_group),
+        )
+        LOGGER.debug("found projects: %s", projects)
+
+        for nested in await asyncio.gather(
+            *(
+                self.get_all_projects_recursive(subgroup, params)
+                for subgroup in subgroups
+            )
+        ):
+            projects.extend(nested)
+
+        return projects
+
+    async def get_entity_id_from_url(
+        self: Self,
+        entity_path: str,
+        entity_type: Entity,
+    ) -> int:
+        url_path = _helpers.get_urlencoded_path(entity_path)
+
+        r = await self._send_gitlab_request(
+            method="GET",
+            url_postfix=f"{entity_type.value}/{url_path}",
+        )
+
+        return self.entity_cache.add(entity_type, r.json()).id
+
+    async def get_entity_metadata(
+        self: Self,
+        entity_id: int,
+        entity_type: Entity,
+        refresh: bool = False,
+    ) -> EntityMetadata:
+        "see `GitLab.get_entity_metadata`"
+        metadata = None if refresh else self.entity_cache.get(entity_type, entity_id)
+        if metadata is not None:
+            return metadata
+
+        r = await self._send_gitlab_request(
+            method="GET",
+            url_postfix=f"{entity_type.value}/{entity_id}",
+        )
+
+        if r.is_error:
+            # reachable only with ignored request errors
+            raise LookupError(f"{entity_type.lname} {entity_id} is not available")
+
+        return self.entity_cache.add(entity_type, r.json())
+
+    async def get_settings_changes(
+        self: Self,
+        entity_id: int,
+        entity_type: Entity,
+        config: dict[str, Any],
+    ) -> list[PlannedChange]:
+        r = await self._send_gitlab_request(
+            method="GET",
+            url_postfix=(f"{entity_type.value}/{entity_id}"),
+        )
+
+        if not r.is_success:
+            # reachable only with ignored request errors
+            LOGGER.warning(
+                "SKIP: settings of %s %s are not available",
+                entity_type.lname,
+                entity_id,
+            )
+            return []
+
+        current_settings = r.json()
+        self.entity_cache.add(entity_type, current_settings)
+
+        return _helpers.get_settings_changes(
+            f"{entity_type.value}/{entity_id}", current_settings, config
+        )
+
+    async def get_variables_changes(
+        self: Self,
+        entity_id: int,
+        entity_type: Entity,
+        config_variables: list[dict[str, Any]],
+    ) -> list[PlannedChange]:
+        current_variables = [
+            var
+            async for var in self.paginate(f"{entity_type.value}/{entity_id}/variables")
+        ]
+
+        return _helpers.get_variables_changes(
+            f"{entity_type.value}/{entity_id}", current_variables, config_variables
+        )
+
+    async def get_protected_branches_changes(
+        self: Self,
+        entity_id: int,
+        entity_type: Entity,
+        config_protected_branches: dict[str, Any],
+    ) -> list[PlannedChange]:
+        if entity_type == Entity.GROUP and not await self.is_top_level_group(entity_id):
+            LOGGER.info("SKIP: group %s is not top-level", entity_id)
+            return []
+
+        current_protected_branches = [
+            branch
+            async for branch in self.paginate(
+                f"{entity_type.value}/{entity_id}/protected_branches"
+            )
+        ]
+
+        return _helpers.get_protected_branches_changes(
+            f"{entity_type.value}/{entity_id}",
+            current_protected_branches,
+            config_protected_branches,
+        )
+
+    async def get_entity_changes(
+        self: Self,
+        entity_id: int,
+        entity_type: Entity,
+        entity_config: dict[str, Any],
+    ) -> list[PlannedChange]:
+        "see `GitLab.get_entity_changes`"
+        reads = []
+
+        if entity_config.get("settings"):
+            reads.append(
+                self.get_settings_changes(
+                    entity_id, entity_type, entity_config["settings"]
+                )
+            )
+
+        if entity_config.get("variables"):
+            reads.append(
+                self.get_variables_changes(
+                    entity_id, entity_type, entity_config["variables"]
+                )
+            )
+
+        if entity_config.get("protected_branches"):
+            reads.append(
+                self.get_protected_branches_changes(
+                    entity_id, entity_type, entity_config["protected_branches"]
+                )
+            )
+
+        return [
+            change for changes in await asyncio.gather(*reads) for change in changes
+        ]
+
+    async def apply_change(self: Self, change: PlannedChange) -> None:
+        LOGGER.debug(
+            "%s: %s in %s", change.action.upper(), change.target, change.entity
+        )
+
+        for request in change.requests:
+            await self._send_gitlab_request(
+                request.method,
+                request.url_postfix,
+                request.data,
+                request.params or None,
+            )
+
+    async def apply_changes(self: Self, changes: list[PlannedChange]) -> bool:
+        "see `GitLab.apply_changes`"
+        await asyncio.gather(*(self.apply_change(change) for change in changes))
+
+        return bool(changes)
+
+    async def confugure_entity(
+        self: Self,
+        entity_id: int,
+        entity_type: Entity,
+        config: dict[str, Any],
+    ) -> bool:
+        "Sends changed settings only, returns whether anything was written"
+        changes = await self.get_settings_changes(entity_id, entity_type, config)
+
+        if not changes:
+            LOGGER.debug(
+                "SKIP: %s %s settings are equals", entity_type.lname, entity_id
+            )
+            return False
+
+        await self.apply_changes(changes)
+
+        LOGGER.debug("%s %s configured success", entity_type.lname, entity_id)
+
+        return True
+
+    async def update_entity_variables(
+        self: Self,
+        entity_id: int,
+        entity_type: Entity,
+        config_variables: list[dict[str, Any]],
+    ) -> bool:
+        "Returns whether any variable was written"
+        return await self.apply_changes(
+            await self.get_variables_changes(entity_id, entity_type, config_variables)
+        )
+
+    async def update_entity_protected_branches(
+        self: Self,
+        entity_id: int,
+        entity_type: Entity,
+        config_protected_branches: dict[str, Any],
+    ) -> bool:
+        "Returns whether any protected branch was written"
+        return await self.apply_changes(
+            await self.get_protected_branches_changes(
+                entity_id, entity_type, config_protected_branches
+            )
+        )
+
+    async def is_top_level_group(self: Self, group_id: int) -> bool:
+        metadata = await self.get_entity_metadata(group_id, Entity.GROUP)
+
+        return metadata.parent_id is None
+
+    async def create_entity(
+        self: Self,
+        entity_type: Entity,
+        entity_settings: dict[str, Any],
+    ) -> int:
+        r = await self._send_gitlab_request(
+            method="POST",
+            url_postfix=f"{entity_type.value}",
+            data=entity_settings,
+        )
+
+        return r.json()["id"]
+
+    async def archive_entity(
+        self: Self,
+        entity_id: int,
+        entity_type: Entity,
+        archive: bool,
+    ) -> None:
+        if entity_type == Entity.GROUP:
+            # see GitLab.archive_entity
+            LOGGER.warning(
+                "archive group disabled in GitLab, see issue:"
+                "https://gitlab.com/groups/gitlab-org/-/epics/15019"
+            )
+            return None
+
+        status = "archive" if archive else "unarchive"
+
+        await self._send_gitlab_request(
+            method="POST",
+            url_postfix=f"{entity_type.value}/{entity_id}/{status}",
+        )
+
+    async def delete_entity(
+        self: Self,
+        entity_id: int,
+        entity_type: Entity,
+    ) -> None:
+        await self._send_gitlab_request(
+            method="DELETE",
+            url_postfix=f"{entity_type.value}/{entity_id}",
+        )
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+
+from typing_extensions import Any, Optional, Self
+
+from .. import __version__
+from ..utils._helpers import LOGGER
+
+
+class ConfigCache:
+    """
+    Directory of validated configs: `config_model_json` of a config file is
+    stored under the hash of the file content and the pivlabform version, so
+    an unchanged config skips YAML parsing and pydantic validation. Hashes
+    of the configs it `extends` are stored too and checked on load.
+    """
+
+    VERSION = 2
+
+    def __init__(self: Self, path: str) -> None:
+        self.path = path
+
+    @staticmethod
+    def get_key(content: bytes) -> str:
+        digest = hashlib.sha256(f"{__version__}\0".encode())
+        digest.update(content)
+        return digest.hexdigest()
+
+    @staticmethod
+    def get_file_key(path: str) -> Optional[str]:
+        try:
+            with open(path, "rb") as f:
+                return hashlib.sha256(f.read()).hexdigest()
+        except OSError:
+            return None
+
+    def _get_file(self: Self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
+    def load(self: Self, key: str) -> Optional[dict[str, Any]]:
+        try:
+            with open(self._get_file(key), encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            LOGGER.warning(f"config cache {key} is unreadable, ignoring: {e}")
+            return None
+
+        if data.get("version") != self.VERSION:
+            return None
+
+        for path, file_key in data.get("extends", {}).items():
+            if self.get_file_key(path) != file_key:
+                return None
+
+        return data.get("config")
+
+    def save(
+        self: Self,
+        key: str,
+        config_model_json: dict[str, Any],
+        extends: Optional[dict[str, bytes]] = None,
+    ) -> None:
+        "Parallel pipelines may share the directory, so writes are atomic"
+        os.makedirs(self.path, exist_ok=True)
+
+        path = self._get_file(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "version": self.VERSION,
+                    "config": config_model_json,
+                    "extends": {
+                        path: hashlib.sha256(content).hexdigest()
+                        for path, content in (extends or {}).items()
+                    },
+                },
+                f,
+            )
+
+        os.replace(tmp_path, path)
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import time
+
+from typing_extensions import Any, Optional, Self
+
+from ..utils._helpers import LOGGER
+from .gitlab import Entity, EntityCache
+from .models import EntityMetadata
+
+
+class DiscoveryFile:
+    """
+    JSON artifact with discovered groups and projects per config and their
+    metadata, so parallel jobs of one pipeline (e.g. shards) load the work
+    set written by an earlier job instead of listing GitLab each.
+
+    Results are stored under a key of the config parts discovery depends on,
+    so a changed config discovers again and configs of a batch share one
+    file.
+    """
+
+    VERSION = 1
+
+    def __init__(self: Self, path: str, gitlab_host: str) -> None:
+        self.path = path
+        self.gitlab_host = gitlab_host
+        self.configs: dict[str, dict[str, list[int]]] = {}
+        self.entities: dict[str, dict[str, Any]] = {}
+
+        self._load()
+
+    def _load(self: Self) -> None:
+        if not os.path.exists(self.path):
+            return None
+
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            LOGGER.warning(f"discovery file {self.path} is unreadable, ignoring: {e}")
+            return None
+
+        if data.get("version") != self.VERSION or data.get("host") != self.gitlab_host:
+            LOGGER.warning(f"discovery file {self.path} is outdated, ignoring")
+            return None
+
+        self.configs = data.get("configs", {})
+        self.entities = data.get("entities", {})
+
+    def save(self: Self) -> None:
+        "Writes to a temporary file first, so a crash never leaves a broken file"
+        data = {
+            "version": self.VERSION,
+            "host": self.gitlab_host,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "configs": self.configs,
+            "entities": self.entities,
+        }
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, sort_keys=True)
+
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def get_key(
+        config_model_json: dict[str, Any],
+        filters: dict[str, Any],
+        recursive: bool,
+    ) -> str:
+        "Settings of the config don't change what is discovered"
+        return hashlib.sha256(
+            json.dumps(
+                {
+                    "groups": config_model_json.get("groups", []),
+                    "projects": config_model_json.get("projects", []),
+                    "filters": filters,
+                    "recursive": recursive,
+                },
+                sort_keys=True,
+            ).encode()
+        ).hexdigest()
+
+    @staticmethod
+    def _get_entity_key(entity_type: Entity, entity_id: int) -> str:
+        return f"{entity_type.value}/{entity_id}"
+
+    def get(
+        self: Self,
+        key: str,
+        entity_cache: EntityCache,
+    ) -> Optional[tuple[list[int], list[int]]]:
+        "Returns group and project IDs and puts their metadata to `entity_cache`"
+        found = self.configs.get(key)
+        if found is None:
+            return None
+
+        for entity_type in (Entity.GROUP, Entity.PROJECT):
+            for entity_id in found[entity_type.value]:
+                metadata = self.entities.get(
+                    self._get_entity_key(entity_type, entity_id)
+                )
+                if metadata is not None:
+                    entity_cache.put(EntityMetadata(**metadata))
+
+        return list(found[Entity.GROUP.value]), list(found[Entity.PROJECT.value])
+
+    def put(
+        self: Self,
+        key: str,
+        groups: list[int],
+        projects: list[int],
+        entity_cache: EntityCache,
+    ) -> None:
+        self.configs[key] = {
+            Entity.GROUP.value: list(groups),
+            Entity.PROJECT.value: list(projects),
+        }
+
+        for entity_type, entities in (
+            (Entity.GROUP, groups),
+            (Entity.PROJECT, projects),
+        ):
+            for entity_id in entities:
+                metadata = entity_cache.get(entity_type, entity_id)
+                if metadata is not None:
+                    self.entities[self._get_entity_key(entity_type, entity_id)] = (
+                        metadata.model_dump()
+                    )
@@ -1,12 +1,31 @@
+import contextvars
+import functools
 import json
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 
 import requests
-from typing_extensions import Any, Self
+from requests.adapters import HTTPAdapter
+from typing_extensions import Any, Callable, Iterator, Optional, Self
 
 from ..utils import _helpers
 from ..utils._helpers import LOGGER
+from ..utils._logger import LazyJson
+from .metrics import RequestMetrics
+from .models import EntityMetadata, PlannedChange
+from .transport import (
+    IDEMPOTENT_METHODS,
+    GitLabRequestError,
+    RateLimiter,
+    RetryPolicy,
+    RetryStats,
+    TransportConfig,
+    record_request_error,
+    should_raise_request_errors,
+)
 
 
 class Entity(str, Enum):
@@ -37,112 +56,337 @@ class Entity(str, Enum):
         sys.exit(1)
 
 
+class EntityCache:
+    """
+    Per-run metadata of groups and projects seen by discovery and reads,
+    so the apply phase looks up parent_id, full_path and archived flag
+    instead of refetching the entity.
+    """
+
+    def __init__(self: Self) -> None:
+        self._entities: dict[tuple[Entity, int], EntityMetadata] = {}
+
+    @staticmethod
+    def _kind(entity_type: Entity) -> Entity:
+        return Entity.GROUP if entity_type == Entity.SUBGROUP else entity_type
+
+    def add(self: Self, entity_type: Entity, data: dict[str, Any]) -> EntityMetadata:
+        kind = self._kind(entity_type)
+        return self.put(EntityMetadata.from_api(kind.lname, data))
+
+    def put(self: Self, metadata: EntityMetadata) -> EntityMetadata:
+        self._entities[(Entity.from_string(metadata.kind), metadata.id)] = metadata
+
+        return metadata
+
+    def get(
+        self: Self, entity_type: Entity, entity_id: int
+    ) -> Optional[EntityMetadata]:
+        return self._entities.get((self._kind(entity_type), int(entity_id)))
+
+    def __len__(self: Self) -> int:
+        return len(self._entities)
+
+
 class GitLab:
     def __init__(
         self: Self,
         gitlab_host: str = "",
+        retry_policy: Optional[RetryPolicy] = None,
+        fan_out: int = 4,
+        transport: Optional[TransportConfig] = None,
     ):
         gitlab_host = _helpers.get_gitlab_host() if not gitlab_host else gitlab_host
         self.gitlab_api_url = f"{gitlab_host}/api/v4"
-        self.gitlab_session = requests.Session()
+        self.gitlab_graphql_url = f"{gitlab_host}/api"
+        self.gitlab_token = _helpers.get_gitlab_token()
+        self._local = threading.local()
 
-        self.gitlab_session.headers.update(
-            {"PRIVATE-TOKEN": _helpers.get_gitlab_token()}
-        )
+        self.retry_policy = retry_policy or RetryPolicy.from_env()
+        self.transport = transport or TransportConfig.from_env()
+        self.rate_limiter = RateLimiter()
+        self.retry_stats = RetryStats()
+        self.metrics = RequestMetrics()
+
+        self.entity_cache = EntityCache()
+        # current state read in bulk ahead of the diff, used once and dropped
+        self.prefetched: dict[tuple[Entity, int, str], Any] = {}
+
+        self.fan_out = fan_out
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        # sessions of all threads, closed by `close`
+        self._sessions: list[requests.Session] = []
+
+    def __enter__(self: Self) -> Self:
+        return self
+
+    def __exit__(self: Self, *_: Any) -> None:
+        self.close()
+
+    def close(self: Self) -> None:
+        "Shuts down the request pool and closes sessions, later requests open new ones"
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+            sessions, self._sessions = self._sessions, []
+            self._local = threading.local()
+
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+        for session in sessions:
+            session.close()
+
+    @property
+    def gitlab_session(self: Self) -> requests.Session:
+        "requests.Session is not thread-safe, so every worker thread gets its own"
+        session: requests.Session | None = getattr(self._local, "session", None)
+
+        if session is None:
+            session = requests.Session()
+            session.headers.update(
+                {"PRIVATE-TOKEN": self.gitlab_token, **self.transport.get_headers()}
+            )
+
+            adapter = HTTPAdapter(pool_maxsize=self.transport.pool_size or 10)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+
+            self._local.session = session
+            with self._executor_lock:
+                self._sessions.append(session)
+
+        return session
 
     def _send_gitlab_request(
         self: Self,
         method: str = "GET",
         url_postfix: str = "",
         data: dict[str, Any] | Any = {},
+        params: Optional[dict[str, Any]] = None,
+        base_url: Optional[str] = None,
+        exit_on_error: bool = True,
     ) -> requests.Response:
-        r = self.gitlab_session.request(
-            method=method,
-            url=f"{self.gitlab_api_url}/{url_postfix}",
-            json=data,
-        )
+        "With `exit_on_error` off a failed response is returned to the caller as is"
+        url = f"{base_url or self.gitlab_api_url}/{url_postfix}"
+        attempt = 0
 
-        if not r.ok:
+        while True:
+            delay = self.rate_limiter.reserve()
+            if delay > 0:
+                self.retry_stats.add_paced()
+                time.sleep(delay)
+
+            start = time.perf_counter()
+            try:
+                r = self.gitlab_session.request(
+                    method=method,
+                    url=url,
+                    json=data,
+                    params=params,
+                    timeout=(self.transport.connect_timeout, self.retry_policy.timeout),
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.metrics.record(
+                    method, url_postfix, "error", 0, 0, time.perf_counter() - start
+                )
+
+                # read timeout of a POST may mean the request was applied
+                retryable = not isinstance(e, requests.ReadTimeout) or (
+                    method.upper() in IDEMPOTENT_METHODS
+                )
+
+                if not retryable or attempt >= self.retry_policy.max_retries:
+                    error = f"{method} {url}: {type(e).__name__}"
+                    record_request_error(error)
+                    LOGGER.error(f"ERROR: {type(e).__name__}: {e}")
+                    LOGGER.error(f"URL: {url}")
+                    if not _helpers.ignore_errors():
+                        if should_raise_request_errors():
+                            raise GitLabRequestError(error) from e
+                        sys.exit(1)
+                    raise
+
+                delay = self.retry_policy.get_backoff(attempt)
+                reason = type(e).__name__
+            else:
+                self.metrics.record(
+                    method,
+                    url_postfix,
+                    str(r.status_code),
+                    len(r.request.body or b""),
+                    len(r.content),
+                    time.perf_counter() - start,
+                )
+                self.rate_limiter.update(r.headers)
+
+                if (
+                    not self.retry_policy.should_retry(method, r.status_code)
+                    or attempt >= self.retry_policy.max_retries
+                ):
+                    break
+
+                delay = self.retry_policy.get_retry_delay(attempt, r.headers)
+                reason = str(r.status_code)
+
+            attempt += 1
+            self.retry_stats.add_retry(reason)
+            LOGGER.warning(
+                f"RETRY: {method} {url} failed with {reason}, "
+                f"attempt {attempt}/{self.retry_policy.max_retries} in {delay:.1f}s"
+            )
+            time.sleep(delay)
+
+        if not r.ok and exit_on_error:
+            error = f"{method} {url}: {r.status_code}"
+            record_request_error(error)
             LOGGER.error(f"ERROR: {r.status_code}:{r.text}")
-            LOGGER.error(f"URL: {self.gitlab_api_url}/{url_postfix}")
+            LOGGER.error(f"URL: {url}")
             LOGGER.error(f"DATA:\n{json.dumps(data, indent=4)}")
             if not _helpers.ignore_errors():
+                if should_raise_request_errors():
+                    raise GitLabRequestError(error, r.status_code)
                 sys.exit(1)
 
         return r
 
-    def get_all_projects_from_group(
+    def _run_concurrently(
         self: Self,
-        target_group: int,
-    ) -> list[int]:
-        all_projects: list[int] = []
-        next_page = 1
+        calls: list[Callable[[], Any]],
+    ) -> list[Any]:
+        """
+        Runs independent requests of one entity on the request pool shared by
+        all entity workers, so total fan-out stays bounded by `fan_out`.
+        Calls keep the caller context, their logs land in the caller buffer.
+        """
+        if self.fan_out <= 1 or len(calls) <= 1:
+            return [call() for call in calls]
+
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.fan_out)
+
+        futures = [
+            self._executor.submit(contextvars.copy_context().run, call)
+            for call in calls
+        ]
+
+        return [future.result() for future in futures]
+
+    def paginate(
+        self: Self,
+        url_postfix: str,
+        params: Optional[dict[str, Any]] = None,
+        per_page: int = 100,
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Yields items of a GitLab listing endpoint one by one.
+        Follows the `Link: rel="next"` header (offset and keyset pagination)
+        with a fallback to `X-Next-Page`; the next page is requested only
+        after the caller has consumed the current one.
+        """
+        params = {**(params or {}), "per_page": per_page}
 
-        while True:
-            r = self._send_gitlab_request(
-                method="GET",
-                url_postfix=(
-                    f"{Entity.GROUP.value}/{target_group}/{Entity.PROJECT.value}"
-                    "?pagination=keyset"
-                    "&per_page=100"
-                    "&order_by=id"
-                    f"&page={next_page}"
-                ),
-            )
+        r = self._send_gitlab_request(
+            method="GET",
+            url_postfix=url_postfix,
+            params=params,
+        )
 
+        while True:
             if not r.ok:
                 raise RuntimeError(f"ERROR: {r.text}" f"STATUS: {r.status_code}")
 
-            found_projects = [project["id"] for project in r.json()]
+            yield from r.json()
 
-            all_projects.extend(found_projects)
+            next_url = r.links.get("next", {}).get("url")
+            next_page = r.headers.get("X-Next-Page")
 
-            next_page += 1
+            if next_url:
+                # next link already carries every query parameter
+                r = self._send_gitlab_request(
+                    method="GET",
+                    url_postfix=next_url.split("/api/v4/", 1)[-1],
+                )
+            elif next_page:
+                r = self._send_gitlab_request(
+                    method="GET",
+                    url_postfix=url_postfix,
+                    params={**params, "page": next_page},
+                )
+            else:
+                return None
 
-            if len(r.json()) < 100:
-                break
+    def get_all_projects_from_group(
+        self: Self,
+        target_group: int,
+        params: Optional[dict[str, Any]] = None,
+    ) -> list[int]:
+        "`params` filter the listing, e.g. `archived=false`"
+        return [
+            self.entity_cache.add(Entity.PROJECT, project).id
+            for project in self.paginate(
+                f"{Entity.GROUP.value}/{target_group}/{Entity.PROJECT.value}",
+                params=params,
+            )
+        ]
 
-        return all_projects
+    def get_group_variables(self: Self, group_id: int) -> list[dict[str, Any]]:
+        "Variables of the group, inherited by its subgroups and projects"
+        return list(self.paginate(f"{Entity.GROUP.value}/{group_id}/variables"))
 
     def get_all_groups_from_group(
         self: Self,
         target_group: int,
     ) -> list[int]:
-        all_groups: list[int] = []
-        next_page = 1
-
-        while True:
-            r = self._send_gitlab_request(
-                method="GET",
-                url_postfix=(
-                    f"{Entity.GROUP.value}/{target_group}/{Entity.SUBGROUP.value}"
-                    "?pagination=keyset"
-                    "&per_page=100"
-                    "&order_by=id"
-                    f"&page={next_page}"
-                ),
+        return [
+            self.entity_cache.add(Entity.GROUP, group).id
+            for group in self.paginate(
+                f"{Entity.GROUP.value}/{target_group}/{Entity.SUBGROUP.value}"
             )
+        ]
 
-            if not r.ok:
-                raise RuntimeError(f"ERROR: {r.text}" f"STATUS: {r.status_code}")
-
-            found_groups = [group["id"] for group in r.json()]
-
-            all_groups.extend(found_groups)
+    def get_group_hierarchy(
+        self: Self,
+        target_group: int,
+        params: Optional[dict[str, Any]] = None,
+    ) -> tuple[list[int], list[int]]:
+        """
+        Returns ids of all descendant groups and of all projects in the
+        group hierarchy. Uses `descendant_groups` and `include_subgroups`
+        listings, so the whole tree costs a few paginated calls
+        instead of several calls per subgroup. `params` filter projects.
+        """
+        LOGGER.debug("finding descendant groups and projects in %s", target_group)
+
+        groups = [
+            self.entity_cache.add(Entity.GROUP, group).id
+            for group in self.paginate(
+                f"{Entity.GROUP.value}/{target_group}/descendant_groups",
+            )
+        ]
+        projects = [
+            self.entity_cache.add(Entity.PROJECT, project).id
+            for project in self.paginate(
+                f"{Entity.GROUP.value}/{target_group}/{Entity.PROJECT.value}",
+                params={**(params or {}), "include_subgroups": "true"},
+            )
+        ]
 
-            if len(r.json()) < 100:
-                break
+        LOGGER.debug("found %s groups and %s projects", len(groups), len(projects))
 
-        return all_groups
+        return groups, projects
 
     def get_all_groups_recursive(
         self: Self,
         target_group: int,
-        groups: list[int] = [],
+        groups: Optional[list[int]] = None,
     ):
-        LOGGER.debug(f"finding subgroups in {target_group}")
+        groups = [] if groups is None else groups
+
+        LOGGER.debug("finding subgroups in %s", target_group)
         subgroups = self.get_all_groups_from_group(target_group)
-        LOGGER.debug(f"found subgroups: {subgroups}")
+        LOGGER.debug("found subgroups: %s", subgroups)
         groups.extend(subgroups)
 
         for subgroup in subgroups:
@@ -156,18 +400,21 @@ class GitLab:
     def get_all_projects_recursive(
         self: Self,
         target_group: int,
-        projects: list[int] = [],
+        projects: Optional[list[int]] = None,
+        params: Optional[dict[str, Any]] = None,
     ) -> list[int]:
+        projects = [] if projects is None else projects
 
-        LOGGER.debug(f"finding projects in {target_group}")
-        projects.extend(self.get_all_projects_from_group(target_group))
-        LOGGER.debug(f"found projects: {projects}")
+        LOGGER.debug("finding projects in %s", target_group)
+        projects.extend(self.get_all_projects_from_group(target_group, params))
+        LOGGER.debug("found projects: %s", projects)
 
         subgroups = self.get_all_groups_from_group(target_group)
         for subgroup in subgroups:
             projects = self.get_all_projects_recursive(
                 subgroup,
                 projects,
+                params,
             )
 
         return projects
@@ -184,130 +431,227 @@ class GitLab:
             url_postfix=f"{entity_type.value}/{url_path}",
         )
 
-        return r.json()["id"]
+        return self.entity_cache.add(entity_type, r.json()).id
 
-    def confugure_entity(
+    def get_entity_metadata(
         self: Self,
-        entity_id: int | int,
+        entity_id: int,
         entity_type: Entity,
-        config: dict[str, Any],
-    ) -> None:
-        self._send_gitlab_request(
-            method="PUT",
-            url_postfix=(f"{entity_type.value}/{entity_id}"),
-            data=config,
+        refresh: bool = False,
+    ) -> EntityMetadata:
+        """
+        Returns metadata from the run cache, fetches the entity only on a miss
+        or when `refresh` is set
+        """
+        metadata = None if refresh else self.entity_cache.get(entity_type, entity_id)
+        if metadata is not None:
+            return metadata
+
+        r = self._send_gitlab_request(
+            method="GET",
+            url_postfix=f"{entity_type.value}/{entity_id}",
         )
 
-        LOGGER.debug(f"{entity_type.lname} {entity_id} configured success")
+        if not r.ok:
+            # reachable only with ignored request errors
+            raise LookupError(f"{entity_type.lname} {entity_id} is not available")
 
-    def update_entity_variables(
+        return self.entity_cache.add(entity_type, r.json())
+
+    def is_prefetched(self: Self, entity_type: Entity, entity_id: int) -> bool:
+        return any(
+            (entity_type, entity_id, resource) in self.prefetched
+            for resource in ("settings", "variables")
+        )
+
+    def get_settings_changes(
         self: Self,
         entity_id: int,
         entity_type: Entity,
-        config_variables: list[dict[str, Any]],
-    ):
-        r = self._send_gitlab_request(
-            method="GET",
-            url_postfix=f"{entity_type.value}/{entity_id}/variables",
+        config: dict[str, Any],
+    ) -> list[PlannedChange]:
+        current_settings = self.prefetched.pop(
+            (entity_type, entity_id, "settings"), None
         )
-        current_variables = r.json()
-
-        variables = _helpers.check_variables_diff(current_variables, config_variables)
 
-        for var in variables["create"]:
-            self._send_gitlab_request(
-                method="POST",
-                url_postfix=(f"{entity_type.value}/{entity_id}/variables"),
-                data=var,
+        # prefetched state may lack some of the configured settings
+        if current_settings is None or not config.keys() <= current_settings.keys():
+            r = self._send_gitlab_request(
+                method="GET",
+                url_postfix=(f"{entity_type.value}/{entity_id}"),
             )
 
-        for var in variables["update"]:
-            self._send_gitlab_request(
-                method="PUT",
-                url_postfix=(
-                    (f"{entity_type.value}/" f"{entity_id}/variables/{var['key']}")
-                ),
-                data=var,
-            )
+            if not r.ok:
+                # reachable only with ignored request errors
+                LOGGER.warning(
+                    "SKIP: settings of %s %s are not available",
+                    entity_type.lname,
+                    entity_id,
+                )
+                return []
 
-        # COMMENT THIS BLOCK FOR DISABLE REMOVING VARIABLES
-        for var in variables["delete"]:
-            self._send_gitlab_request(
-                method="DELETE",
-                url_postfix=(
-                    (f"{entity_type.value}/" f"{entity_id}/variables/{var['key']}")
-                ),
-            )
+            current_settings = r.json()
+            self.entity_cache.add(entity_type, current_settings)
 
-    def update_entity_protected_branches(
+        return _helpers.get_settings_changes(
+            f"{entity_type.value}/{entity_id}", current_settings, config
+        )
+
+    def get_variables_changes(
         self: Self,
         entity_id: int,
         entity_type: Entity,
-        config_protected_branches: dict[str, Any],
-    ) -> None:
-        r = self._send_gitlab_request(
-            method="GET",
-            url_postfix=(f"{entity_type.value}/{entity_id}/protected_branches"),
+        config_variables: list[dict[str, Any]],
+    ) -> list[PlannedChange]:
+        current_variables = self.prefetched.pop(
+            (entity_type, entity_id, "variables"), None
+        )
+        if current_variables is None:
+            current_variables = list(
+                self.paginate(f"{entity_type.value}/{entity_id}/variables")
+            )
+
+        return _helpers.get_variables_changes(
+            f"{entity_type.value}/{entity_id}", current_variables, config_variables
         )
 
+    def get_protected_branches_changes(
+        self: Self,
+        entity_id: int,
+        entity_type: Entity,
+        config_protected_branches: dict[str, Any],
+    ) -> list[PlannedChange]:
         if entity_type == Entity.GROUP and not self.is_top_level_group(entity_id):
-            LOGGER.info(f"SKIP: group {entity_id} is not top-level")
-            return None
+            LOGGER.info("SKIP: group %s is not top-level", entity_id)
+            return []
 
-        current_branches = _helpers.parse_protected_branches(r.json())
+        current_protected_branches = list(
+            self.paginate(f"{entity_type.value}/{entity_id}/protected_branches")
+        )
 
-        LOGGER.debug(f"current_branches:\n{json.dumps(current_branches, indent=2)}")
+        LOGGER.debug("current_branches:\n%s", LazyJson(current_protected_branches))
         LOGGER.debug(
-            (
-                f"config_protected_branches:\n"
-                f"{json.dumps(config_protected_branches, indent=2)}"
-            )
+            "config_protected_branches:\n%s", LazyJson(config_protected_branches)
         )
 
-        for branch in current_branches:
-            if branch not in config_protected_branches:
-                LOGGER.debug(f"REMOVE: {branch} not found in config")
-                self._send_gitlab_request(
-                    method="DELETE",
-                    url_postfix=(
-                        f"{entity_type.value}/{entity_id}/protected_branches/{branch}"
-                    ),
+        return _helpers.get_protected_branches_changes(
+            f"{entity_type.value}/{entity_id}",
+            current_protected_branches,
+            config_protected_branches,
+        )
+
+    def get_entity_changes(
+        self: Self,
+        entity_id: int,
+        entity_type: Entity,
+        entity_config: dict[str, Any],
+    ) -> list[PlannedChange]:
+        "Read-only: computes all changes of the entity, reads run concurrently"
+        calls: list[Callable[[], list[PlannedChange]]] = []
+
+        if entity_config.get("settings"):
+            calls.append(
+                functools.partial(
+                    self.get_settings_changes,
+                    entity_id,
+                    entity_type,
+                    entity_config["settings"],
+                )
+            )
+
+        if entity_config.get("variables"):
+            calls.append(
+                functools.partial(
+                    self.get_variables_changes,
+                    entity_id,
+                    entity_type,
+                    entity_config["variables"],
+                )
+            )
+
+        if entity_config.get("protected_branches"):
+            calls.append(
+                functools.partial(
+                    self.get_protected_branches_changes,
+                    entity_id,
+                    entity_type,
+                    entity_config["protected_branches"],
                 )
+            )
+
+        return [
+            change for changes in self._run_concurrently(calls) for change in changes
+        ]
+
+    def apply_change(self: Self, change: PlannedChange) -> None:
+        LOGGER.debug(
+            "%s: %s in %s", change.action.upper(), change.target, change.entity
+        )
 
-        for branch in config_protected_branches:
-            if branch in current_branches:
-                if not config_protected_branches[branch] == current_branches[branch]:
-                    LOGGER.debug(f"REMOVE: {branch} in entity and config has diff")
-                    self._send_gitlab_request(
-                        method="DELETE",
-                        url_postfix=(
-                            f"{entity_type.value}/"
-                            f"{entity_id}/protected_branches/{branch}"
-                        ),
-                    )
-                else:
-                    LOGGER.debug(f"SKIP: {branch} in entity and config are equals")
-                    continue
-
-            branch_data = {"name": branch}
-            branch_params = config_protected_branches[branch]
-            if branch_params:
-                branch_data.update(branch_params)
-            LOGGER.debug(f"CREATE: {branch} added to entity")
+        for request in change.requests:
             self._send_gitlab_request(
-                method="POST",
-                url_postfix=(f"{entity_type.value}/{entity_id}/protected_branches"),
-                data=branch_data,
+                method=request.method,
+                url_postfix=request.url_postfix,
+                data=request.data,
+                params=request.params or None,
             )
 
-    def is_top_level_group(self: Self, group_id: int) -> bool:
-        response = self._send_gitlab_request(
-            method="GET",
-            url_postfix=f"{Entity.GROUP.value}/{group_id}",
+    def apply_changes(self: Self, changes: list[PlannedChange]) -> bool:
+        "Applies independent changes concurrently, returns whether anything was written"
+        self._run_concurrently(
+            [functools.partial(self.apply_change, change) for change in changes]
         )
-        group_info = response.json()
 
-        return group_info.get("parent_id") is None
+        return bool(changes)
+
+    def confugure_entity(
+        self: Self,
+        entity_id: int | int,
+        entity_type: Entity,
+        config: dict[str, Any],
+    ) -> bool:
+        "Sends changed settings only, returns whether anything was written"
+        changes = self.get_settings_changes(entity_id, entity_type, config)
+
+        if not changes:
+            LOGGER.debug(
+                "SKIP: %s %s settings are equals", entity_type.lname, entity_id
+            )
+            return False
+
+        for change in changes:
+            self.apply_change(change)
+
+        LOGGER.debug("%s %s configured success", entity_type.lname, entity_id)
+
+        return True
+
+    def update_entity_variables(
+        self: Self,
+        entity_id: int,
+        entity_type: Entity,
+        config_variables: list[dict[str, Any]],
+    ) -> bool:
+        "Returns whether any variable was written, writes run concurrently"
+        return self.apply_changes(
+            self.get_variables_changes(entity_id, entity_type, config_variables)
+        )
+
+    def update_entity_protected_branches(
+        self: Self,
+        entity_id: int,
+        entity_type: Entity,
+        config_protected_branches: dict[str, Any],
+    ) -> bool:
+        "Returns whether any protected branch was written"
+        return self.apply_changes(
+            self.get_protected_branches_changes(
+                entity_id, entity_type, config_protected_branches
+            )
+        )
+
+    def is_top_level_group(self: Self, group_id: int) -> bool:
+        return self.get_entity_metadata(group_id, Entity.GROUP).parent_id is None
 
     def create_entity(
         self: Self,
@@ -0,0 +1,273 @@
+import functools
+import re
+
+from typing_extensions import Any, Optional, Self
+
+from ..utils._helpers import LOGGER
+from .gitlab import Entity, GitLab
+
+# `projects(ids:)` and nested connections return at most 100 nodes
+BATCH_SIZE = 100
+
+# project settings GraphQL returns under another name and the same value as REST
+PROJECT_SETTINGS_FIELDS = {
+    "description": "description",
+    "visibility": "visibility",
+    "lfs_enabled": "lfsEnabled",
+    "request_access_enabled": "requestAccessEnabled",
+    "only_allow_merge_if_pipeline_succeeds": "onlyAllowMergeIfPipelineSucceeds",
+    "allow_merge_on_skipped_pipeline": "allowMergeOnSkippedPipeline",
+    "only_allow_merge_if_all_discussions_are_resolved": (
+        "onlyAllowMergeIfAllDiscussionsAreResolved"
+    ),
+    "remove_source_branch_after_merge": "removeSourceBranchAfterMerge",
+    "printing_merge_request_link_enabled": "printingMergeRequestLinkEnabled",
+    "autoclose_referenced_issues": "autocloseReferencedIssues",
+    "merge_commit_template": "mergeCommitTemplate",
+    "squash_commit_template": "squashCommitTemplate",
+    "suggestion_commit_message": "suggestionCommitMessage",
+    "shared_runners_enabled": "sharedRunnersEnabled",
+    "container_registry_enabled": "containerRegistryEnabled",
+    "service_desk_enabled": "serviceDeskEnabled",
+    "topics": "topics",
+}
+
+# errors of the schema (e.g. a field of another GitLab version) fail at any
+# batch size, errors of the query size may pass in a smaller batch
+_SCHEMA_ERROR_CODES = {
+    "undefinedField",
+    "undefinedType",
+    "argumentNotAccepted",
+    "argumentLiteralsIncompatible",
+}
+_SCHEMA_ERROR_MESSAGE = re.compile(r"doesn't exist on type|isn't a defined")
+_SIZE_ERROR_MESSAGE = re.compile(
+    r"complexity|too many records|timed out|timeout", re.IGNORECASE
+)
+
+_VARIABLES_FIELDS = """
+      ciVariables(first: 100) {
+        pageInfo { hasNextPage }
+        nodes {
+          key value variableType environmentScope masked protected raw description
+        }
+      }"""
+
+_PROJECTS_QUERY = """
+query($ids: [ID!], $first: Int) {
+  projects(ids: $ids, first: $first) {
+    nodes {
+      id%s
+    }
+  }
+}"""
+
+
+def get_projects_query(settings_keys: set[str], variables: bool) -> str:
+    fields = "".join(
+        f"\n      {PROJECT_SETTINGS_FIELDS[key]}" for key in sorted(settings_keys)
+    )
+    if variables:
+        fields += _VARIABLES_FIELDS
+
+    return _PROJECTS_QUERY % fields
+
+
+def get_global_id(entity_id: int) -> str:
+    return f"gid://gitlab/Project/{entity_id}"
+
+
+def get_error_kind(errors: list[dict[str, Any]]) -> Optional[str]:
+    "`schema`, `size` or None for errors of a GraphQL response"
+    for error in errors:
+        code = (error.get("extensions") or {}).get("code")
+        message = error.get("message") or ""
+        if code in _SCHEMA_ERROR_CODES or _SCHEMA_ERROR_MESSAGE.search(message):
+            return "schema"
+
+    for error in errors:
+        if _SIZE_ERROR_MESSAGE.search(error.get("message") or ""):
+            return "size"
+
+    return None
+
+
+def parse_variables(connection: dict[str, Any]) -> list[dict[str, Any]]:
+    "GraphQL `ciVariables` nodes in the shape of `GET projects/:id/variables`"
+    return [
+        {
+            "key": node["key"],
+            "value": node.get("value"),
+            "variable_type": (node.get("variableType") or "ENV_VAR").lower(),
+            "environment_scope": node.get("environmentScope") or "*",
+            "masked": node.get("masked"),
+            "protected": node.get("protected"),
+            "raw": node.get("raw"),
+            "description": node.get("description"),
+        }
+        for node in connection.get("nodes") or []
+    ]
+
+
+class GraphQLReader:
+    """
+    Reads current state of many projects with one `/api/graphql` query per
+    `batch_size` projects and leaves it in `GitLab.prefetched`, where the
+    diff of every project picks it up instead of its REST reads.
+
+    Only what GraphQL returns in the REST shape is prefetched: CI variables
+    and settings of `PROJECT_SETTINGS_FIELDS`. Other settings, protected
+    branches (GraphQL has no unprotect access levels and no ids of access
+    rules) and groups are read by REST as before, as well as projects
+    GraphQL didn't return. Without GraphQL on the instance, or when its
+    schema lacks a queried field, the reader turns itself off for the rest
+    of the run; batches too complex for the instance are split in halves.
+    """
+
+    def __init__(self: Self, gl: GitLab, batch_size: int = BATCH_SIZE) -> None:
+        self.gl = gl
+        self.batch_size = batch_size
+        self.enabled = True
+
+    def prefetch(
+        self: Self,
+        entity_type: Entity,
+        entity_configs: dict[int, dict[str, Any]],
+    ) -> None:
+        if not self.enabled or entity_type != Entity.PROJECT:
+            return None
+
+        settings_keys: set[str] = set()
+        variables = False
+        entities: list[int] = []
+
+        for entity, config in entity_configs.items():
+            settings = set(config.get("settings") or {})
+            read_settings = settings and settings <= PROJECT_SETTINGS_FIELDS.keys()
+
+            if read_settings:
+                settings_keys |= settings
+            variables |= bool(config.get("variables"))
+
+            if read_settings or config.get("variables"):
+                entities.append(entity)
+
+        if not entities:
+            return None
+
+        query = get_projects_query(settings_keys, variables)
+        batches = []
+        for start in range(0, len(entities), self.batch_size):
+            end = start + self.batch_size
+            batches.append(entities[start:end])
+
+        self.gl._run_concurrently(
+            [
+                functools.partial(
+                    self._prefetch_batch, query, batch, settings_keys, variables
+                )
+                for batch in batches
+            ]
+        )
+
+        if not self.enabled:
+            return None
+
+        LOGGER.info(
+            "prefetched %s of %s projects by GraphQL",
+            sum(1 for entity in entities if self.gl.is_prefetched(entity_type, entity)),
+            len(entities),
+        )
+
+    def _query(self: Self, query: str, batch: list[int]) -> Optional[dict[str, Any]]:
+        "Returns the response body, None when the request itself failed"
+        r = self.gl._send_gitlab_request(
+            method="POST",
+            url_postfix="graphql",
+            data={
+                "query": query,
+                "variables": {
+                    "ids": [get_global_id(entity) for entity in batch],
+                    "first": len(batch),
+                },
+            },
+            base_url=self.gl.gitlab_graphql_url,
+            exit_on_error=False,
+        )
+
+        if r.status_code in (404, 405):
+            if self.enabled:
+                LOGGER.warning(
+                    "GraphQL API is not available, projects are read by REST"
+                )
+            self.enabled = False
+            return None
+
+        if not r.ok:
+            LOGGER.warning("GraphQL query failed with %s", r.status_code)
+            return None
+
+        response = r.json()
+        for error in response.get("errors") or []:
+            LOGGER.debug("GraphQL error: %s", error.get("message"))
+
+        return response
+
+    def _prefetch_batch(
+        self: Self,
+        query: str,
+        batch: list[int],
+        settings_keys: set[str],
+        variables: bool,
+    ) -> None:
+        if not self.enabled:
+            return None
+
+        response = self._query(query, batch)
+        if response is None:
+            return None
+
+        projects = (response.get("data") or {}).get("projects")
+        if projects is None:
+            errors = response.get("errors") or []
+            kind = get_error_kind(errors)
+
+            if kind == "schema":
+                if self.enabled:
+                    LOGGER.warning(
+                        "GraphQL schema of the instance doesn't match (%s), "
+                        "projects are read by REST",
+                        errors[0].get("message"),
+                    )
+                self.enabled = False
+            elif kind == "size" and len(batch) > 1:
+                # too complex or slow for the whole batch, may pass in halves
+                middle = len(batch) // 2
+                self._prefetch_batch(query, batch[:middle], settings_keys, variables)
+                self._prefetch_batch(query, batch[middle:], settings_keys, variables)
+            else:
+                LOGGER.warning(
+                    "GraphQL query of %s projects failed, they are read by REST",
+                    len(batch),
+                )
+            return None
+
+        for node in projects.get("nodes") or []:
+            if not node:
+                continue
+
+            entity = int(node["id"].rsplit("/", 1)[-1])
+
+            if settings_keys:
+                self.gl.prefetched[(Entity.PROJECT, entity, "settings")] = {
+                    key: node[field]
+                    for key, field in PROJECT_SETTINGS_FIELDS.items()
+                    if key in settings_keys and field in node
+                }
+
+            connection = node.get("ciVariables") if variables else None
+            # no access or more variables than one page, left to REST
+            if connection and not connection["pageInfo"]["hasNextPage"]:
+                self.gl.prefetched[(Entity.PROJECT, entity, "variables")] = (
+                    parse_variables(connection)
+                )
@@ -0,0 +1,337 @@
+import sqlite3
+import threading
+import time
+
+from typing_extensions import Any, Optional, Self
+
+from ..utils._helpers import LOGGER
+from .gitlab import Entity, GitLab
+from .models import EntityMetadata
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entities (
+    kind TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    full_path TEXT NOT NULL COLLATE NOCASE,
+    path TEXT NOT NULL,
+    parent_id INTEGER,
+    archived INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (kind, id)
+);
+CREATE INDEX IF NOT EXISTS entities_full_path ON entities (kind, full_path);
+CREATE INDEX IF NOT EXISTS entities_parent_id ON entities (kind, parent_id);
+CREATE TABLE IF NOT EXISTS refreshes (
+    name TEXT PRIMARY KEY,
+    refreshed_at REAL NOT NULL
+);
+"""
+
+# incremental refresh looks back a bit to tolerate clock skew with GitLab
+_CLOCK_SKEW = 300
+
+
+# listings are committed page by page, a failed refresh keeps what it got
+_PAGE_SIZE = 100
+
+
+class Inventory:
+    """
+    On-disk SQLite inventory of groups and projects below the configured
+    groups, refreshed per group subtree.
+
+    Within `ttl` seconds after a refresh of a subtree the inventory is used
+    as is, without any request. An older subtree is refreshed incrementally:
+    its groups are relisted (GitLab has no update filter for them) and only
+    projects updated since the last refresh are fetched. Every
+    `full_refresh_interval` seconds everything is relisted and entities
+    which disappeared are dropped; entities deleted in between are dropped
+    when a request to them returns 404.
+    """
+
+    def __init__(
+        self: Self,
+        path: str,
+        ttl: float = 3600,
+        full_refresh_interval: float = 86400,
+    ) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.full_refresh_interval = full_refresh_interval
+
+        # entities gone in GitLab are removed by entity workers
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self: Self) -> None:
+        self.connection.close()
+
+    def _get_refreshed_at(self: Self, name: str) -> Optional[float]:
+        row = self.connection.execute(
+            "SELECT refreshed_at FROM refreshes WHERE name = ?", (name,)
+        ).fetchone()
+
+        return row[0] if row else None
+
+    def _set_refreshed_at(self: Self, name: str, refreshed_at: float) -> None:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO refreshes (name, refreshed_at) VALUES (?, ?)",
+            (name, refreshed_at),
+        )
+
+    def add(
+        self: Self, metadata: EntityMetadata, seen_at: Optional[float] = None
+    ) -> None:
+        self.connection.execute(
+            "INSERT OR REPLACE INTO entities "
+            "(kind, id, full_path, path, parent_id, archived, updated_at, seen_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                metadata.kind,
+                metadata.id,
+                metadata.full_path,
+                metadata.full_path.rsplit("/", 1)[-1],
+                metadata.parent_id,
+                int(metadata.archived),
+                metadata.updated_at,
+                seen_at or time.time(),
+            ),
+        )
+
+    def save(self: Self, metadata: EntityMetadata) -> None:
+        "Adds a single entity found outside of refresh and commits it"
+        with self.connection:
+            self.add(metadata)
+
+    def remove(self: Self, entity_type: Entity, entity_id: int) -> None:
+        "Drops an entity GitLab doesn't know anymore, with its subtree"
+        with self._lock, self.connection:
+            metadata = self.get_metadata(entity_type, entity_id)
+            self.connection.execute(
+                "DELETE FROM entities WHERE kind = ? AND id = ?",
+                (_get_kind(entity_type), entity_id),
+            )
+            if metadata is not None and metadata.kind == Entity.GROUP.lname:
+                self._delete_subtree(metadata.full_path)
+                self.connection.execute(
+                    "DELETE FROM refreshes WHERE name IN (?, ?)",
+                    (f"incremental:{entity_id}", f"full:{entity_id}"),
+                )
+
+    def _delete_subtree(
+        self: Self,
+        full_path: str,
+        kind: Optional[str] = None,
+        seen_before: Optional[float] = None,
+        orphaned: bool = False,
+    ) -> None:
+        # every path below `a/b` sorts between `a/b/` and `a/b0` ('0' follows '/')
+        query = "DELETE FROM entities WHERE full_path > ? AND full_path < ?"
+        args: list[Any] = [f"{full_path}/", f"{full_path}0"]
+
+        if kind is not None:
+            query += " AND kind = ?"
+            args.append(kind)
+        if seen_before is not None:
+            query += " AND seen_at < ?"
+            args.append(seen_before)
+        if orphaned:
+            query += (
+                " AND parent_id NOT IN (SELECT id FROM entities WHERE kind = 'group')"
+            )
+
+        self.connection.execute(query, args)
+
+    def _add_listing(
+        self: Self,
+        gl: GitLab,
+        entity_type: Entity,
+        url_postfix: str,
+        params: dict[str, Any],
+        seen_at: float,
+        updated_after: Optional[str] = None,
+    ) -> int:
+        "With `updated_after` the listing is ordered by update and read up to it"
+        count = 0
+
+        for item in gl.paginate(url_postfix, params, per_page=_PAGE_SIZE):
+            if updated_after and (item.get("updated_at") or "") < updated_after:
+                break
+
+            self.add(gl.entity_cache.add(entity_type, item), seen_at)
+            count += 1
+
+            if count % _PAGE_SIZE == 0:
+                self.connection.commit()
+
+        self.connection.commit()
+
+        return count
+
+    def refresh(self: Self, gl: GitLab, group_id: int, full: bool = False) -> bool:
+        """
+        Refreshes the subtree of a group if it is older than `ttl`.
+        Returns whether the subtree is known, False when the group is gone.
+        """
+        now = time.time()
+        last_refresh = self._get_refreshed_at(f"incremental:{group_id}")
+        last_full_refresh = self._get_refreshed_at(f"full:{group_id}")
+
+        if not full and last_refresh and now - last_refresh < self.ttl:
+            LOGGER.debug("inventory of group %s is fresh, skipping refresh", group_id)
+            return True
+
+        full = (
+            full
+            or not last_full_refresh
+            or not last_refresh
+            or now - last_full_refresh >= self.full_refresh_interval
+        )
+
+        r = gl._send_gitlab_request(
+            method="GET",
+            url_postfix=f"{Entity.GROUP.value}/{group_id}",
+            exit_on_error=False,
+        )
+        if r.status_code == 404:
+            LOGGER.warning(f"group {group_id} not found, dropped from inventory")
+            self.remove(Entity.GROUP, group_id)
+            return False
+        if not r.ok:
+            LOGGER.warning(
+                f"refresh of group {group_id} in inventory failed with {r.status_code}"
+            )
+            return False
+
+        LOGGER.info(
+            f"{'full' if full else 'incremental'} refresh of group {group_id} "
+            f"in inventory {self.path}"
+        )
+
+        # descendants of a renamed group are relisted under the new path
+        stored = self.get_metadata(Entity.GROUP, group_id)
+        group = gl.entity_cache.add(Entity.GROUP, r.json())
+        self.add(group, now)
+
+        groups = self._add_listing(
+            gl,
+            Entity.GROUP,
+            f"{Entity.GROUP.value}/{group_id}/descendant_groups",
+            {},
+            now,
+        )
+
+        project_params: dict[str, Any] = {"include_subgroups": "true"}
+        updated_after = None
+        if not full:
+            project_params.update({"order_by": "updated_at", "sort": "desc"})
+            updated_after = time.strftime(
+                "%Y-%m-%dT%H:%M:%SZ", time.gmtime(last_refresh - _CLOCK_SKEW)  # type: ignore
+            )
+
+        projects = self._add_listing(
+            gl,
+            Entity.PROJECT,
+            f"{Entity.GROUP.value}/{group_id}/{Entity.PROJECT.value}",
+            project_params,
+            now,
+            updated_after,
+        )
+
+        with self.connection:
+            for full_path in {group.full_path, stored.full_path if stored else None}:
+                if full_path is None:
+                    continue
+
+                # groups are always relisted, drop removed ones with projects
+                self._delete_subtree(full_path, Entity.GROUP.lname, now)
+                self._delete_subtree(full_path, Entity.PROJECT.lname, orphaned=True)
+                if full:
+                    self._delete_subtree(full_path, Entity.PROJECT.lname, now)
+
+            # follow renames of groups for projects not fetched incrementally
+            self.connection.execute(
+                "UPDATE entities SET full_path = ("
+                "SELECT g.full_path FROM entities g "
+                "WHERE g.kind = 'group' AND g.id = entities.parent_id"
+                ") || '/' || path "
+                "WHERE kind = 'project' AND parent_id IN "
+                "(SELECT id FROM entities WHERE kind = 'group')"
+            )
+
+            if full:
+                self._set_refreshed_at(f"full:{group_id}", now)
+            self._set_refreshed_at(f"incremental:{group_id}", now)
+
+        LOGGER.info(f"inventory refreshed: {groups} groups, {projects} projects")
+
+        return True
+
+    def get_metadata(
+        self: Self,
+        entity_type: Entity,
+        entity_id: int,
+    ) -> Optional[EntityMetadata]:
+        row = self.connection.execute(
+            "SELECT id, kind, full_path, parent_id, archived, updated_at "
+            "FROM entities WHERE kind = ? AND id = ?",
+            (_get_kind(entity_type), entity_id),
+        ).fetchone()
+
+        return _row_to_metadata(row) if row else None
+
+    def get_metadata_by_path(
+        self: Self,
+        entity_type: Entity,
+        entity_path: str,
+    ) -> Optional[EntityMetadata]:
+        row = self.connection.execute(
+            "SELECT id, kind, full_path, parent_id, archived, updated_at "
+            "FROM entities WHERE kind = ? AND full_path = ?",
+            (_get_kind(entity_type), entity_path.strip("/")),
+        ).fetchone()
+
+        return _row_to_metadata(row) if row else None
+
+    def get_descendants(
+        self: Self,
+        group_id: int,
+    ) -> Optional[tuple[list[EntityMetadata], list[EntityMetadata]]]:
+        "Returns all descendant groups and projects of a group, None if it is unknown"
+        group = self.get_metadata(Entity.GROUP, group_id)
+        if group is None:
+            return None
+
+        # every path below `a/b` sorts between `a/b/` and `a/b0` ('0' follows '/')
+        rows = self.connection.execute(
+            "SELECT id, kind, full_path, parent_id, archived, updated_at "
+            "FROM entities WHERE full_path > ? AND full_path < ? ORDER BY kind, id",
+            (f"{group.full_path}/", f"{group.full_path}0"),
+        ).fetchall()
+
+        entities = [_row_to_metadata(row) for row in rows]
+
+        return (
+            [entity for entity in entities if entity.kind == Entity.GROUP.lname],
+            [entity for entity in entities if entity.kind == Entity.PROJECT.lname],
+        )
+
+
+def _get_kind(entity_type: Entity) -> str:
+    "subgroups are stored as groups"
+    return Entity.GROUP.lname if entity_type == Entity.SUBGROUP else entity_type.lname
+
+
+def _row_to_metadata(row: tuple[Any, ...]) -> EntityMetadata:
+    id, kind, full_path, parent_id, archived, updated_at = row
+
+    return EntityMetadata(
+        id=id,
+        kind=kind,
+        full_path=full_path,
+        parent_id=parent_id,
+        archived=bool(archived),
+        updated_at=updated_at,
+    )
@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+
+from typing_extensions import Optional, Self, TextIO
+
+from ..utils._helpers import LOGGER
+from .gitlab import Entity
+
+
+class Journal:
+    """
+    Append-only JSON lines file with every entity resource (settings,
+    variables, protected branches) applied by the run, each line synced to
+    disk before the next resource starts, so a crash loses at most the
+    resources in flight.
+
+    A resumed run replays the journal and skips resources journaled with
+    the same entity config; a torn last line of a crash is ignored. The
+    journal is removed when a run completes without failures, so a later
+    `--resume` starts from scratch.
+    """
+
+    VERSION = 1
+
+    def __init__(self: Self, path: str, gitlab_host: str, resume: bool = False) -> None:
+        self.path = path
+        self.gitlab_host = gitlab_host
+        self.done: set[tuple[str, str, str]] = set()
+        self._lock = threading.Lock()
+        self._file: Optional[TextIO] = None
+
+        if resume and self._replay():
+            LOGGER.info(
+                "resuming from journal %s: %s resources done", self.path, len(self.done)
+            )
+            self._open("a")
+        else:
+            self._open("w")
+            self._write({"version": self.VERSION, "host": self.gitlab_host})
+
+    def _replay(self: Self) -> bool:
+        "Returns whether the journal belongs to this instance and can be continued"
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            LOGGER.info("journal %s not found, starting from scratch", self.path)
+            return False
+        except OSError as e:
+            LOGGER.warning(f"journal {self.path} is unreadable, ignoring: {e}")
+            return False
+
+        records = []
+        for number, line in enumerate(lines, start=1):
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                LOGGER.warning("journal %s: skipping broken line %s", self.path, number)
+
+        header = records[0] if records else {}
+        if (
+            header.get("version") != self.VERSION
+            or header.get("host") != self.gitlab_host
+        ):
+            LOGGER.warning(f"journal {self.path} is outdated, ignoring")
+            return False
+
+        self.done = {
+            (record["entity"], record["resource"], record["config"])
+            for record in records[1:]
+            if {"entity", "resource", "config"} <= record.keys()
+        }
+        return True
+
+    def _open(self: Self, mode: str) -> None:
+        created = not os.path.exists(self.path)
+        file = open(self.path, mode, encoding="utf-8")
+
+        # a line torn by a crash must not swallow the next record
+        if mode == "a" and file.tell() > 0:
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    file.write("\n")
+
+        self._file = file  # type: ignore
+
+        if created:
+            # the new directory entry has to survive a crash too
+            directory = os.open(
+                os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY
+            )
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+
+    def _write(self: Self, record: dict[str, object]) -> None:
+        with self._lock:
+            if self._file is None:
+                return None
+
+            self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    @staticmethod
+    def _get_key(entity_type: Entity, entity_id: int) -> str:
+        return f"{entity_type.value}/{entity_id}"
+
+    def is_done(
+        self: Self,
+        entity_type: Entity,
+        entity_id: int,
+        resource: str,
+        fingerprint: str,
+    ) -> bool:
+        return (
+            self._get_key(entity_type, entity_id),
+            resource,
+            fingerprint,
+        ) in self.done
+
+    def record(
+        self: Self,
+        entity_type: Entity,
+        entity_id: int,
+        resource: str,
+        fingerprint: str,
+    ) -> None:
+        key = self._get_key(entity_type, entity_id)
+        self._write({"entity": key, "resource": resource, "config": fingerprint})
+
+        with self._lock:
+            self.done.add((key, resource, fingerprint))
+
+    def close(self: Self, completed: bool) -> None:
+        "A completed run has nothing to resume, its journal is removed"
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+        if completed:
+            os.remove(self.path)
+            LOGGER.info("run completed, journal %s removed", self.path)
+        else:
+            LOGGER.warning("run not completed, resume it with `--resume`")
@@ -0,0 +1,81 @@
+from typing_extensions import Any, Self
+
+from ..utils import _helpers
+from .gitlab import Entity
+from .models import GroupConfig, ProjectConfig
+
+
+class ConfigLayers:
+    """
+    Effective entity configs of one config file: `group_config` or
+    `project_config` with `overrides` of every path above the entity merged
+    on top, the nearest path last (global -> group -> ... -> project).
+
+    Layers are merged and validated once per chain of applied override
+    paths, so thousands of entities below the same groups share one
+    resolved config.
+    """
+
+    def __init__(self: Self, config_model_json: dict[str, Any]) -> None:
+        self.base: dict[Entity, dict[str, Any]] = {
+            Entity.GROUP: config_model_json.get("group_config", {}),
+            Entity.PROJECT: config_model_json.get("project_config", {}),
+        }
+        self.overrides: dict[str, dict[str, Any]] = config_model_json.get(
+            "overrides", {}
+        )
+
+        self._merged: dict[tuple[Entity, tuple[str, ...]], dict[str, Any]] = {}
+        self._resolved: dict[tuple[Entity, tuple[str, ...]], dict[str, Any]] = {}
+
+    def get_chain(self: Self, entity_type: Entity, full_path: str) -> tuple[str, ...]:
+        "Override paths applied to the entity, outermost first"
+        key = f"{entity_type.lname}_config"
+        parts = full_path.split("/")
+
+        return tuple(
+            path
+            for path in ("/".join(parts[: depth + 1]) for depth in range(len(parts)))
+            if key in self.overrides.get(path, {})
+        )
+
+    def _merge(
+        self: Self, entity_type: Entity, chain: tuple[str, ...]
+    ) -> dict[str, Any]:
+        if not chain:
+            return self.base[entity_type]
+
+        merged = self._merged.get((entity_type, chain))
+        if merged is None:
+            # the parent chain is shared with siblings, merged once as well
+            merged = _helpers.merge_configs(
+                self._merge(entity_type, chain[:-1]),
+                self.overrides[chain[-1]][f"{entity_type.lname}_config"],
+            )
+            self._merged[(entity_type, chain)] = merged
+
+        return merged
+
+    def get_entity_config(
+        self: Self, entity_type: Entity, full_path: str
+    ) -> dict[str, Any]:
+        chain = self.get_chain(entity_type, full_path)
+        if not chain:
+            return self.base[entity_type]
+
+        resolved = self._resolved.get((entity_type, chain))
+        if resolved is None:
+            model = GroupConfig if entity_type == Entity.GROUP else ProjectConfig
+            resolved = model(**self._merge(entity_type, chain)).model_dump(
+                exclude_none=True, mode="json"
+            )
+            self._resolved[(entity_type, chain)] = resolved
+
+        return resolved
+
+    def validate(self: Self) -> None:
+        "Resolves every override once, so a wrong one fails before any request"
+        for path, override in self.overrides.items():
+            for entity_type in (Entity.GROUP, Entity.PROJECT):
+                if f"{entity_type.lname}_config" in override:
+                    self.get_entity_config(entity_type, path)
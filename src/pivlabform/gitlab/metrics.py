@@ -0,0 +1,190 @@
+import bisect
+import json
+import os
+import re
+import threading
+from collections import Counter
+
+from typing_extensions import Any, Optional, Self
+
+# upper bounds of latency histogram buckets in seconds, +Inf is implicit
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# path segments following these ones are identifiers
+_ID_PARENTS = {"groups", "projects"}
+_NAME_PARENTS = {"variables", "protected_branches"}
+_NUMBER = re.compile(r"^\d+$")
+
+
+def get_endpoint_template(url_postfix: str) -> str:
+    "`projects/1001/variables/RELEASE?page=2` -> `projects/:id/variables/:name`"
+    parts = url_postfix.split("?", 1)[0].strip("/").split("/")
+
+    template = []
+    for i, part in enumerate(parts):
+        previous = parts[i - 1] if i else None
+
+        if previous in _ID_PARENTS or _NUMBER.match(part):
+            template.append(":id")
+        elif previous in _NAME_PARENTS:
+            template.append(":name")
+        else:
+            template.append(part)
+
+    return "/".join(template)
+
+
+class _EndpointMetrics:
+    def __init__(self: Self) -> None:
+        self.count = 0
+        self.statuses: Counter[str] = Counter()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency_sum = 0.0
+        # per bucket, not cumulative; the last one is +Inf
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+
+class RequestMetrics:
+    """
+    Thread-safe per-endpoint request metrics: count, status codes, body bytes
+    sent and received and latency histogram. Every attempt of a retried
+    request is counted, failed connections have status `error`.
+    """
+
+    def __init__(self: Self) -> None:
+        self.endpoints: dict[tuple[str, str], _EndpointMetrics] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self: Self,
+        method: str,
+        url_postfix: str,
+        status: str,
+        bytes_sent: int,
+        bytes_received: int,
+        latency: float,
+    ) -> None:
+        key = (method.upper(), get_endpoint_template(url_postfix))
+
+        with self._lock:
+            endpoint = self.endpoints.get(key)
+            if endpoint is None:
+                endpoint = self.endpoints[key] = _EndpointMetrics()
+
+            endpoint.count += 1
+            endpoint.statuses[status] += 1
+            endpoint.bytes_sent += bytes_sent
+            endpoint.bytes_received += bytes_received
+            endpoint.latency_sum += latency
+            endpoint.latency_buckets[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    @property
+    def total(self: Self) -> int:
+        return sum(endpoint.count for endpoint in self.endpoints.values())
+
+    def summary(self: Self) -> str:
+        with self._lock:
+            slowest = sorted(
+                self.endpoints.items(),
+                key=lambda item: item[1].latency_sum,
+                reverse=True,
+            )[:3]
+
+        spent = ", ".join(
+            f"{method} {template}: {endpoint.latency_sum:.1f}s"
+            for (method, template), endpoint in slowest
+        )
+        return f"requests sent: {self.total}, most time spent on: {spent or 'none'}"
+
+    def to_json(self: Self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "latency_buckets": list(LATENCY_BUCKETS),
+                "endpoints": [
+                    {
+                        "method": method,
+                        "endpoint": template,
+                        "count": endpoint.count,
+                        "statuses": dict(endpoint.statuses),
+                        "bytes_sent": endpoint.bytes_sent,
+                        "bytes_received": endpoint.bytes_received,
+                        "latency_sum": round(endpoint.latency_sum, 6),
+                        "latency_buckets": list(endpoint.latency_buckets),
+                    }
+                    for (method, template), endpoint in sorted(self.endpoints.items())
+                ],
+            }
+
+    def to_prometheus(self: Self) -> str:
+        "Prometheus text exposition format, e.g. for node exporter textfile collector"
+        lines = [
+            "# HELP pivlabform_http_requests_total GitLab API requests by status.",
+            "# TYPE pivlabform_http_requests_total counter",
+        ]
+        bytes_lines = [
+            "# HELP pivlabform_http_body_bytes_total GitLab API body bytes by direction.",
+            "# TYPE pivlabform_http_body_bytes_total counter",
+        ]
+        latency_lines = [
+            "# HELP pivlabform_http_request_duration_seconds GitLab API request latency.",
+            "# TYPE pivlabform_http_request_duration_seconds histogram",
+        ]
+
+        with self._lock:
+            for (method, template), endpoint in sorted(self.endpoints.items()):
+                labels = f'method="{method}",endpoint="{template}"'
+
+                for status, count in sorted(endpoint.statuses.items()):
+                    lines.append(
+                        f'pivlabform_http_requests_total{{{labels},status="{status}"}} {count}'
+                    )
+
+                bytes_lines.append(
+                    f'pivlabform_http_body_bytes_total{{{labels},direction="sent"}} '
+                    f"{endpoint.bytes_sent}"
+                )
+                bytes_lines.append(
+                    f'pivlabform_http_body_bytes_total{{{labels},direction="received"}} '
+                    f"{endpoint.bytes_received}"
+                )
+
+                cumulative = 0
+                for bound, count in zip(
+                    [*map(str, LATENCY_BUCKETS), "+Inf"], endpoint.latency_buckets
+                ):
+                    cumulative += count
+                    latency_lines.append(
+                        "pivlabform_http_request_duration_seconds_bucket"
+                        f'{{{labels},le="{bound}"}} {cumulative}'
+                    )
+                latency_lines.append(
+                    f"pivlabform_http_request_duration_seconds_sum{{{labels}}} "
+                    f"{endpoint.latency_sum:.6f}"
+                )
+                latency_lines.append(
+                    f"pivlabform_http_request_duration_seconds_count{{{labels}}} "
+                    f"{endpoint.count}"
+                )
+
+        return "\n".join([*lines, *bytes_lines, *latency_lines]) + "\n"
+
+    def save(
+        self: Self,
+        json_file: Optional[str] = None,
+        prometheus_file: Optional[str] = None,
+    ) -> None:
+        "Files are replaced atomically, so a collector never reads a partial file"
+        if json_file:
+            _write_atomic(json_file, json.dumps(self.to_json(), indent=2))
+
+        if prometheus_file:
+            _write_atomic(prometheus_file, self.to_prometheus())
+
+
+def _write_atomic(path: str, content: str) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+    os.replace(tmp_path, path)
@@ -1,17 +1,22 @@
-from .config_model import ConfigModel
+from .config_model import ConfigModel, ConfigOverride, DiscoveryFilters
 from .entity_config import GroupConfig, ProjectConfig
+from .entity_metadata import EntityMetadata
 from .entity_settings import (
     CreateGroupSettings,
     CreateProjectSettings,
     GroupSettings,
     ProjectSettings,
 )
+from .plan import Plan, PlannedChange, PlannedRequest
 from .protected_branches import ProtectedBranch
+from .run_options import RunOptions
 from .variables import Variable
 
 __all__ = [
     "Variable",
     "ConfigModel",
+    "ConfigOverride",
+    "DiscoveryFilters",
     "ProtectedBranch",
     "ProjectConfig",
     "ProjectSettings",
@@ -19,4 +24,9 @@ __all__ = [
     "GroupSettings",
     "CreateGroupSettings",
     "CreateProjectSettings",
+    "EntityMetadata",
+    "Plan",
+    "PlannedChange",
+    "PlannedRequest",
+    "RunOptions",
 ]
@@ -1,7 +1,73 @@
-from pydantic import BaseModel, ConfigDict
-from typing_extensions import Any, Optional
+import re
+
+from pydantic import BaseModel, ConfigDict, field_validator
+from typing_extensions import Any, Optional, Self
 
 from .entity_config import GroupConfig, ProjectConfig
+from .entity_settings import Visibility
+from .protected_branches import AccessLevelEnum
+
+
+class ConfigOverride(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    group_config: Optional[dict[str, Any]] = None
+    "Merged over `group_config` for the group at this path and its subgroups."
+
+    project_config: Optional[dict[str, Any]] = None
+    "Merged over `project_config` for the project at this path or projects below it."
+
+
+class DiscoveryFilters(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    archived: Optional[bool] = None
+    "Projects with this archived status only, `false` leaves out archived projects."
+
+    topic: Optional[str] = None
+    "Projects with this topic only."
+
+    visibility: Optional[Visibility] = None
+    "Projects with this visibility only."
+
+    min_access_level: Optional[AccessLevelEnum] = None
+    "Projects where the token user has at least this access level only."
+
+    search: Optional[str] = None
+    "Projects whose path or name contains this string only."
+
+    exclude_paths: Optional[list[str]] = None
+    "Regular expressions, groups and projects with a matching full path are left out."
+
+    exclude_ids: Optional[list[int]] = None
+    "Group and project IDs which are left out."
+
+    @field_validator("exclude_paths")
+    @classmethod
+    def validate_exclude_paths(cls, v: Optional[list[str]]) -> Optional[list[str]]:
+        for pattern in v or []:
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"invalid regular expression {pattern!r}: {e}")
+        return v
+
+    def get_project_params(self: Self) -> dict[str, str]:
+        "Query parameters of project listings, GitLab filters there"
+        params: dict[str, str] = {}
+
+        if self.archived is not None:
+            params["archived"] = "true" if self.archived else "false"
+        if self.topic:
+            params["topic"] = self.topic
+        if self.visibility:
+            params["visibility"] = self.visibility.value
+        if self.min_access_level is not None:
+            params["min_access_level"] = str(self.min_access_level.value)
+        if self.search:
+            params["search"] = self.search
+
+        return params
 
 
 class ConfigModel(BaseModel):
@@ -13,5 +79,9 @@ class ConfigModel(BaseModel):
     groups: Optional[list[str | int]] = None
     projects: Optional[list[str | int]] = None
 
+    overrides: Optional[dict[str, ConfigOverride]] = None
+
+    filters: Optional[DiscoveryFilters] = None
+
     def dump_model_to_json(self) -> dict[str, Any]:
         return self.model_dump(exclude_none=True, mode="json")
@@ -0,0 +1,49 @@
+from pydantic import BaseModel, ConfigDict
+from typing_extensions import Any, Optional
+
+
+class EntityMetadata(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+    id: int
+    "ID of group or project."
+
+    kind: str
+    "`group` or `project`."
+
+    full_path: str
+    "Full path of group (`full_path`) or project (`path_with_namespace`)."
+
+    parent_id: Optional[int] = None
+    "Parent group of group or namespace group of project, None for top-level groups."
+
+    archived: bool = False
+    "Whether the entity is archived."
+
+    updated_at: Optional[str] = None
+    "Last update of entity (`updated_at` or `last_activity_at`), if GitLab returns it."
+
+    @classmethod
+    def from_api(cls, kind: str, data: dict[str, Any]) -> "EntityMetadata":
+        "Builds metadata from a group or project object of the GitLab API"
+        if kind == "project":
+            namespace = data.get("namespace") or {}
+            return cls(
+                id=data["id"],
+                kind=kind,
+                full_path=data.get("path_with_namespace", ""),
+                parent_id=(
+                    namespace.get("id") if namespace.get("kind") == "group" else None
+                ),
+                archived=bool(data.get("archived")),
+                updated_at=data.get("updated_at") or data.get("last_activity_at"),
+            )
+
+        return cls(
+            id=data["id"],
+            kind=kind,
+            full_path=data.get("full_path", ""),
+            parent_id=data.get("parent_id"),
+            archived=bool(data.get("archived")),
+            updated_at=data.get("updated_at"),
+        )
@@ -0,0 +1,70 @@
+import os
+import time
+
+from pydantic import BaseModel
+from typing_extensions import Any, Optional
+
+
+class PlannedRequest(BaseModel):
+    method: str
+    "HTTP method of the mutation."
+
+    url_postfix: str
+    "Request path under `/api/v4/`."
+
+    data: dict[str, Any] = {}
+    "JSON body of the request."
+
+    params: dict[str, Any] = {}
+    "Query parameters of the request."
+
+
+class PlannedChange(BaseModel):
+    entity: str
+    "Changed entity as `projects/:id` or `groups/:id`."
+
+    action: str
+    "`create`, `update`, `remove` or `recreate`."
+
+    target: str
+    "What is changed, e.g. `settings` or `variable RELEASE`."
+
+    before: Optional[Any] = None
+    "Current state of the target, None when it doesn't exist yet."
+
+    after: Optional[Any] = None
+    "Desired state of the target, None when it is removed."
+
+    requests: list[PlannedRequest]
+    "Requests applying the change, sent in order."
+
+    def describe(self) -> str:
+        return f"{self.action} {self.target} in {self.entity}"
+
+
+class Plan(BaseModel):
+    version: int = 1
+    "Plan file format version."
+
+    gitlab_host: str
+    "GitLab instance the plan was computed against."
+
+    created_at: str = ""
+    "UTC time of plan creation."
+
+    changes: list[PlannedChange] = []
+    "All changes of the run, independent of each other."
+
+    def save(self, path: str) -> None:
+        "Plan contains variable values, so the file is readable by owner only"
+        if not self.created_at:
+            self.created_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self.model_dump_json(indent=2))
+
+    @classmethod
+    def load(cls, path: str) -> "Plan":
+        with open(path, encoding="utf-8") as f:
+            return cls.model_validate_json(f.read())
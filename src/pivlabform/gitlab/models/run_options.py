@@ -0,0 +1,83 @@
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing_extensions import Optional
+
+from ...utils import _consts
+from ..transport import RetryPolicy, TransportConfig
+from .config_model import DiscoveryFilters
+
+
+class RunOptions(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    workers: int = 1
+    "Entities configured in parallel by the sync client."
+
+    concurrency: int = 100
+    "Requests in flight of the asyncio client."
+
+    fan_out: int = 4
+    "Parallel write requests inside one entity, bounded across all workers."
+
+    discovery: str = _consts.DiscoveryMode.descendants.value
+    "How subgroups and projects of a group are found, see `DiscoveryMode`."
+
+    read_backend: str = _consts.ReadBackend.rest.value
+    "How entity state is read, see `ReadBackend`."
+
+    retry_policy: Optional[RetryPolicy] = None
+    "Retries of failed requests, from the environment when not set."
+
+    transport: Optional[TransportConfig] = None
+    "Connection settings of the client, from the environment when not set."
+
+    filters: DiscoveryFilters = Field(default_factory=DiscoveryFilters)
+    "Discovery filters of the run, added to `filters` of every config."
+
+    shard: Optional[tuple[int, int]] = None
+    "`(index, total)` of parallel jobs splitting the work set."
+
+    discovery_file: Optional[str] = None
+    "File of discovered entities, reused by later runs of the same configs."
+
+    inventory: Optional[str] = None
+    "SQLite inventory of paths and subtrees, reused between runs."
+
+    inventory_ttl: float = 3600
+    "Seconds after which the inventory is refreshed incrementally."
+
+    state_file: Optional[str] = None
+    "File of applied fingerprints, unchanged entities are skipped."
+
+    full: bool = False
+    "Reconciles every entity, ignoring `state_file`, the state is still updated."
+
+    journal: Optional[str] = None
+    "File of resources applied by the run, removed when it completes without failures."
+
+    resume: bool = False
+    "Skips resources recorded in `journal` with an unchanged entity config."
+
+    plan_file: Optional[str] = None
+    "Only reads GitLab and writes planned changes to this file."
+
+    dedup_inherited: bool = False
+    "Variables inherited from ancestor groups are not set again."
+
+    config_cache: Optional[str] = None
+    "Directory of validated configs, keyed by the hash of the config file."
+
+    metrics_json: Optional[str] = None
+    "Request metrics of the run written as JSON."
+
+    metrics_prometheus: Optional[str] = None
+    "Request metrics of the run written in Prometheus text format."
+
+    @field_validator("discovery")
+    @classmethod
+    def validate_discovery(cls, v: str) -> str:
+        return _consts.DiscoveryMode(v).value
+
+    @field_validator("read_backend")
+    @classmethod
+    def validate_read_backend(cls, v: str) -> str:
+        return _consts.ReadBackend(v).value
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import threading
+
+from typing_extensions import Any, Optional, Self
+
+from ..utils._helpers import LOGGER
+from .gitlab import Entity
+
+
+class ApplyState:
+    """
+    JSON file with the result of previous applies: per entity a fingerprint of
+    the applied config and the entity `updated_at` read right after apply.
+
+    An entity whose fingerprint and server timestamp are both unchanged since
+    the last successful apply has nothing to reconcile and can be skipped.
+    """
+
+    VERSION = 1
+
+    def __init__(self: Self, path: str, gitlab_host: str) -> None:
+        self.path = path
+        self.gitlab_host = gitlab_host
+        self.entities: dict[str, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+        self._load()
+
+    def _load(self: Self) -> None:
+        if not os.path.exists(self.path):
+            return None
+
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            LOGGER.warning(f"state file {self.path} is unreadable, ignoring: {e}")
+            return None
+
+        if data.get("version") != self.VERSION or data.get("host") != self.gitlab_host:
+            LOGGER.warning(f"state file {self.path} is outdated, ignoring")
+            return None
+
+        self.entities = data.get("entities", {})
+
+    def save(self: Self) -> None:
+        "Writes to a temporary file first, so a crash never leaves a broken state"
+        with self._lock:
+            data = {
+                "version": self.VERSION,
+                "host": self.gitlab_host,
+                "entities": self.entities,
+            }
+
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+
+            os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def get_fingerprint(entity_config: dict[str, Any]) -> str:
+        return hashlib.sha256(
+            json.dumps(entity_config, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    @staticmethod
+    def _get_key(entity_type: Entity, entity_id: int) -> str:
+        return f"{entity_type.value}/{entity_id}"
+
+    def is_unchanged(
+        self: Self,
+        entity_type: Entity,
+        entity_id: int,
+        fingerprint: str,
+        updated_at: Optional[str],
+    ) -> bool:
+        "Entities without `updated_at` (e.g. groups) are never considered unchanged"
+        if updated_at is None:
+            return False
+
+        with self._lock:
+            entry = self.entities.get(self._get_key(entity_type, entity_id))
+
+        return (
+            entry is not None
+            and entry.get("config") == fingerprint
+            and entry.get("updated_at") == updated_at
+        )
+
+    def record(
+        self: Self,
+        entity_type: Entity,
+        entity_id: int,
+        fingerprint: str,
+        updated_at: Optional[str],
+    ) -> None:
+        with self._lock:
+            self.entities[self._get_key(entity_type, entity_id)] = {
+                "config": fingerprint,
+                "updated_at": updated_at,
+            }
+
+    def forget(self: Self, entity_type: Entity, entity_id: int) -> None:
+        with self._lock:
+            self.entities.pop(self._get_key(entity_type, entity_id), None)
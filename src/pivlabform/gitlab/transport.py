@@ -0,0 +1,262 @@
+import os
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+
+from pydantic import BaseModel, Field
+from typing_extensions import Any, Iterator, Mapping, Optional, Self
+
+# methods safe to repeat after a server error, the request may have been applied
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+_REQUEST_ERRORS: ContextVar[Optional[list[str]]] = ContextVar(
+    "_REQUEST_ERRORS", default=None
+)
+_RAISE_REQUEST_ERRORS: ContextVar[bool] = ContextVar(
+    "_RAISE_REQUEST_ERRORS", default=False
+)
+
+
+@contextmanager
+def track_request_errors() -> Iterator[list[str]]:
+    """
+    Collects failed requests sent in the current thread or asyncio task,
+    including errors ignored with `IGNORE_REQUESTS_ERRORS`.
+    """
+    errors: list[str] = []
+    outer = _REQUEST_ERRORS.get()
+    token = _REQUEST_ERRORS.set(errors)
+    try:
+        yield errors
+    finally:
+        _REQUEST_ERRORS.reset(token)
+        # nested tracking, the enclosing one sees the errors too
+        if outer is not None:
+            outer.extend(errors)
+
+
+class GitLabRequestError(Exception):
+    """
+    Request failed after retries; raised by `AsyncGitLab` where `GitLab`
+    exits, since `SystemExit` in an asyncio task aborts the whole event loop
+    """
+
+    def __init__(self: Self, message: str, status_code: Optional[int] = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@contextmanager
+def raise_request_errors() -> Iterator[None]:
+    "`GitLab` raises `GitLabRequestError` in the current thread instead of exiting"
+    token = _RAISE_REQUEST_ERRORS.set(True)
+    try:
+        yield None
+    finally:
+        _RAISE_REQUEST_ERRORS.reset(token)
+
+
+def should_raise_request_errors() -> bool:
+    return _RAISE_REQUEST_ERRORS.get()
+
+
+def record_request_error(error: str) -> None:
+    errors = _REQUEST_ERRORS.get()
+    if errors is not None:
+        errors.append(error)
+
+
+class RetryPolicy(BaseModel):
+    max_retries: int = Field(default=5, ge=0)
+    "How many times a failed request is repeated."
+
+    backoff_factor: float = Field(default=0.5, ge=0)
+    "Base delay in seconds, doubled on every attempt."
+
+    max_backoff: float = Field(default=60.0, ge=0)
+    "Upper bound of a single delay in seconds."
+
+    timeout: float = Field(default=60.0, gt=0)
+    "Timeout of a single request in seconds."
+
+    retry_statuses: set[int] = {429, 500, 502, 503, 504}
+    "Status codes to retry; 5xx are retried only for idempotent methods."
+
+    @classmethod
+    def from_env(cls, **overrides: Any) -> "RetryPolicy":
+        "Reads `GITLAB_MAX_RETRIES`, `GITLAB_BACKOFF_FACTOR`, `GITLAB_MAX_BACKOFF` and `GITLAB_REQUEST_TIMEOUT`"
+        env = {
+            "max_retries": os.getenv("GITLAB_MAX_RETRIES"),
+            "backoff_factor": os.getenv("GITLAB_BACKOFF_FACTOR"),
+            "max_backoff": os.getenv("GITLAB_MAX_BACKOFF"),
+            "timeout": os.getenv("GITLAB_REQUEST_TIMEOUT"),
+        }
+        values: dict[str, Any] = {key: value for key, value in env.items() if value}
+        values.update(
+            {key: value for key, value in overrides.items() if value is not None}
+        )
+
+        return cls(**values)
+
+    def should_retry(self: Self, method: str, status_code: int) -> bool:
+        if status_code not in self.retry_statuses:
+            return False
+
+        return status_code == 429 or method.upper() in IDEMPOTENT_METHODS
+
+    def get_backoff(self: Self, attempt: int) -> float:
+        "Exponential backoff with full jitter"
+        return random.uniform(
+            0, min(self.max_backoff, self.backoff_factor * 2**attempt)
+        )
+
+    def get_retry_delay(
+        self: Self,
+        attempt: int,
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> float:
+        "Honors `Retry-After` (seconds or HTTP date), falls back to backoff"
+        retry_after = (headers or {}).get("Retry-After")
+
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    delay = self.get_backoff(attempt)
+
+            return min(self.max_backoff, max(0.0, delay))
+
+        return self.get_backoff(attempt)
+
+
+class TransportConfig(BaseModel):
+    pool_size: Optional[int] = Field(default=None, ge=1)
+    "Pooled connections: per worker thread in `GitLab` (10), in total in `AsyncGitLab` (`concurrency`)."
+
+    connect_timeout: float = Field(default=10.0, gt=0)
+    "Timeout of opening a connection in seconds, reads are bounded by `RetryPolicy.timeout`."
+
+    compression: bool = True
+    "Ask for gzip-compressed responses, `identity` otherwise."
+
+    keep_alive: bool = True
+    "Reuse connections between requests."
+
+    http2: bool = False
+    "HTTP/2 in `AsyncGitLab`, many requests share one connection (requires `h2`)."
+
+    @classmethod
+    def from_env(cls, **overrides: Any) -> "TransportConfig":
+        "Reads `GITLAB_POOL_SIZE`, `GITLAB_CONNECT_TIMEOUT`, `GITLAB_COMPRESSION`, `GITLAB_KEEP_ALIVE`, `GITLAB_HTTP2`"
+        env = {
+            "pool_size": os.getenv("GITLAB_POOL_SIZE"),
+            "connect_timeout": os.getenv("GITLAB_CONNECT_TIMEOUT"),
+            "compression": os.getenv("GITLAB_COMPRESSION"),
+            "keep_alive": os.getenv("GITLAB_KEEP_ALIVE"),
+            "http2": os.getenv("GITLAB_HTTP2"),
+        }
+        values: dict[str, Any] = {key: value for key, value in env.items() if value}
+        values.update(
+            {key: value for key, value in overrides.items() if value is not None}
+        )
+
+        return cls(**values)
+
+    def get_headers(self: Self) -> dict[str, str]:
+        return {
+            "Accept-Encoding": "gzip" if self.compression else "identity",
+            "Connection": "keep-alive" if self.keep_alive else "close",
+        }
+
+
+class RateLimiter:
+    """
+    Proactive pacing on GitLab `RateLimit-*` response headers.
+    While the remaining budget is above `low_watermark` of the limit requests
+    go out immediately, below it the remaining requests are spread evenly
+    until `RateLimit-Reset`, so the limit is not hit at all.
+    """
+
+    def __init__(self: Self, low_watermark: float = 0.1) -> None:
+        self.low_watermark = low_watermark
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at: Optional[float] = None
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def update(self: Self, headers: Mapping[str, str]) -> None:
+        try:
+            remaining = headers.get("RateLimit-Remaining")
+            limit = headers.get("RateLimit-Limit")
+            reset_at = headers.get("RateLimit-Reset")
+
+            with self._lock:
+                if remaining is not None:
+                    self.remaining = int(remaining)
+                if limit is not None:
+                    self.limit = int(limit)
+                if reset_at is not None:
+                    self.reset_at = float(reset_at)
+        except ValueError:
+            return None
+
+    def reserve(self: Self) -> float:
+        "Returns how long the caller has to wait before sending the next request"
+        with self._lock:
+            now = time.time()
+
+            if self.remaining is None or self.reset_at is None or self.reset_at <= now:
+                return 0.0
+
+            threshold = self.limit * self.low_watermark if self.limit else 0
+            if self.remaining > threshold:
+                self.remaining -= 1
+                return 0.0
+
+            slot = max(now, self._next_slot)
+            if slot >= self.reset_at:
+                # budget is spent, the window refills on reset
+                return self.reset_at - now
+
+            self._next_slot = slot + (self.reset_at - slot) / max(self.remaining, 1)
+            self.remaining = max(self.remaining - 1, 0)
+
+            return slot - now
+
+
+class RetryStats:
+    "Thread-safe counter of retried requests by reason (status code or error)"
+
+    def __init__(self: Self) -> None:
+        self.retries: Counter[str] = Counter()
+        self.paced = 0
+        self._lock = threading.Lock()
+
+    def add_retry(self: Self, reason: str) -> None:
+        with self._lock:
+            self.retries[reason] += 1
+
+    def add_paced(self: Self) -> None:
+        with self._lock:
+            self.paced += 1
+
+    @property
+    def total(self: Self) -> int:
+        return sum(self.retries.values())
+
+    def summary(self: Self) -> str:
+        reasons = ", ".join(
+            f"{reason}: {count}" for reason, count in sorted(self.retries.items())
+        )
+        return (
+            f"retried requests: {self.total} ({reasons or 'none'}), "
+            f"paced by rate limit: {self.paced}"
+        )
@@ -1,75 +1,996 @@
-import json
+import atexit
+import functools
+import inspect
+import logging
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-from typing_extensions import Any, Optional, Self
+from typing_extensions import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Generator,
+    Optional,
+    Self,
+    TypeVar,
+)
 
-from .gitlab.gitlab import Entity, GitLab
-from .gitlab.models import ConfigModel, ProtectedBranch, Variable
-from .utils import _helpers
+from .gitlab.gitlab import Entity, EntityCache, GitLab
+from .gitlab.layers import ConfigLayers
+from .gitlab.metrics import RequestMetrics
+from .gitlab.models import (
+    ConfigModel,
+    DiscoveryFilters,
+    EntityMetadata,
+    Plan,
+    PlannedChange,
+    ProtectedBranch,
+    RunOptions,
+    Variable,
+)
+from .gitlab.state import ApplyState
+from .gitlab.transport import (
+    GitLabRequestError,
+    RetryStats,
+    raise_request_errors,
+    track_request_errors,
+)
+from .utils import _consts, _helpers
 from .utils._helpers import LOGGER
+from .utils._logger import IdsSummary, LazyJson, buffered_records
+
+if TYPE_CHECKING:
+    from .gitlab.async_gitlab import AsyncGitLab
+    from .gitlab.discovery_file import DiscoveryFile
+    from .gitlab.graphql import GraphQLReader
+    from .gitlab.inventory import Inventory
+    from .gitlab.journal import Journal
+
+T = TypeVar("T")
+
+
+def _run_steps(steps: Generator[Any, Any, T]) -> T:
+    "Runs steps of `Pivlabform` with `GitLab`, its calls have results already"
+    try:
+        result = next(steps)
+        while True:
+            result = steps.send(result)
+    except StopIteration as e:
+        return e.value
+
+
+async def _run_steps_async(steps: Generator[Any, Any, T]) -> T:
+    "Runs steps of `Pivlabform` with `AsyncGitLab`, awaits its calls"
+    try:
+        call = next(steps)
+        while True:
+            try:
+                result = await call
+            except BaseException as e:
+                # raised in the step as with `GitLab`, so it handles LookupError
+                # and leaves its `with` blocks in the context of this task
+                call = steps.throw(e)
+            else:
+                call = steps.send(result)
+    except StopIteration as e:
+        return e.value
 
 
 class Pivlabform:
     def __init__(
         self: Self,
-        config_file: str,
+        config_file: Optional[str],
         gitlab_host: str,
+        options: Optional[RunOptions] = None,
+    ) -> None:
+        self.gitlab_host = gitlab_host
+        self.options = options or RunOptions()
+        self.gl = GitLab(
+            gitlab_host,
+            retry_policy=self.options.retry_policy,
+            fan_out=self.options.fan_out,
+            transport=self.options.transport,
+        )
+        # optional backends are imported only when used, e.g. sqlite3
+        self.graphql: Optional["GraphQLReader"] = None
+        if self.options.read_backend == _consts.ReadBackend.graphql.value:
+            from .gitlab.graphql import GraphQLReader
+
+            self.graphql = GraphQLReader(self.gl)
+        self.failures: dict[str, str] = {}
+        self._request_errors_ignored = False
+        # metrics of the client of the run, written at exit as fail-fast
+        # errors exit before the end of the run
+        self._metrics = self.gl.metrics
+        if self.options.metrics_json or self.options.metrics_prometheus:
+            atexit.register(self._save_metrics)
+        self.inventory: Optional["Inventory"] = None
+        if self.options.inventory:
+            from .gitlab.inventory import Inventory
+
+            self.inventory = Inventory(
+                self.options.inventory, ttl=self.options.inventory_ttl
+            )
+        # entities known from the inventory only, they may be gone in GitLab
+        self._inventory_entities: set[tuple[Entity, int]] = set()
+        self.state = (
+            ApplyState(self.options.state_file, gitlab_host)
+            if self.options.state_file
+            else None
+        )
+        # resources applied so far, a resumed run continues after them
+        self.journal: Optional["Journal"] = None
+        if self.options.journal:
+            from .gitlab.journal import Journal
+
+            self.journal = Journal(
+                self.options.journal, gitlab_host, self.options.resume
+            )
+
+        # variables of ancestor groups, read after the groups were applied,
+        # tasks shared by concurrent reads in asyncio runs
+        self._group_variables: dict[int, Any] = {}
+        self._group_variables_lock = threading.Lock()
+
+        # with `plan_file` runs only read and write planned changes there
+        self.plan = Plan(gitlab_host=gitlab_host) if self.options.plan_file else None
+        self._plan_lock = threading.Lock()
+
+        self.discovery_file: Optional["DiscoveryFile"] = None
+        if self.options.discovery_file:
+            from .gitlab.discovery_file import DiscoveryFile
+
+            self.discovery_file = DiscoveryFile(
+                self.options.discovery_file, gitlab_host
+            )
+
+        # resolved paths and discovered subtrees, shared by all configs of a batch,
+        # subtrees by group and project listing filters
+        self._entity_ids: dict[tuple[Entity, str], int] = {}
+        self._discovered: dict[
+            tuple[int, tuple[tuple[str, str], ...]], tuple[list[int], list[int]]
+        ] = {}
+
+        # applying a saved plan or a batch of configs needs no config here
+        self.config_model_json = (
+            self._load_config(config_file)
+            if config_file
+            else ConfigModel().dump_model_to_json()
+        )
+        self.layers = ConfigLayers(self.config_model_json)
+
+        LOGGER.debug("config_model_json:\n%s\n", LazyJson(self.config_model_json))
+
+    def _load_config(self: Self, config_file: str) -> dict[str, Any]:
+        with open(config_file, "rb") as f:
+            content = f.read()
+
+        cache = None
+        if self.options.config_cache:
+            from .gitlab.config_cache import ConfigCache
+
+            cache = ConfigCache(self.options.config_cache)
+            key = ConfigCache.get_key(content)
+
+            config_model_json = cache.load(key)
+            if config_model_json is not None:
+                LOGGER.debug("config %s loaded from cache %s", config_file, key)
+                return config_model_json
+
+        data, extends = _helpers.load_layered_yaml(config_file, content)
+        config_model_json = ConfigModel(**data).dump_model_to_json()
+        ConfigLayers(config_model_json).validate()
+
+        if cache is not None:
+            cache.save(key, config_model_json, extends)
+
+        return config_model_json
+
+    def _is_entity_unchanged(
+        self: Self,
+        entity: int,
+        entity_type: Entity,
+        fingerprint: str,
+        metadata: EntityMetadata,
+    ) -> bool:
+        if self.state is None or self.options.full:
+            return False
+
+        if not self.state.is_unchanged(
+            entity_type, entity, fingerprint, metadata.updated_at
+        ):
+            return False
+
+        LOGGER.info("SKIP: %s %s unchanged since last apply", entity_type.lname, entity)
+        return True
+
+    def _record_entity_state(
+        self: Self,
+        entity: int,
+        entity_type: Entity,
+        fingerprint: str,
+        metadata: EntityMetadata,
+        errors: list[str],
     ) -> None:
-        self.gl = GitLab(gitlab_host)
+        if self.state is None:
+            return None
+
+        if errors:
+            LOGGER.warning(
+                f"{entity_type.lname} {entity} not saved to state, "
+                f"{len(errors)} requests failed"
+            )
+            return None
+
+        self.state.record(entity_type, entity, fingerprint, metadata.updated_at)
+
+    def _save_state(self: Self) -> None:
+        if self.state:
+            self.state.save()
+
+    def _close_journal(self: Self) -> None:
+        if self.journal:
+            self.journal.close(
+                completed=not self.failures and not self._request_errors_ignored
+            )
+
+    def _is_resource_done(
+        self: Self,
+        entity: int,
+        entity_type: Entity,
+        resource: str,
+        fingerprint: Optional[str],
+    ) -> bool:
+        if self.journal is None or not self.journal.is_done(
+            entity_type, entity, resource, fingerprint  # type: ignore
+        ):
+            return False
+
+        LOGGER.info(
+            "SKIP: %s of %s %s applied before resume",
+            resource,
+            entity_type.lname,
+            entity,
+        )
+        return True
+
+    def _process_entity(
+        self: Self,
+        entity: int,
+        entity_type: Entity,
+        entity_config: dict[str, Any],
+    ) -> None:
+        steps = self._reconcile_steps(self.gl, entity, entity_type, entity_config)
+
+        if (entity_type, entity) not in self._inventory_entities:
+            return _run_steps(steps)
+
+        try:
+            with raise_request_errors():
+                _run_steps(steps)
+        except GitLabRequestError as e:
+            if not self._drop_missing_entity(entity, entity_type, e):
+                # logged by the client, as without the inventory
+                sys.exit(1)
+
+    def _reconcile_steps(
+        self: Self,
+        client: "GitLab | AsyncGitLab",
+        entity: int,
+        entity_type: Entity,
+        entity_config: dict[str, Any],
+    ) -> Generator[Any, Any, None]:
+        """
+        Reconciles the entity with config. Yields calls of `client` and gets
+        their results back, so `_run_steps` and `_run_steps_async` share it.
+        """
+        with track_request_errors() as errors:
+            yield from self._reconcile_entity_steps(
+                client, entity, entity_type, entity_config
+            )
+
+        # errors ignored with `IGNORE_REQUESTS_ERRORS` are no failures of the
+        # entity, but the run is not complete either
+        if errors:
+            self._request_errors_ignored = True
+
+    def _reconcile_entity_steps(
+        self: Self,
+        client: "GitLab | AsyncGitLab",
+        entity: int,
+        entity_type: Entity,
+        entity_config: dict[str, Any],
+    ) -> Generator[Any, Any, None]:
+        LOGGER.info("processing: %s - %s", entity_type.lname, entity)
+
+        if self.plan is not None:
+            self._add_to_plan(
+                (yield client.get_entity_changes(entity, entity_type, entity_config))
+            )
+            return None
+
+        if self.options.dedup_inherited:
+            entity_config = self._get_deduplicated_config(
+                entity,
+                entity_type,
+                entity_config,
+                (
+                    yield from self._inherited_variables_steps(
+                        client, entity, entity_type
+                    )
+                ),
+            )
+
+        if self.state is None:
+            yield from self._apply_steps(client, entity, entity_type, entity_config)
+            return None
+
+        # with dedup the config includes inherited variables, so a change
+        # in ancestor groups changes the fingerprint too
+        fingerprint = ApplyState.get_fingerprint(entity_config)
+        try:
+            # cached metadata may come from a stale inventory or discovery
+            # file, the skip needs the current `updated_at`
+            metadata = yield client.get_entity_metadata(
+                entity, entity_type, not self.options.full
+            )
+        except LookupError as e:
+            LOGGER.error(f"ERROR: {e}")
+            return None
+
+        if self._is_entity_unchanged(entity, entity_type, fingerprint, metadata):
+            return None
+
+        self.state.forget(entity_type, entity)
+
+        with track_request_errors() as errors:
+            changed = yield from self._apply_steps(
+                client, entity, entity_type, entity_config
+            )
+            # writes may move `updated_at`, remember the state after them
+            metadata = yield client.get_entity_metadata(entity, entity_type, changed)
+
+        self._record_entity_state(entity, entity_type, fingerprint, metadata, errors)
+
+    def _get_deduplicated_config(
+        self: Self,
+        entity: int,
+        entity_type: Entity,
+        entity_config: dict[str, Any],
+        inherited_variables: list[dict[str, Any]],
+    ) -> dict[str, Any]:
+        "Moves variables the entity inherits from ancestors to `inherited_variables`"
+        if not entity_config.get("variables"):
+            return entity_config
+
+        kept, dropped = _helpers.get_deduplicated_variables(
+            entity_config["variables"], inherited_variables
+        )
+
+        for var in dropped:
+            LOGGER.debug(
+                "SKIP: variable %s is inherited by %s %s",
+                var.get("key"),
+                entity_type.lname,
+                entity,
+            )
+
+        return {**entity_config, "variables": kept, "inherited_variables": dropped}
+
+    def _get_group_variables(
+        self: Self,
+        client: "GitLab | AsyncGitLab",
+        group_id: int,
+    ) -> Any:
+        "Variables of the group read once, as a task awaited by all readers in asyncio"
+        with self._group_variables_lock:
+            variables = self._group_variables.get(group_id)
+
+        if variables is None:
+            variables = client.get_group_variables(group_id)
+            if inspect.isawaitable(variables):
+                import asyncio
+
+                variables = asyncio.ensure_future(variables)
+
+            with self._group_variables_lock:
+                self._group_variables[group_id] = variables
+
+        return variables
+
+    def _inherited_variables_steps(
+        self: Self,
+        client: "GitLab | AsyncGitLab",
+        entity: int,
+        entity_type: Entity,
+    ) -> Generator[Any, Any, list[dict[str, Any]]]:
+        "Variables of all ancestor groups of the entity"
+        inherited: list[dict[str, Any]] = []
+        parent_id = (yield client.get_entity_metadata(entity, entity_type)).parent_id
 
-        config_model = ConfigModel(**_helpers.load_data_from_yaml(config_file))
-        self.config_model_json = config_model.dump_model_to_json()
+        while parent_id is not None:
+            inherited.extend((yield self._get_group_variables(client, parent_id)))
+            parent_id = (
+                yield client.get_entity_metadata(parent_id, Entity.GROUP)
+            ).parent_id
 
-        LOGGER.debug(
-            f"config_model_json:\n{json.dumps(self.config_model_json, indent=2)}\n"
+        return inherited
+
+    def _group_levels_steps(
+        self: Self,
+        client: "GitLab | AsyncGitLab",
+        groups: list[int],
+    ) -> Generator[Any, Any, list[list[int]]]:
+        "Groups by depth, parents first, so children see applied parent variables"
+        levels: dict[int, list[int]] = {}
+
+        for group in groups:
+            metadata = yield client.get_entity_metadata(group, Entity.GROUP)
+            levels.setdefault(metadata.full_path.count("/"), []).append(group)
+
+        return [levels[depth] for depth in sorted(levels)]
+
+    def _apply_steps(
+        self: Self,
+        client: "GitLab | AsyncGitLab",
+        entity: int,
+        entity_type: Entity,
+        entity_config: dict[str, Any],
+    ) -> Generator[Any, Any, bool]:
+        "Reconciles the entity with config, returns whether anything was written"
+        changed = False
+
+        settings: dict[str, Any] = entity_config.get("settings", {})
+
+        variables: list[dict[str, Variable]] = entity_config.get(
+            "variables",
+            [],
+        )
+
+        protected_branches: dict[str, ProtectedBranch] = entity_config.get(
+            "protected_branches",
+            {},
+        )
+
+        resources: list[tuple[str, str, Callable[[], Any]]] = []
+
+        if settings:
+            resources.append(
+                (
+                    "settings",
+                    "configure settings in entity: %s",
+                    functools.partial(
+                        client.confugure_entity, entity, entity_type, settings
+                    ),
+                )
+            )
+
+        # all configured variables may be inherited, redundant ones still go
+        if variables or entity_config.get("inherited_variables"):
+            resources.append(
+                (
+                    "variables",
+                    "update variables in entity: %s",
+                    functools.partial(
+                        client.update_entity_variables,
+                        entity,
+                        entity_type,
+                        variables,  # type: ignore
+                    ),
+                )
+            )
+
+        if protected_branches:
+            resources.append(
+                (
+                    "protected_branches",
+                    "update protected branches entity: %s",
+                    functools.partial(
+                        client.update_entity_protected_branches,
+                        entity,
+                        entity_type,
+                        protected_branches,
+                    ),
+                )
+            )
+
+        fingerprint = (
+            ApplyState.get_fingerprint(entity_config) if self.journal else None
         )
 
+        for resource, message, call in resources:
+            LOGGER.info(message, entity)
+            if self._is_resource_done(entity, entity_type, resource, fingerprint):
+                continue
+
+            with track_request_errors() as errors:
+                changed |= yield call()
+
+            # journaled when no request failed, a resumed run repeats it otherwise
+            if self.journal is not None and not errors:
+                self.journal.record(entity_type, entity, resource, fingerprint)  # type: ignore
+
+        return changed
+
+    def _run_buffered(
+        self: Self,
+        name: str,
+        call: Callable[[], Any],
+    ) -> tuple[list[logging.LogRecord], str | None]:
+        error: str | None = None
+
+        with buffered_records() as records:
+            try:
+                call()
+            except SystemExit as e:
+                error = f"aborted with exit code {e.code}"
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                LOGGER.exception(f"ERROR: {name} failed")
+
+        return records, error
+
+    def _run_in_workers(self: Self, jobs: dict[str, Callable[[], Any]]) -> None:
+        "Runs jobs of independent entities, failures are collected by job name"
+        if self.options.workers <= 1:
+            for call in jobs.values():
+                call()
+            return None
+
+        with ThreadPoolExecutor(max_workers=self.options.workers) as executor:
+            results = executor.map(lambda job: self._run_buffered(*job), jobs.items())
+
+            # map() yields in submission order, so every entity's log block
+            # is replayed in one piece and in the same order as sequential run
+            for name, (records, error) in zip(jobs, results):
+                for record in records:
+                    LOGGER.handle(record)
+
+                if error:
+                    self.failures[name] = error
+
+    def _get_entity_configs(
+        self: Self,
+        entities: list[int],
+        entity_type: Entity,
+        layers: Optional[ConfigLayers] = None,
+    ) -> dict[int, dict[str, Any]]:
+        "Effective config of every entity, unavailable entities are left out"
+        layers = layers or self.layers
+        if not layers.overrides:
+            return {entity: layers.base[entity_type] for entity in entities}
+
+        entity_configs: dict[int, dict[str, Any]] = {}
+        for entity in entities:
+            entity_config = _run_steps(
+                self._entity_config_steps(self.gl, entity, entity_type, layers)
+            )
+            if entity_config is not None:
+                entity_configs[entity] = entity_config
+
+        return entity_configs
+
+    def _entity_config_steps(
+        self: Self,
+        client: "GitLab | AsyncGitLab",
+        entity: int,
+        entity_type: Entity,
+        layers: ConfigLayers,
+    ) -> Generator[Any, Any, Optional[dict[str, Any]]]:
+        "Config of the entity by its path, None when the entity is unavailable"
+        try:
+            metadata = yield client.get_entity_metadata(entity, entity_type)
+        except LookupError as e:
+            LOGGER.error(f"ERROR: {e}")
+            return None
+
+        return layers.get_entity_config(entity_type, metadata.full_path)
+
     def _process_entity_configuration(
         self: Self,
         entities: list[int | None],
         entity_type: Entity,
+        entity_configs: Optional[dict[int, dict[str, Any]]] = None,
     ) -> None:
-        for entity in entities:
-            LOGGER.info(f"processing: {entity_type.lname} - {entity}")
-            entity_config: dict[str, Any] = self.config_model_json.get(
-                f"{entity_type.lname}_config", {}
+        "`entity_configs` are given by batch runs, resolved from own layers otherwise"
+        entities = self._get_shard_entities(entities, entity_type)  # type: ignore
+
+        if entity_configs is None:
+            entity_configs = self._get_entity_configs(
+                entities, entity_type  # type: ignore
+            )
+
+        if self.graphql is not None:
+            self.graphql.prefetch(entity_type, entity_configs)
+
+        batches = (
+            _run_steps(self._group_levels_steps(self.gl, entities))  # type: ignore
+            if self.options.dedup_inherited and entity_type == Entity.GROUP
+            else [entities]
+        )
+
+        for batch in batches:
+            self._run_in_workers(
+                {
+                    f"{entity_type.lname} {entity}": functools.partial(
+                        self._process_entity,
+                        entity,  # type: ignore
+                        entity_type,
+                        entity_configs[entity],  # type: ignore
+                    )
+                    for entity in batch
+                    if entity in entity_configs
+                }
             )
 
-            settings: dict[str, Any] = entity_config.get("settings", {})
+        # state of skipped entities is not used
+        self.gl.prefetched.clear()
 
-            variables: list[dict[str, Variable]] = entity_config.get(
-                "variables",
-                [],
+    def _add_to_plan(self: Self, changes: list[PlannedChange]) -> None:
+        for change in changes:
+            LOGGER.info("PLAN: %s", change.describe())
+
+        with self._plan_lock:
+            self.plan.changes.extend(changes)  # type: ignore
+
+    def _save_plan(self: Self) -> None:
+        if self.plan is None:
+            return None
+
+        # workers finish in any order, keep the file stable between runs
+        self.plan.changes.sort(
+            key=lambda change: (
+                change.entity.split("/")[0],
+                int(change.entity.split("/")[-1]),
             )
+        )
+        self.plan.save(self.options.plan_file)  # type: ignore
+
+        entities = {change.entity for change in self.plan.changes}
+        LOGGER.info(
+            f"plan: {len(self.plan.changes)} changes in {len(entities)} entities "
+            f"written to {self.options.plan_file}"
+        )
+
+    def apply_plan(self: Self, plan_file: str) -> None:
+        "Sends exactly the requests of a saved plan, without reading GitLab state"
+        plan = Plan.load(plan_file)
 
-            protected_branches: dict[str, ProtectedBranch] = entity_config.get(
-                "protected_branches",
-                {},
+        if plan.gitlab_host != self.gitlab_host:
+            LOGGER.error(
+                f"ERROR: plan {plan_file} was created for {plan.gitlab_host}, "
+                f"not for {self.gitlab_host}"
             )
+            sys.exit(1)
+
+        changes: dict[str, list[PlannedChange]] = {}
+        for change in plan.changes:
+            changes.setdefault(change.entity, []).append(change)
+
+        LOGGER.info(
+            f"applying plan {plan_file} from {plan.created_at}: "
+            f"{len(plan.changes)} changes in {len(changes)} entities"
+        )
+
+        self._run_in_workers(
+            {
+                entity: functools.partial(self.gl.apply_changes, entity_changes)
+                for entity, entity_changes in changes.items()
+            }
+        )
+
+        self._finish_run(self.gl.retry_stats, self.gl.metrics)
+
+    def _finish_run(
+        self: Self,
+        retry_stats: RetryStats,
+        metrics: RequestMetrics,
+    ) -> None:
+        "Saves files of the run and releases connections, exits on failures"
+        self._save_state()
+        self._close_journal()
+        self._save_plan()
+        self.gl.close()
+        self._report_run_summary(retry_stats, metrics)
+
+    def _report_run_summary(
+        self: Self,
+        retry_stats: RetryStats,
+        metrics: RequestMetrics,
+    ) -> None:
+        LOGGER.info(f"run summary: {retry_stats.summary()}")
+        LOGGER.info(f"run summary: {metrics.summary()}")
+
+        if not self.failures:
+            return None
+
+        LOGGER.error(f"ERROR: configuration failed for {len(self.failures)} entities:")
+        for entity, error in self.failures.items():
+            LOGGER.error(f"{entity}: {error}")
+
+        sys.exit(1)
+
+    def _save_metrics(self: Self) -> None:
+        self._metrics.save(self.options.metrics_json, self.options.metrics_prometheus)
+
+    def _find_in_inventory(
+        self: Self,
+        entity_path: str,
+        entity_type: Entity,
+        entity_cache: EntityCache,
+    ) -> Optional[int]:
+        if not self.inventory:
+            return None
+
+        metadata = self.inventory.get_metadata_by_path(entity_type, entity_path)
+        if metadata is None:
+            return None
+
+        self._inventory_entities.add((entity_type, metadata.id))
+
+        return entity_cache.put(metadata).id
+
+    def _save_to_inventory(
+        self: Self,
+        entity_id: int,
+        entity_type: Entity,
+        entity_cache: EntityCache,
+    ) -> None:
+        metadata = entity_cache.get(entity_type, entity_id)
+
+        if self.inventory and metadata:
+            self.inventory.save(metadata)
+
+    def _expand_from_inventory(
+        self: Self,
+        group_id: int,
+        entity_cache: EntityCache,
+    ) -> Optional[tuple[list[int], list[int]]]:
+        if self.inventory is None or not self.inventory.refresh(self.gl, group_id):
+            return None
+
+        descendants = self.inventory.get_descendants(group_id)
+        if descendants is None:
+            return None
+
+        groups, projects = descendants
+        self._inventory_entities.update(
+            [(Entity.GROUP, group.id) for group in groups]
+            + [(Entity.PROJECT, project.id) for project in projects]
+        )
+
+        return (
+            [entity_cache.put(group).id for group in groups],
+            [entity_cache.put(project).id for project in projects],
+        )
+
+    def _drop_missing_entity(
+        self: Self,
+        entity: int,
+        entity_type: Entity,
+        error: GitLabRequestError,
+    ) -> bool:
+        "Drops an entity of a stale inventory from it if GitLab doesn't know it"
+        if (
+            self.inventory is None
+            or error.status_code != 404
+            or (entity_type, entity) not in self._inventory_entities
+        ):
+            return False
+
+        # 404 of a sub-resource, e.g. a removed protected branch, is a failure
+        r = self.gl._send_gitlab_request(
+            method="GET",
+            url_postfix=f"{entity_type.value}/{entity}",
+            exit_on_error=False,
+        )
+        if r.status_code != 404:
+            return False
+
+        LOGGER.warning(
+            f"SKIP: {entity_type.lname} {entity} not found, dropped from inventory"
+        )
+        self.inventory.remove(entity_type, entity)
+
+        return True
+
+    def _get_entity_id(
+        self: Self,
+        entity_path: str,
+        entity_type: Entity,
+    ) -> int:
+        "Resolves the path from the inventory, falls back to GitLab API"
+        id = self._entity_ids.get((entity_type, entity_path))
+        if id is not None:
+            return id
+
+        id = self._find_in_inventory(entity_path, entity_type, self.gl.entity_cache)
+
+        if id is None:
+            id = self.gl.get_entity_id_from_url(entity_path, entity_type)
+            self._save_to_inventory(id, entity_type, self.gl.entity_cache)
+
+        self._entity_ids[(entity_type, entity_path)] = id
+        return id
+
+    def _get_filters(self: Self, config_model_json: dict[str, Any]) -> DiscoveryFilters:
+        "`filters` of the config with the run ones on top, exclude lists add up"
+        filters = dict(config_model_json.get("filters", {}))
+
+        for key, value in self.options.filters.model_dump(exclude_none=True).items():
+            if key in ("exclude_paths", "exclude_ids"):
+                filters[key] = [*filters.get(key, []), *value]
+            else:
+                filters[key] = value
+
+        return DiscoveryFilters(**filters)
+
+    def _filter_entities(
+        self: Self,
+        entities: list[int],
+        entity_type: Entity,
+        filters: DiscoveryFilters,
+        entity_cache: Optional[EntityCache] = None,
+    ) -> list[int]:
+        """
+        Leaves out entities of `exclude_ids` and `exclude_paths`, so they never
+        enter the work queue. Paths come from discovery, an entity not seen
+        there (e.g. a project listed by ID) is fetched. The async path passes
+        its `entity_cache` with the metadata already fetched.
+        """
+        if not filters.exclude_ids and not filters.exclude_paths:
+            return entities
 
-            if settings:
-                LOGGER.info(f"configure settings in entity: {entity}")
-                self.gl.confugure_entity(
-                    entity_id=entity,  # type: ignore
-                    entity_type=entity_type,
-                    config=settings,
+        kept: list[int] = []
+        for entity in entities:
+            metadata = None
+            if filters.exclude_paths:
+                metadata = (entity_cache or self.gl.entity_cache).get(
+                    entity_type, entity
                 )
+                if metadata is None and entity_cache is not None:
+                    continue  # not available, reported by the async fetch
+                if metadata is None:
+                    try:
+                        metadata = self.gl.get_entity_metadata(entity, entity_type)
+                    except LookupError as e:
+                        LOGGER.error(f"ERROR: {e}")
+                        continue
 
-            if variables:
-                LOGGER.info(f"update variables in entity: {entity}")
-                self.gl.update_entity_variables(
-                    entity_id=entity,  # type: ignore
-                    entity_type=entity_type,
-                    config_variables=variables,
+            if _helpers.is_entity_excluded(
+                entity,
+                metadata.full_path if metadata else None,
+                filters.exclude_ids,
+                filters.exclude_paths,
+            ):
+                LOGGER.debug(
+                    "SKIP: %s %s excluded by filters", entity_type.lname, entity
                 )
+                continue
+
+            kept.append(entity)
+
+        if len(kept) < len(entities):
+            LOGGER.info(
+                "SKIP: %s %ss excluded by filters",
+                len(entities) - len(kept),
+                entity_type.lname,
+            )
+
+        return kept
+
+    def _get_discovery_key(
+        self: Self,
+        config_model_json: dict[str, Any],
+        filters: DiscoveryFilters,
+        recursive: bool,
+    ) -> str:
+        from .gitlab.discovery_file import DiscoveryFile
+
+        return DiscoveryFile.get_key(
+            config_model_json,
+            filters.model_dump(exclude_none=True, mode="json"),
+            recursive,
+        )
+
+    def _save_discovered(
+        self: Self,
+        key: str,
+        found: tuple[list[int], list[int]],
+        entity_cache: EntityCache,
+    ) -> None:
+        if self.discovery_file is None:
+            return None
+
+        self.discovery_file.put(key, *found, entity_cache)
+        self.discovery_file.save()
+        LOGGER.info("discovered entities saved to %s", self.discovery_file.path)
+
+    def _get_shard_entities(
+        self: Self,
+        entities: list[int],
+        entity_type: Entity,
+    ) -> list[int]:
+        "Entities of this shard, every job of the run computes the same split"
+        if self.options.shard is None:
+            return entities
+
+        index, total = self.options.shard
+        shard_entities = [
+            entity
+            for entity in entities
+            if _helpers.get_shard(f"{entity_type.value}/{entity}", total) == index
+        ]
+
+        LOGGER.info(
+            "shard %s/%s: %s of %s %ss",
+            index,
+            total,
+            len(shard_entities),
+            len(entities),
+            entity_type.lname,
+        )
+
+        return shard_entities
+
+    def _expand_from_discovered(
+        self: Self,
+        group_id: int,
+        params: dict[str, str],
+    ) -> Optional[tuple[list[int], list[int]]]:
+        "Subtree of a group inside an already discovered one, e.g. in batch runs"
+        params_key = tuple(sorted(params.items()))
+        if (group_id, params_key) in self._discovered:
+            return self._discovered[(group_id, params_key)]
 
-            if protected_branches:
-                LOGGER.info(f"update protected branches entity: {entity}")
-                self.gl.update_entity_protected_branches(
-                    entity_id=entity,  # type: ignore
-                    entity_type=entity_type,
-                    config_protected_branches=protected_branches,
+        cache = self.gl.entity_cache
+        group = cache.get(Entity.GROUP, group_id)
+        if group is None:
+            return None
+
+        prefix = f"{group.full_path}/"
+        for (_, discovered_params), (groups, projects) in self._discovered.items():
+            if discovered_params != params_key or group_id not in groups:
+                continue
+
+            found = [cache.get(Entity.GROUP, id) for id in groups], [
+                cache.get(Entity.PROJECT, id) for id in projects
+            ]
+            if any(entity is None for entities in found for entity in entities):
+                return None
+
+            return (
+                [g.id for g in found[0] if g.full_path.startswith(prefix)],  # type: ignore
+                [p.id for p in found[1] if p.full_path.startswith(prefix)],  # type: ignore
+            )
+
+        return None
+
+    def _discover_group_recursive(
+        self: Self,
+        group_id: int,
+        params: Optional[dict[str, str]] = None,
+    ) -> tuple[list[int], list[int]]:
+        "`params` filter project listings, the inventory can't apply them"
+        params = params or {}
+
+        found = self._expand_from_discovered(group_id, params)
+        if found is None and not params:
+            found = self._expand_from_inventory(group_id, self.gl.entity_cache)
+
+        if found is None:
+            if self.options.discovery == _consts.DiscoveryMode.recursive.value:
+                found = (
+                    self.gl.get_all_groups_recursive(group_id),
+                    self.gl.get_all_projects_recursive(group_id, params=params),
                 )
+            else:
+                found = self.gl.get_group_hierarchy(group_id, params)
+
+        self._discovered[(group_id, tuple(sorted(params.items())))] = found
+        # callers extend the lists, the memoized ones stay intact
+        return list(found[0]), list(found[1])
 
     def process_manual_configuration(
         self: Self,
@@ -94,7 +1015,7 @@ class Pivlabform:
             sys.exit(1)
 
         if not id:
-            id = self.gl.get_entity_id_from_url(
+            id = self._get_entity_id(
                 entity_path=path,  # type: ignore
                 entity_type=entity_type,
             )
@@ -103,19 +1024,25 @@ class Pivlabform:
         projects: list[int]
         groups, projects = [], []
 
-        if entity_type == Entity.GROUP.lname:
-            groups = self.gl.get_all_groups_recursive(id) if recursive else [id]
-            projects = (
-                self.gl.get_all_projects_recursive(id)
-                if recursive
-                else self.gl.get_all_projects_from_group(id)
-            )
-        elif entity_type == Entity.PROJECT.lname:
+        filters = self._get_filters(self.config_model_json)
+        params = filters.get_project_params()
+
+        if entity_type == Entity.GROUP:
+            if recursive:
+                groups, projects = self._discover_group_recursive(id, params)
+                groups.append(id)
+            else:
+                groups = [id]
+                projects = self.gl.get_all_projects_from_group(id, params)
+        elif entity_type == Entity.PROJECT:
             groups = []
             projects = [id]
 
-        LOGGER.info(f"groups: {groups}")
-        LOGGER.info(f"projects: {projects}")
+        groups = self._filter_entities(groups, Entity.GROUP, filters)
+        projects = self._filter_entities(projects, Entity.PROJECT, filters)
+
+        LOGGER.info("groups: %s", IdsSummary(groups))
+        LOGGER.info("projects: %s", IdsSummary(projects))
 
         _helpers.check_validate(validate)
 
@@ -129,22 +1056,41 @@ class Pivlabform:
             entity_type=Entity.PROJECT,
         )
 
+        self._finish_run(self.gl.retry_stats, self.gl.metrics)
+
     def get_entities_id_list(
         self: Self,
         recursive: bool,
+        config_model_json: Optional[dict[str, Any]] = None,
     ) -> tuple[list[int], list[int]]:
+        if config_model_json is None:
+            config_model_json = self.config_model_json
 
-        projects = self.config_model_json.get("projects", [])
-        groups = self.config_model_json.get("groups", [])
+        projects = config_model_json.get("projects", [])
+        groups = config_model_json.get("groups", [])
+
+        LOGGER.info(
+            "config entities: projects %s, groups %s",
+            IdsSummary(projects),
+            IdsSummary(groups),
+        )
+
+        filters = self._get_filters(config_model_json)
+        params = filters.get_project_params()
 
-        LOGGER.info((f"config entities:\nprojects: {projects}\ngroups: {groups}\n"))
+        key = self._get_discovery_key(config_model_json, filters, recursive)
+        if self.discovery_file is not None:
+            found = self.discovery_file.get(key, self.gl.entity_cache)
+            if found is not None:
+                LOGGER.info("entities loaded from %s", self.discovery_file.path)
+                return found
 
         project_entities: list[int] = []
         group_entities: list[int] = []
 
         for group in groups:
             if type(group) is str:
-                id = self.gl.get_entity_id_from_url(group, Entity.GROUP)
+                id = self._get_entity_id(group, Entity.GROUP)
             elif type(group) is int:
                 id = group
             else:
@@ -153,20 +1099,14 @@ class Pivlabform:
 
             if recursive:
                 LOGGER.info("finding recursive groups and projects")
-                group_entities.extend(
-                    self.gl.get_all_groups_recursive(
-                        id,
-                    )  # type: ignore
-                )
-                project_entities.extend(
-                    self.gl.get_all_projects_recursive(
-                        id,
-                    )  # type: ignore
-                )
+                subgroups, subprojects = self._discover_group_recursive(id, params)
+                group_entities.extend(subgroups)
+                project_entities.extend(subprojects)
             else:
                 project_entities.extend(
                     self.gl.get_all_projects_from_group(
                         id,
+                        params,
                     )  # type: ignore
                 )
 
@@ -174,7 +1114,7 @@ class Pivlabform:
 
         for project in projects:
             if type(project) is str:
-                id = self.gl.get_entity_id_from_url(project, Entity.PROJECT)
+                id = self._get_entity_id(project, Entity.PROJECT)
             elif type(project) is int:
                 id = project
             else:
@@ -185,7 +1125,13 @@ class Pivlabform:
 
             project_entities.append(id)
 
-        return (group_entities, project_entities)
+        found = (
+            self._filter_entities(group_entities, Entity.GROUP, filters),
+            self._filter_entities(project_entities, Entity.PROJECT, filters),
+        )
+        self._save_discovered(key, found, self.gl.entity_cache)
+
+        return found
 
     def process_auto_configuration(
         self: Self,
@@ -198,23 +1144,368 @@ class Pivlabform:
         )
 
         LOGGER.info(
-            (
-                "found entities for setup:\n"
-                f"projects for configuration: {projects}\n"
-                f"groups for configuration: {groups}\n"
+            "found entities for setup: projects %s, groups %s",
+            IdsSummary(projects),
+            IdsSummary(groups),
+        )
+        LOGGER.debug("projects for configuration: %s", projects)
+        LOGGER.debug("groups for configuration: %s", groups)
+
+        _helpers.check_validate(validate)
+
+        self._process_entities(groups, projects)
+
+    def process_batch_configuration(
+        self: Self,
+        config_files: list[str],
+        recursive: bool,
+        validate: bool,
+    ):
+        """
+        Auto configuration of several config files in one run: one session,
+        path resolution and discovery shared by all configs, every entity
+        configured once. An entity targeted by configs with different
+        settings is a conflict, reported before anything is applied.
+        """
+        entity_configs: dict[Entity, dict[int, dict[str, Any]]] = {
+            Entity.GROUP: {},
+            Entity.PROJECT: {},
+        }
+        owners: dict[tuple[Entity, int], str] = {}
+        conflicts = 0
+
+        for config_file in config_files:
+            LOGGER.info("loading config %s", config_file)
+            config_model_json = self._load_config(config_file)
+            groups, projects = self.get_entities_id_list(recursive, config_model_json)
+            layers = ConfigLayers(config_model_json)
+
+            for entity_type, entities in (
+                (Entity.GROUP, groups),
+                (Entity.PROJECT, projects),
+            ):
+                configs = self._get_entity_configs(entities, entity_type, layers)
+
+                for entity, entity_config in configs.items():
+                    owner = owners.setdefault((entity_type, entity), config_file)
+                    claimed = entity_configs[entity_type].setdefault(
+                        entity, entity_config
+                    )
+
+                    if claimed != entity_config:
+                        conflicts += 1
+                        LOGGER.error(
+                            f"ERROR: {entity_type.lname} {entity} is configured "
+                            f"differently by {owner} and {config_file}"
+                        )
+
+        if conflicts:
+            LOGGER.error(
+                f"ERROR: {conflicts} conflicts between configs, nothing applied"
             )
+            sys.exit(1)
+
+        groups = list(entity_configs[Entity.GROUP])
+        projects = list(entity_configs[Entity.PROJECT])
+
+        LOGGER.info(
+            "found entities for setup in %s configs: projects %s, groups %s",
+            len(config_files),
+            IdsSummary(projects),
+            IdsSummary(groups),
         )
 
         _helpers.check_validate(validate)
 
+        self._process_entities(groups, projects, entity_configs)
+
+    def _process_entities(
+        self: Self,
+        groups: list[int],
+        projects: list[int],
+        entity_configs: Optional[dict[Entity, dict[int, dict[str, Any]]]] = None,
+    ) -> None:
+        configs = entity_configs or {}
+
+        # projects dedup against variables of already applied groups
+        if groups and self.options.dedup_inherited:
+            self._process_entity_configuration(
+                entities=groups,  # type: ignore
+                entity_type=Entity.GROUP,
+                entity_configs=configs.get(Entity.GROUP),
+            )
+
         if projects:
             self._process_entity_configuration(
                 entities=projects,  # type: ignore
                 entity_type=Entity.PROJECT,
+                entity_configs=configs.get(Entity.PROJECT),
             )
 
-        if groups:
+        if groups and not self.options.dedup_inherited:
             self._process_entity_configuration(
                 entities=groups,  # type: ignore
                 entity_type=Entity.GROUP,
+                entity_configs=configs.get(Entity.GROUP),
+            )
+
+        self._finish_run(self.gl.retry_stats, self.gl.metrics)
+
+    async def _process_entity_async(
+        self: Self,
+        agl: "AsyncGitLab",
+        entity: int,
+        entity_type: Entity,
+        entity_config: dict[str, Any],
+    ) -> tuple[list[logging.LogRecord], str | None]:
+        error: str | None = None
+
+        with buffered_records() as records:
+            try:
+                await _run_steps_async(
+                    self._reconcile_steps(agl, entity, entity_type, entity_config)
+                )
+            except GitLabRequestError as e:
+                import asyncio
+
+                # logged by the client; the check uses the sync client and SQLite
+                if not await asyncio.to_thread(
+                    self._drop_missing_entity, entity, entity_type, e
+                ):
+                    error = f"request failed: {e}"
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                LOGGER.exception(f"ERROR: {entity_type.lname} {entity} failed")
+
+        return records, error
+
+    async def _get_entity_configs_async(
+        self: Self,
+        agl: "AsyncGitLab",
+        entities: list[int],
+        entity_type: Entity,
+    ) -> dict[int, dict[str, Any]]:
+        "asyncio version of `_get_entity_configs`"
+        import asyncio
+
+        if not self.layers.overrides:
+            return {entity: self.layers.base[entity_type] for entity in entities}
+
+        configs = await asyncio.gather(
+            *(
+                _run_steps_async(
+                    self._entity_config_steps(agl, entity, entity_type, self.layers)
+                )
+                for entity in entities
+            )
+        )
+
+        return {
+            entity: config
+            for entity, config in zip(entities, configs)
+            if config is not None
+        }
+
+    async def _process_entity_configuration_async(
+        self: Self,
+        agl: "AsyncGitLab",
+        entities: list[int],
+        entity_type: Entity,
+    ) -> None:
+        import asyncio
+
+        entities = self._get_shard_entities(entities, entity_type)
+        entity_configs = await self._get_entity_configs_async(
+            agl, entities, entity_type
+        )
+
+        batches = (
+            await _run_steps_async(self._group_levels_steps(agl, entities))
+            if self.options.dedup_inherited and entity_type == Entity.GROUP
+            else [entities]
+        )
+
+        for batch in batches:
+            results = await asyncio.gather(
+                *(
+                    self._process_entity_async(
+                        agl, entity, entity_type, entity_configs[entity]
+                    )
+                    for entity in batch
+                    if entity in entity_configs
+                )
             )
+
+            processed = [entity for entity in batch if entity in entity_configs]
+            for entity, (records, error) in zip(processed, results):
+                for record in records:
+                    LOGGER.handle(record)
+
+                if error:
+                    self.failures[f"{entity_type.lname} {entity}"] = error
+
+    async def get_entities_id_list_async(
+        self: Self,
+        agl: "AsyncGitLab",
+        recursive: bool,
+    ) -> tuple[list[int], list[int]]:
+        import asyncio
+
+        projects = self.config_model_json.get("projects", [])
+        groups = self.config_model_json.get("groups", [])
+
+        LOGGER.info(
+            "config entities: projects %s, groups %s",
+            IdsSummary(projects),
+            IdsSummary(groups),
+        )
+
+        filters = self._get_filters(self.config_model_json)
+        params = filters.get_project_params()
+
+        key = self._get_discovery_key(self.config_model_json, filters, recursive)
+        if self.discovery_file is not None:
+            found = self.discovery_file.get(key, agl.entity_cache)
+            if found is not None:
+                LOGGER.info("entities loaded from %s", self.discovery_file.path)
+                return found
+
+        async def resolve(entity: str | int, entity_type: Entity) -> int:
+            if type(entity) is str:
+                id = self._find_in_inventory(entity, entity_type, agl.entity_cache)
+                if id is None:
+                    id = await agl.get_entity_id_from_url(entity, entity_type)
+                    self._save_to_inventory(id, entity_type, agl.entity_cache)
+                return id
+            elif type(entity) is int:
+                return entity
+
+            raise TypeError(f"unknown type of {entity_type.lname}: {entity}")
+
+        # the inventory refresh uses the sync client and SQLite, one at a time
+        inventory_lock = asyncio.Lock()
+
+        async def expand_group(id: int) -> tuple[list[int], list[int]]:
+            found = None
+            if recursive and not params:
+                async with inventory_lock:
+                    found = await asyncio.to_thread(
+                        self._expand_from_inventory, id, agl.entity_cache
+                    )
+            if found is not None:
+                return [*found[0], id], found[1]
+
+            if (
+                recursive
+                and self.options.discovery == _consts.DiscoveryMode.recursive.value
+            ):
+                subgroups, subprojects = await asyncio.gather(
+                    agl.get_all_groups_recursive(id),
+                    agl.get_all_projects_recursive(id, params),
+                )
+                return [*subgroups, id], subprojects
+            elif recursive:
+                subgroups, subprojects = await agl.get_group_hierarchy(id, params)
+                return [*subgroups, id], subprojects
+
+            return [id], await agl.get_all_projects_from_group(id, params)
+
+        group_ids = await asyncio.gather(
+            *(resolve(group, Entity.GROUP) for group in groups)
+        )
+        project_ids = await asyncio.gather(
+            *(resolve(project, Entity.PROJECT) for project in projects)
+        )
+
+        group_entities: list[int] = []
+        project_entities: list[int] = []
+
+        for found_groups, found_projects in await asyncio.gather(
+            *(expand_group(id) for id in group_ids)
+        ):
+            group_entities.extend(found_groups)
+            project_entities.extend(found_projects)
+
+        project_entities.extend(project_ids)
+
+        async def fetch_metadata(entity: int, entity_type: Entity) -> None:
+            try:
+                await agl.get_entity_metadata(entity, entity_type)
+            except LookupError as e:
+                LOGGER.error(f"ERROR: {e}")
+
+        if filters.exclude_paths:
+            # paths of entities not seen by discovery, e.g. projects listed by ID
+            await asyncio.gather(
+                *(
+                    fetch_metadata(entity, entity_type)
+                    for entity_type, entities in (
+                        (Entity.GROUP, group_entities),
+                        (Entity.PROJECT, project_entities),
+                    )
+                    for entity in entities
+                    if agl.entity_cache.get(entity_type, entity) is None
+                )
+            )
+
+        found = (
+            self._filter_entities(
+                group_entities, Entity.GROUP, filters, agl.entity_cache
+            ),
+            self._filter_entities(
+                project_entities, Entity.PROJECT, filters, agl.entity_cache
+            ),
+        )
+        self._save_discovered(key, found, agl.entity_cache)
+
+        return found
+
+    async def process_auto_configuration_async(
+        self: Self,
+        recursive: bool,
+        validate: bool,
+    ) -> None:
+        "asyncio version of `process_auto_configuration` built on `AsyncGitLab`"
+        from .gitlab.async_gitlab import AsyncGitLab
+
+        # tasks of group variables belong to the event loop of this run
+        self._group_variables.clear()
+
+        async with AsyncGitLab(
+            self.gitlab_host,
+            concurrency=self.options.concurrency,
+            retry_policy=self.options.retry_policy,
+            transport=self.options.transport,
+        ) as agl:
+            self._metrics = agl.metrics
+            groups, projects = await self.get_entities_id_list_async(
+                agl,
+                recursive=recursive,
+            )
+
+            LOGGER.info(
+                "found entities for setup: projects %s, groups %s",
+                IdsSummary(projects),
+                IdsSummary(groups),
+            )
+            LOGGER.debug("projects for configuration: %s", projects)
+            LOGGER.debug("groups for configuration: %s", groups)
+
+            _helpers.check_validate(validate)
+
+            if groups and self.options.dedup_inherited:
+                await self._process_entity_configuration_async(
+                    agl, groups, Entity.GROUP
+                )
+
+            if projects:
+                await self._process_entity_configuration_async(
+                    agl, projects, Entity.PROJECT
+                )
+
+            if groups and not self.options.dedup_inherited:
+                await self._process_entity_configuration_async(
+                    agl, groups, Entity.GROUP
+                )
+
+        self._finish_run(agl.retry_stats, agl.metrics)
@@ -14,3 +14,19 @@ class APIResources(enum.Enum):
 
 class Files(enum.Enum):
     manual_default_config = "config.yaml"
+
+
+class DiscoveryMode(enum.Enum):
+    descendants = "descendants"
+    "single pass over `descendant_groups` and `projects?include_subgroups=true`"
+
+    recursive = "recursive"
+    "walk `subgroups` and `projects` of every group one by one"
+
+
+class ReadBackend(enum.Enum):
+    rest = "rest"
+    "every entity is read with its own REST requests"
+
+    graphql = "graphql"
+    "project variables and settings are read by `/api/graphql` in batches, REST is the fallback"
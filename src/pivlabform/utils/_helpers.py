@@ -1,11 +1,16 @@
+import hashlib
+import json
 import os
+import re
 import sys
 import urllib.parse
+from collections import Counter
+from enum import Enum
 
 import typing_extensions
 import yaml
 
-from ..gitlab.models import Variable
+from ..gitlab.models import PlannedChange, PlannedRequest, Variable
 from ._logger import LOGGER
 
 
@@ -19,18 +24,139 @@ def ignore_errors() -> bool:
     return os.getenv("IGNORE_REQUESTS_ERRORS", "").lower() in ["true", "yes"]
 
 
+# libyaml bindings parse an order of magnitude faster, when they are built
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
 def load_data_from_yaml(
     yaml_path: str,
 ) -> dict[str, typing_extensions.Any]:
-    with open(yaml_path, "r") as f:
-        data = yaml.safe_load(f)
-    return data
+    with open(yaml_path, "rb") as f:
+        return parse_yaml(f.read())
+
+
+def parse_yaml(content: bytes) -> dict[str, typing_extensions.Any]:
+    return yaml.load(content, Loader=_YAML_LOADER)
+
+
+def load_layered_yaml(
+    yaml_path: str,
+    content: typing_extensions.Optional[bytes] = None,
+    extended_by: tuple[str, ...] = (),
+) -> tuple[dict[str, typing_extensions.Any], dict[str, bytes]]:
+    """
+    Parses a config merged over the configs listed in its `extends` (paths
+    relative to the config, later ones win). Returns the merged data and the
+    content of every extended file by path.
+    """
+    path = os.path.abspath(yaml_path)
+    if path in extended_by:
+        LOGGER.error(f"ERROR: config {yaml_path} extends itself")
+        sys.exit(1)
+
+    if content is None:
+        with open(path, "rb") as f:
+            content = f.read()
+
+    data = parse_yaml(content) or {}
+    extends = data.pop("extends", None) or []
+
+    merged: dict[str, typing_extensions.Any] = {}
+    extended: dict[str, bytes] = {}
+
+    for base in [extends] if isinstance(extends, str) else extends:
+        base_path = os.path.join(os.path.dirname(path), base)
+        with open(base_path, "rb") as f:
+            base_content = f.read()
+
+        base_data, base_extended = load_layered_yaml(
+            base_path, base_content, (*extended_by, path)
+        )
+        merged = merge_configs(merged, base_data)
+        extended.update({os.path.abspath(base_path): base_content, **base_extended})
+
+    return merge_configs(merged, data), extended
+
+
+def merge_configs(
+    base: dict[str, typing_extensions.Any],
+    override: dict[str, typing_extensions.Any],
+) -> dict[str, typing_extensions.Any]:
+    """
+    Deep merge of config layers: mappings (settings, variables and protected
+    branches by name) are merged key by key, any other value of `override`
+    replaces the base one. Neither argument is modified.
+    """
+    merged = dict(base)
+
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_configs(merged[key], value)
+        else:
+            merged[key] = value
+
+    return merged
+
+
+def get_config_files(paths: typing_extensions.Iterable[str]) -> list[str]:
+    "Expands directories to their `.yaml` / `.yml` files, keeps the given order"
+    config_files: list[str] = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            config_files.extend(
+                os.path.join(path, name)
+                for name in sorted(os.listdir(path))
+                if name.endswith((".yaml", ".yml"))
+            )
+        else:
+            config_files.append(path)
+
+    # a file given twice, e.g. by name and by its directory, is loaded once
+    return list(dict.fromkeys(os.path.normpath(path) for path in config_files))
 
 
 def get_urlencoded_path(path: str) -> str:
     return urllib.parse.quote_plus(path)
 
 
+def is_entity_excluded(
+    entity_id: int,
+    full_path: typing_extensions.Optional[str],
+    exclude_ids: typing_extensions.Optional[list[int]],
+    exclude_paths: typing_extensions.Optional[list[str]],
+) -> bool:
+    "`exclude_paths` are regular expressions searched in the full path"
+    if exclude_ids and entity_id in exclude_ids:
+        return True
+
+    return bool(
+        full_path
+        and exclude_paths
+        and any(re.search(pattern, full_path) for pattern in exclude_paths)
+    )
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    "`INDEX/TOTAL` with 1-based index, e.g. `$CI_NODE_INDEX/$CI_NODE_TOTAL`"
+    try:
+        index, total = (int(part) for part in value.split("/"))
+    except ValueError:
+        index, total = 0, 0
+
+    if not 1 <= index <= total:
+        LOGGER.error(f"ERROR: shard must be INDEX/TOTAL, 1 <= INDEX <= TOTAL: {value}")
+        sys.exit(1)
+
+    return index, total
+
+
+def get_shard(key: str, total: int) -> int:
+    "1-based shard of the key, the same in every process and Python version"
+    digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % total + 1
+
+
 def get_gitlab_host() -> str:
     return "https://" + os.getenv("CI_SERVER_HOST", "pivlab.space")
 
@@ -119,16 +245,61 @@ def check_variables_diff(
             result["delete"].append(current_var)  # type: ignore
 
     LOGGER.debug(
-        f"Variables diff: "
-        f"create={len(result['create'])}, "
-        f"update={len(result['update'])}, "
-        f"delete={len(result['delete'])}, "
-        f"unchanged={len(result['unchanged'])}"
+        "Variables diff: create=%s, update=%s, delete=%s, unchanged=%s",
+        len(result["create"]),
+        len(result["update"]),
+        len(result["delete"]),
+        len(result["unchanged"]),
     )
 
     return result
 
 
+def get_deduplicated_variables(
+    config_vars: list[dict[str, typing_extensions.Any]],
+    inherited_vars: list[dict[str, typing_extensions.Any]],
+) -> tuple[
+    list[dict[str, typing_extensions.Any]], list[dict[str, typing_extensions.Any]]
+]:
+    """
+    Splits configured variables into kept and dropped ones. A variable is
+    dropped when the entity already inherits it from ancestor groups: every
+    inherited variable of its key has the same scope, value and flags, and the
+    key is configured only once, so neither level precedence nor environment
+    scope matching can give a job another value.
+    """
+    config_list = _normalize_variables(config_vars)
+
+    inherited_by_key: dict[str, list[dict[str, typing_extensions.Any]]] = {}
+    for var in inherited_vars:
+        inherited_by_key.setdefault(var.get("key", ""), []).append(var)
+
+    configured_keys = Counter(var.get("key", "") for var in config_list)
+
+    kept: list[dict[str, typing_extensions.Any]] = []
+    dropped: list[dict[str, typing_extensions.Any]] = []
+
+    for var in config_list:
+        key = var.get("key", "")
+        scope = var.get("environment_scope") or "*"
+        inherited = inherited_by_key.get(key, [])
+
+        if (
+            inherited
+            and configured_keys[key] == 1
+            and all(
+                (inherited_var.get("environment_scope") or "*") == scope
+                and _are_variables_equal(inherited_var, var)  # type: ignore
+                for inherited_var in inherited
+            )
+        ):
+            dropped.append(var)
+        else:
+            kept.append(var)
+
+    return kept, dropped
+
+
 def _are_variables_equal(var1: Variable, var2: Variable) -> bool:
     fields_to_compare = [
         "value",
@@ -158,6 +329,78 @@ def _are_variables_equal(var1: Variable, var2: Variable) -> bool:
     return True
 
 
+# settings written under a different name than GitLab returns them on read
+_SETTINGS_READ_KEYS = {
+    "container_expiration_policy_attributes": "container_expiration_policy",
+}
+
+
+def _normalize_setting(value: typing_extensions.Any) -> typing_extensions.Any:
+    if isinstance(value, Enum):
+        value = value.value
+
+    # GitLab returns empty strings for unset text settings (description etc.)
+    # and empty collections for unset lists and objects
+    if value == "" or (isinstance(value, (list, dict)) and not value):
+        return None
+
+    return value
+
+
+def _is_setting_equal(
+    current: typing_extensions.Any,
+    desired: typing_extensions.Any,
+) -> bool:
+    current = _normalize_setting(current)
+    desired = _normalize_setting(desired)
+
+    # unset flags are omitted or null in older GitLab versions
+    if current is None or desired is None:
+        return (current is None or current is False) and (
+            desired is None or desired is False
+        )
+
+    if isinstance(desired, dict):
+        # nested objects are partial on write, compare only configured keys
+        return isinstance(current, dict) and all(
+            _is_setting_equal(current.get(key), value) for key, value in desired.items()
+        )
+
+    if isinstance(desired, list) and isinstance(current, list):
+        return sorted(json.dumps(v, sort_keys=True) for v in current) == sorted(
+            json.dumps(v, sort_keys=True) for v in desired
+        )
+
+    return current == desired
+
+
+def get_settings_diff(
+    current_settings: dict[str, typing_extensions.Any],
+    config_settings: dict[str, typing_extensions.Any],
+) -> dict[str, typing_extensions.Any]:
+    """
+    Returns configured settings which differ from the current entity state.
+    Settings missing in the current state (write-only attributes or fields
+    hidden by GitLab edition) are compared as unset, so only configured
+    defaults (`false`, empty values) are not written again.
+    """
+    changed: dict[str, typing_extensions.Any] = {}
+
+    for key, value in config_settings.items():
+        read_key = _SETTINGS_READ_KEYS.get(key, key)
+
+        if not _is_setting_equal(current_settings.get(read_key), value):
+            changed[key] = value
+
+    LOGGER.debug(
+        "Settings diff: changed=%s, unchanged=%s",
+        len(changed),
+        len(config_settings) - len(changed),
+    )
+
+    return changed
+
+
 def _get_access_level(
     branch_data: dict[str, typing_extensions.Any],
     access_type: str,
@@ -194,3 +437,284 @@ def parse_protected_branches(branches_list: list[dict[str, typing_extensions.Any
         }
 
     return current_branches
+
+
+# values GitLab applies to access levels missing in the create request
+_PROTECTED_BRANCH_DEFAULTS: dict[str, typing_extensions.Any] = {
+    "merge_access_level": 40,
+    "push_access_level": 40,
+    "unprotect_access_level": 40,
+    "allow_force_push": False,
+}
+
+
+def _is_allowed_to_supported(branch: dict[str, typing_extensions.Any]) -> bool:
+    """
+    `allowed_to_*` params of protected branches are Premium and Ultimate
+    only, CE ignores them; only their API returns `code_owner_approval_required`
+    """
+    return "code_owner_approval_required" in branch
+
+
+def get_protected_branch_patch(
+    current_branch: dict[str, typing_extensions.Any],
+    config_branch: typing_extensions.Optional[dict[str, typing_extensions.Any]],
+) -> typing_extensions.Optional[dict[str, typing_extensions.Any]]:
+    """
+    Returns `PATCH protected_branches/:name` payload which turns the current
+    protection (raw API object) into the configured one: an empty dict when
+    both are equal and None when PATCH can't express the change, e.g. on CE
+    or when an access type has no or several rules (user or group based).
+    Access levels missing in config are compared with GitLab create defaults,
+    unless the API doesn't return them (`unprotect_access_levels` on CE).
+    """
+    desired = {k: v for k, v in (config_branch or {}).items() if v is not None}
+    current = parse_protected_branches([current_branch])[current_branch["name"]]
+
+    patch: dict[str, typing_extensions.Any] = {}
+
+    allow_force_push = desired.get(
+        "allow_force_push", _PROTECTED_BRANCH_DEFAULTS["allow_force_push"]
+    )
+    if bool(current["allow_force_push"]) != bool(allow_force_push):
+        patch["allow_force_push"] = allow_force_push
+
+    for access_type in ("merge", "push", "unprotect"):
+        key = f"{access_type}_access_level"
+        if key not in desired and current[key] is None:
+            continue
+
+        access_level = desired.get(key, _PROTECTED_BRANCH_DEFAULTS[key])
+        if current[key] == access_level:
+            continue
+
+        if not _is_allowed_to_supported(current_branch):
+            return None
+
+        rules = current_branch.get(f"{access_type}_access_levels") or []
+        if (
+            len(rules) != 1
+            or "id" not in rules[0]
+            or rules[0].get("user_id")
+            or rules[0].get("group_id")
+        ):
+            return None
+
+        patch[f"allowed_to_{access_type}"] = [
+            {"id": rules[0]["id"], "access_level": access_level}
+        ]
+
+    return patch
+
+
+def get_settings_changes(
+    entity: str,
+    current_settings: dict[str, typing_extensions.Any],
+    config_settings: dict[str, typing_extensions.Any],
+) -> list[PlannedChange]:
+    "`entity` is the API path of the entity, e.g. `projects/1001`"
+    changed = get_settings_diff(current_settings, config_settings)
+
+    if not changed:
+        return []
+
+    return [
+        PlannedChange(
+            entity=entity,
+            action="update",
+            target="settings",
+            before={
+                key: current_settings.get(_SETTINGS_READ_KEYS.get(key, key))
+                for key in changed
+            },
+            after=changed,
+            requests=[PlannedRequest(method="PUT", url_postfix=entity, data=changed)],
+        )
+    ]
+
+
+def _get_variable_target(var: dict[str, typing_extensions.Any]) -> str:
+    scope = var.get("environment_scope", "*")
+    return f"variable {var.get('key')}" + (f" ({scope})" if scope != "*" else "")
+
+
+def _get_variable_params(
+    var: dict[str, typing_extensions.Any],
+    scoped_keys: set[str],
+) -> dict[str, typing_extensions.Any]:
+    """
+    Without the filter GitLab can't tell apart variables of one key in several
+    scopes. The filter is Premium-only, so it is sent only for scoped variables.
+    """
+    scope = var.get("environment_scope", "*")
+    if scope == "*" and var.get("key") not in scoped_keys:
+        return {}
+
+    return {"filter[environment_scope]": scope}
+
+
+def get_variables_changes(
+    entity: str,
+    current_vars: list[dict[str, typing_extensions.Any]],
+    config_vars: list[dict[str, typing_extensions.Any]],
+) -> list[PlannedChange]:
+    variables = check_variables_diff(current_vars, config_vars)
+    current_lookup = {
+        (var.get("key"), var.get("environment_scope", "*")): var
+        for var in _normalize_variables(current_vars)
+    }
+    # keys set in other scopes than `*`, their `*` variable needs the filter too
+    scoped_keys = {key for key, scope in current_lookup if scope != "*"}
+
+    url_postfix = f"{entity}/variables"
+    changes: list[PlannedChange] = []
+
+    for var in variables["create"]:
+        changes.append(
+            PlannedChange(
+                entity=entity,
+                action="create",
+                target=_get_variable_target(var),  # type: ignore
+                after=var,
+                requests=[
+                    PlannedRequest(method="POST", url_postfix=url_postfix, data=var)
+                ],
+            )
+        )
+
+    for var in variables["update"]:
+        changes.append(
+            PlannedChange(
+                entity=entity,
+                action="update",
+                target=_get_variable_target(var),  # type: ignore
+                before=current_lookup.get(
+                    (var.get("key"), var.get("environment_scope", "*"))  # type: ignore
+                ),
+                after=var,
+                requests=[
+                    PlannedRequest(
+                        method="PUT",
+                        url_postfix=f"{url_postfix}/{var['key']}",
+                        data=var,
+                        params=_get_variable_params(var, scoped_keys),  # type: ignore
+                    )
+                ],
+            )
+        )
+
+    # COMMENT THIS BLOCK FOR DISABLE REMOVING VARIABLES
+    for var in variables["delete"]:
+        changes.append(
+            PlannedChange(
+                entity=entity,
+                action="remove",
+                target=_get_variable_target(var),  # type: ignore
+                before=var,
+                requests=[
+                    PlannedRequest(
+                        method="DELETE",
+                        url_postfix=f"{url_postfix}/{var['key']}",
+                        params=_get_variable_params(var, scoped_keys),  # type: ignore
+                    )
+                ],
+            )
+        )
+
+    return changes
+
+
+def get_protected_branches_changes(
+    entity: str,
+    current_branches_list: list[dict[str, typing_extensions.Any]],
+    config_protected_branches: dict[str, typing_extensions.Any],
+) -> list[PlannedChange]:
+    url_postfix = f"{entity}/protected_branches"
+    current_branches = {branch["name"]: branch for branch in current_branches_list}
+
+    changes: list[PlannedChange] = []
+
+    for branch in {**current_branches, **config_protected_branches}:
+        branch_url_postfix = f"{url_postfix}/{get_urlencoded_path(branch)}"
+        target = f"protected branch {branch}"
+
+        before = (
+            parse_protected_branches([current_branches[branch]])[branch]
+            if branch in current_branches
+            else None
+        )
+
+        if branch not in config_protected_branches:
+            LOGGER.debug("REMOVE: %s not found in config", branch)
+            changes.append(
+                PlannedChange(
+                    entity=entity,
+                    action="remove",
+                    target=target,
+                    before=before,
+                    requests=[
+                        PlannedRequest(method="DELETE", url_postfix=branch_url_postfix)
+                    ],
+                )
+            )
+            continue
+
+        branch_data = {"name": branch}
+        branch_params = config_protected_branches[branch]
+        if branch_params:
+            branch_data.update(branch_params)
+
+        create_request = PlannedRequest(
+            method="POST", url_postfix=url_postfix, data=branch_data
+        )
+
+        if branch not in current_branches:
+            LOGGER.debug("CREATE: %s added to entity", branch)
+            changes.append(
+                PlannedChange(
+                    entity=entity,
+                    action="create",
+                    target=target,
+                    after=branch_params,
+                    requests=[create_request],
+                )
+            )
+            continue
+
+        patch = get_protected_branch_patch(current_branches[branch], branch_params)
+
+        if patch == {}:
+            LOGGER.debug("SKIP: %s in entity and config are equals", branch)
+        elif patch:
+            LOGGER.debug("UPDATE: %s in entity and config has diff", branch)
+            changes.append(
+                PlannedChange(
+                    entity=entity,
+                    action="update",
+                    target=target,
+                    before=before,
+                    after=branch_params,
+                    requests=[
+                        PlannedRequest(
+                            method="PATCH", url_postfix=branch_url_postfix, data=patch
+                        )
+                    ],
+                )
+            )
+        else:
+            LOGGER.debug("REMOVE: %s can't be updated in place", branch)
+            changes.append(
+                PlannedChange(
+                    entity=entity,
+                    action="recreate",
+                    target=target,
+                    before=before,
+                    after=branch_params,
+                    requests=[
+                        PlannedRequest(method="DELETE", url_postfix=branch_url_postfix),
+                        create_request,
+                    ],
+                )
+            )
+
+    return changes
@@ -1,8 +1,140 @@
+import atexit
+import copy
+import json
 import logging
 import os
+import queue
 import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
 
 import colorlog
+from typing_extensions import Any, Iterable, Iterator, Optional
+
+# context variables are local to both threads and asyncio tasks
+_BUFFER: ContextVar[list[logging.LogRecord] | None] = ContextVar(
+    "_BUFFER", default=None
+)
+
+
+class _BufferFilter(logging.Filter):
+    "Diverts records emitted inside `buffered_records` into their buffer"
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        buffer = _BUFFER.get()
+        if buffer is None:
+            return True
+
+        buffer.append(record)
+        return False
+
+
+@contextmanager
+def buffered_records() -> Iterator[list[logging.LogRecord]]:
+    """
+    Collect log records of the current thread or asyncio task instead of
+    emitting them, so the caller can replay them later with
+    `LOGGER.handle(record)` and keep the output of parallel workers
+    grouped and ordered.
+    """
+    records: list[logging.LogRecord] = []
+    token = _BUFFER.set(records)
+    try:
+        yield records
+    finally:
+        _BUFFER.reset(token)
+
+
+class LazyJson:
+    """
+    Log argument serialized only when the record is formatted:
+    `LOGGER.debug("config:\n%s", LazyJson(config))` costs nothing when
+    DEBUG is off.
+    """
+
+    __slots__ = ("obj", "indent")
+
+    def __init__(self, obj: Any, indent: Optional[int] = 2) -> None:
+        self.obj = obj
+        self.indent = indent
+
+    def __str__(self) -> str:
+        return json.dumps(self.obj, indent=self.indent, default=str)
+
+
+class IdsSummary:
+    "Log argument rendering a long ID list as its count and a sample"
+
+    __slots__ = ("ids", "sample")
+
+    def __init__(self, ids: Iterable[Any], sample: int = 10) -> None:
+        self.ids = ids
+        self.sample = sample
+
+    def __str__(self) -> str:
+        ids = list(self.ids)
+        if len(ids) <= self.sample:
+            return f"{len(ids)} {ids}"
+
+        sample = ", ".join(map(str, ids[: self.sample]))
+        return f"{len(ids)} [{sample}, ... {len(ids) - self.sample} more]"
+
+
+class JsonFormatter(logging.Formatter):
+    "One JSON object per line, for log collectors"
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "function": record.funcName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the message is rendered now, while its arguments hold the values
+        # they had at the call; exception info stays for the formatter
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class _QueueLogging:
+    """
+    Messages are rendered by the calling thread and written to stdout by a
+    listener thread, so workers never block on a slow terminal or pipe.
+    """
+
+    def __init__(self, handler: logging.Handler) -> None:
+        self.handler = handler
+        self.queue_handler = _QueueHandler(queue.SimpleQueue())
+        self._start()
+
+        atexit.register(self.stop)
+        # the listener thread doesn't survive fork, e.g. in benchmarks
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._start)
+
+    def _start(self) -> None:
+        self.queue_handler.queue = queue.SimpleQueue()
+        self.listener = QueueListener(self.queue_handler.queue, self.handler)
+        self.listener.start()
+        self.started = True
+
+    def stop(self) -> None:
+        "Flushes queued records, called at exit"
+        if self.started:
+            self.started = False
+            self.listener.stop()
 
 
 def setup_logger():
@@ -21,7 +153,10 @@ def setup_logger():
     )
 
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
+    if os.getenv("LOG_FORMAT", "") == "json":
+        console_handler.setFormatter(JsonFormatter())
+    else:
+        console_handler.setFormatter(formatter)
 
     logger = logging.getLogger(__name__)
 
@@ -29,7 +164,8 @@ def setup_logger():
     logger.setLevel(logging.DEBUG) if debug == "true" else logger.setLevel(logging.INFO)
 
     if not logger.handlers:
-        logger.addHandler(console_handler)
+        logger.addHandler(_QueueLogging(console_handler).queue_handler)
+        logger.addFilter(_BufferFilter())
 
     return logger
 
@@ -0,0 +1,291 @@
+import pytest
+
+import pivlabform.utils._helpers as _helpers
+from pivlabform.gitlab.models.entity_settings import Visibility
+
+
+def _branch(
+    push: int = 40,
+    merge: int = 40,
+    unprotect: int | None = 40,
+    allow_force_push: bool = False,
+    premium: bool = True,
+    **rule: int,
+) -> dict:
+    "Protected branch as GitLab API returns it, CE has no `code_owner_approval_required`"
+    branch = {
+        "name": "main",
+        "push_access_levels": [{"id": 1, "access_level": push, **rule}],
+        "merge_access_levels": [{"id": 2, "access_level": merge}],
+        "allow_force_push": allow_force_push,
+    }
+    if unprotect is not None:
+        branch["unprotect_access_levels"] = [{"id": 3, "access_level": unprotect}]
+    if premium:
+        branch["code_owner_approval_required"] = False
+    return branch
+
+
+@pytest.mark.parametrize(
+    "current, config, expected",
+    [
+        pytest.param(_branch(), {}, {}, id="defaults-unchanged"),
+        pytest.param(
+            _branch(),
+            {"push_access_level": 40, "merge_access_level": 40},
+            {},
+            id="configured-unchanged",
+        ),
+        pytest.param(
+            _branch(),
+            {"push_access_level": 30},
+            {"allowed_to_push": [{"id": 1, "access_level": 30}]},
+            id="premium-level-changed",
+        ),
+        pytest.param(
+            _branch(merge=30),
+            {},
+            {"allowed_to_merge": [{"id": 2, "access_level": 40}]},
+            id="premium-back-to-default",
+        ),
+        pytest.param(
+            _branch(premium=False),
+            {"push_access_level": 30},
+            None,
+            id="ce-level-changed-recreated",
+        ),
+        pytest.param(
+            _branch(premium=False),
+            {"allow_force_push": True},
+            {"allow_force_push": True},
+            id="ce-force-push-patched",
+        ),
+        pytest.param(
+            _branch(unprotect=None, premium=False),
+            {},
+            {},
+            id="ce-without-unprotect-levels",
+        ),
+        pytest.param(
+            _branch(unprotect=None, premium=False),
+            {"unprotect_access_level": 40},
+            None,
+            id="ce-configured-unprotect-level",
+        ),
+        pytest.param(
+            _branch(user_id=7),
+            {"push_access_level": 30},
+            None,
+            id="user-rule-recreated",
+        ),
+        pytest.param(
+            _branch(allow_force_push=True),
+            {"allow_force_push": None},
+            {"allow_force_push": False},
+            id="unset-value-is-default",
+        ),
+    ],
+)
+def test_get_protected_branch_patch(current, config, expected):
+    assert _helpers.get_protected_branch_patch(current, config) == expected
+
+
+@pytest.mark.parametrize(
+    "current, config, expected",
+    [
+        pytest.param({"description": "a"}, {"description": "a"}, {}, id="equal"),
+        pytest.param(
+            {"description": "a"},
+            {"description": "b"},
+            {"description": "b"},
+            id="changed",
+        ),
+        pytest.param({}, {"description": "a"}, {"description": "a"}, id="write-only"),
+        pytest.param(
+            {"description": ""}, {"description": None}, {}, id="empty-is-unset"
+        ),
+        pytest.param(
+            {"visibility": "private"},
+            {"visibility": Visibility.PRIVATE},
+            {},
+            id="enum-value",
+        ),
+        pytest.param(
+            {"policy": {"enabled": True, "cadence": "1d"}},
+            {"policy": {"enabled": True}},
+            {},
+            id="nested-partial",
+        ),
+        pytest.param(
+            {"policy": {"enabled": True}},
+            {"policy": {"enabled": False}},
+            {"policy": {"enabled": False}},
+            id="nested-changed",
+        ),
+        pytest.param(
+            {"topics": ["a", "b"]}, {"topics": ["b", "a"]}, {}, id="list-order"
+        ),
+        pytest.param(
+            {"container_expiration_policy": {"enabled": True}},
+            {"container_expiration_policy_attributes": {"enabled": True}},
+            {},
+            id="read-key",
+        ),
+        pytest.param({}, {"lfs_enabled": False}, {}, id="omitted-default"),
+        pytest.param({"topics": None}, {"topics": []}, {}, id="null-empty-list"),
+        pytest.param(
+            {"lfs_enabled": False},
+            {"lfs_enabled": True},
+            {"lfs_enabled": True},
+            id="flag-changed",
+        ),
+        pytest.param(
+            {"build_timeout": None},
+            {"build_timeout": 0},
+            {"build_timeout": 0},
+            id="zero-is-not-unset",
+        ),
+    ],
+)
+def test_get_settings_diff(current, config, expected):
+    assert _helpers.get_settings_diff(current, config) == expected
+
+
+def _var(key: str, value: str | int = "1", scope: str = "*", **flags: bool) -> dict:
+    return {"key": key, "value": value, "environment_scope": scope, **flags}
+
+
+@pytest.mark.parametrize(
+    "current, config, expected",
+    [
+        pytest.param([_var("A")], [_var("A")], [], id="unchanged"),
+        pytest.param(
+            [], [_var("A")], [("create", "variable A", "POST", {})], id="created"
+        ),
+        pytest.param(
+            [_var("A")],
+            [_var("A", "2")],
+            [("update", "variable A", "PUT", {})],
+            id="updated",
+        ),
+        pytest.param(
+            [_var("A", masked=False)],
+            [_var("A", masked=True)],
+            [("update", "variable A", "PUT", {})],
+            id="flag-updated",
+        ),
+        pytest.param(
+            [_var("A"), _var("A", scope="prod")],
+            [_var("A", "2"), _var("A", scope="prod")],
+            [("update", "variable A", "PUT", {"filter[environment_scope]": "*"})],
+            id="updated-beside-scoped",
+        ),
+        pytest.param(
+            [_var("A", scope="prod")],
+            [],
+            [
+                (
+                    "remove",
+                    "variable A (prod)",
+                    "DELETE",
+                    {"filter[environment_scope]": "prod"},
+                )
+            ],
+            id="removed-in-scope",
+        ),
+        pytest.param(
+            [_var("A", scope="prod")],
+            [_var("A", scope="prod"), _var("A", scope="dev")],
+            [("create", "variable A (dev)", "POST", {})],
+            id="scopes-apart",
+        ),
+        pytest.param([_var("A", "1")], [_var("A", 1)], [], id="number-value"),
+    ],
+)
+def test_get_variables_changes(current, config, expected):
+    changes = _helpers.get_variables_changes("projects/1", current, config)
+
+    assert [
+        (
+            change.action,
+            change.target,
+            change.requests[0].method,
+            change.requests[0].params,
+        )
+        for change in changes
+    ] == expected
+
+
+@pytest.mark.parametrize(
+    "config, inherited, kept, dropped",
+    [
+        pytest.param([_var("A")], [], ["A"], [], id="not-inherited"),
+        pytest.param([_var("A")], [_var("A")], [], ["A"], id="inherited"),
+        pytest.param([_var("A", "2")], [_var("A")], ["A"], [], id="other-value"),
+        pytest.param(
+            [_var("A", scope="prod")], [_var("A")], ["A"], [], id="other-scope"
+        ),
+        pytest.param(
+            [_var("A", protected=True)], [_var("A")], ["A"], [], id="other-flags"
+        ),
+        pytest.param(
+            [_var("A")],
+            [_var("A"), _var("A", "2")],
+            ["A"],
+            [],
+            id="inherited-twice-differently",
+        ),
+        pytest.param(
+            [_var("A"), _var("A", scope="prod")],
+            [_var("A")],
+            ["A", "A"],
+            [],
+            id="configured-twice",
+        ),
+        pytest.param(
+            [_var("A"), _var("B")], [_var("B")], ["A"], ["B"], id="partly-inherited"
+        ),
+    ],
+)
+def test_get_deduplicated_variables(config, inherited, kept, dropped):
+    result = _helpers.get_deduplicated_variables(config, inherited)
+
+    assert [[var["key"] for var in variables] for variables in result] == [
+        kept,
+        dropped,
+    ]
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("1/1", (1, 1)), ("2/4", (2, 4)), ("4/4", (4, 4))],
+)
+def test_parse_shard(value, expected):
+    assert _helpers.parse_shard(value) == expected
+
+
+@pytest.mark.parametrize("value", ["0/4", "5/4", "-1/4", "1/0", "a/b", "3", "1/2/3"])
+def test_parse_shard_invalid(value):
+    with pytest.raises(SystemExit):
+        _helpers.parse_shard(value)
+
+
+def test_get_shard():
+    # jobs of one run may use other Python versions, the split must not change
+    assert [_helpers.get_shard(f"projects/{id}", 4) for id in range(1, 9)] == [
+        1,
+        2,
+        1,
+        2,
+        3,
+        1,
+        3,
+        3,
+    ]
+
+
+@pytest.mark.parametrize("total", [1, 3, 16])
+def test_get_shard_covers_all_shards(total):
+    shards = {_helpers.get_shard(f"groups/{id}", total) for id in range(1000)}
+
+    assert shards == set(range(1, total + 1))
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from pivlabform.gitlab.gitlab import Entity
+from pivlabform.gitlab.journal import Journal
+
+HOST = "https://gitlab.example.com"
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "run.journal")
+
+
+def _crash(path: str) -> None:
+    "Journal of a run killed while writing its third record"
+    journal = Journal(path, HOST)
+    journal.record(Entity.PROJECT, 1, "settings", "a")
+    journal.record(Entity.PROJECT, 1, "variables", "a")
+    journal.close(completed=False)
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"entity": "projects/2", "reso')
+
+
+def test_replay_ignores_torn_last_line(path):
+    _crash(path)
+
+    journal = Journal(path, HOST, resume=True)
+
+    assert journal.is_done(Entity.PROJECT, 1, "settings", "a")
+    assert journal.is_done(Entity.PROJECT, 1, "variables", "a")
+    assert not journal.is_done(Entity.PROJECT, 2, "settings", "a")
+
+
+def test_record_after_torn_line_is_replayed(path):
+    _crash(path)
+
+    journal = Journal(path, HOST, resume=True)
+    journal.record(Entity.PROJECT, 2, "settings", "b")
+    journal.close(completed=False)
+
+    resumed = Journal(path, HOST, resume=True)
+
+    assert resumed.is_done(Entity.PROJECT, 2, "settings", "b")
+    assert resumed.is_done(Entity.PROJECT, 1, "settings", "a")
+
+
+@pytest.mark.parametrize(
+    "entity_type, entity, resource, fingerprint",
+    [
+        (Entity.PROJECT, 1, "settings", "changed"),
+        (Entity.GROUP, 1, "settings", "a"),
+        (Entity.PROJECT, 1, "protected_branches", "a"),
+    ],
+)
+def test_other_resources_are_not_done(path, entity_type, entity, resource, fingerprint):
+    _crash(path)
+
+    journal = Journal(path, HOST, resume=True)
+
+    assert not journal.is_done(entity_type, entity, resource, fingerprint)
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        {"version": Journal.VERSION, "host": "https://other.example.com"},
+        {"version": Journal.VERSION + 1, "host": HOST},
+    ],
+)
+def test_outdated_journal_starts_from_scratch(path, header):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(header) + "\n")
+        f.write('{"entity": "projects/1", "resource": "settings", "config": "a"}\n')
+
+    journal = Journal(path, HOST, resume=True)
+
+    assert not journal.is_done(Entity.PROJECT, 1, "settings", "a")
+
+
+def test_completed_run_removes_journal(path, tmp_path):
+    journal = Journal(path, HOST)
+    journal.record(Entity.PROJECT, 1, "settings", "a")
+    journal.close(completed=True)
+
+    assert list(tmp_path.iterdir()) == []
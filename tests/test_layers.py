@@ -0,0 +1,52 @@
+import pytest
+from typing_extensions import Any
+
+from pivlabform.gitlab.gitlab import Entity
+from pivlabform.gitlab.layers import ConfigLayers
+
+OVERRIDES: dict[str, dict[str, Any]] = {
+    "root": {"group_config": {}, "project_config": {}},
+    "root/team": {"project_config": {}},
+    "root/team/app": {"project_config": {}},
+    "root/team-b": {"group_config": {}},
+}
+
+
+@pytest.mark.parametrize(
+    "entity_type, full_path, expected",
+    [
+        (Entity.PROJECT, "root/team/app", ("root", "root/team", "root/team/app")),
+        (Entity.PROJECT, "root/team/api", ("root", "root/team")),
+        (Entity.GROUP, "root/team", ("root",)),
+        (Entity.GROUP, "root/team-b", ("root", "root/team-b")),
+        # a path prefix is not a parent group
+        (Entity.PROJECT, "root/team-b/app", ("root",)),
+        (Entity.PROJECT, "other/team/app", ()),
+    ],
+)
+def test_get_chain(entity_type, full_path, expected):
+    layers = ConfigLayers({"overrides": OVERRIDES})
+
+    assert layers.get_chain(entity_type, full_path) == expected
+
+
+def test_get_entity_config_nearest_path_last():
+    layers = ConfigLayers(
+        {
+            "project_config": {"settings": {"description": "global"}},
+            "overrides": {
+                "root": {"project_config": {"settings": {"description": "root"}}},
+                "root/app": {"project_config": {"settings": {"description": "app"}}},
+            },
+        }
+    )
+
+    assert layers.get_entity_config(Entity.PROJECT, "root/app")["settings"] == {
+        "description": "app"
+    }
+    assert layers.get_entity_config(Entity.PROJECT, "root/api")["settings"] == {
+        "description": "root"
+    }
+    assert layers.get_entity_config(Entity.PROJECT, "other/app")["settings"] == {
+        "description": "global"
+    }
@@ -0,0 +1,20 @@
+import pytest
+
+from pivlabform.gitlab.metrics import get_endpoint_template
+
+
+@pytest.mark.parametrize(
+    "url_postfix, expected",
+    [
+        ("projects/1001", "projects/:id"),
+        ("groups/my%2Fgroup/projects", "groups/:id/projects"),
+        ("projects/1001/variables/RELEASE?page=2", "projects/:id/variables/:name"),
+        ("projects/1001/variables", "projects/:id/variables"),
+        ("projects/5/protected_branches/main", "projects/:id/protected_branches/:name"),
+        ("groups/12/descendant_groups", "groups/:id/descendant_groups"),
+        ("/graphql", "graphql"),
+        ("user", "user"),
+    ],
+)
+def test_get_endpoint_template(url_postfix, expected):
+    assert get_endpoint_template(url_postfix) == expected
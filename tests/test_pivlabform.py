@@ -0,0 +1,219 @@
+import asyncio
+
+import pytest
+
+from pivlabform.gitlab.gitlab import Entity
+from pivlabform.gitlab.models import EntityMetadata, RunOptions
+from pivlabform.gitlab.transport import GitLabRequestError, record_request_error
+from pivlabform.pivlabform import Pivlabform, _run_steps, _run_steps_async
+
+HOST = "https://gitlab.example.com"
+
+CONFIG = {
+    "settings": {"description": "app"},
+    "variables": [
+        {"key": "A", "value": "1", "environment_scope": "*"},
+        {"key": "B", "value": "2", "environment_scope": "*"},
+    ],
+}
+
+
+class FakeGitLab:
+    "Project 10 in group 2 below group 1, which has variable A; records calls"
+
+    def __init__(self, fail=None, ignored=None):
+        self.fail = fail
+        # failed as with `IGNORE_REQUESTS_ERRORS`, recorded only
+        self.ignored = ignored
+        self.calls = []
+        self.metadata = {
+            1: EntityMetadata(id=1, kind="group", full_path="root"),
+            2: EntityMetadata(id=2, kind="group", full_path="root/team", parent_id=1),
+            10: EntityMetadata(
+                id=10,
+                kind="project",
+                full_path="root/team/app",
+                parent_id=2,
+                updated_at="2026-01-01T00:00:00Z",
+            ),
+        }
+        self.cached = {}
+        self.variables = {1: [CONFIG["variables"][0]], 2: []}
+
+    def _call(self, *call):
+        self.calls.append(call)
+        if call[0] == self.fail:
+            raise GitLabRequestError(f"{call[0]} failed", 500)
+        if call[0] == self.ignored:
+            record_request_error(f"{call[0]} failed")
+
+    def get_entity_metadata(self, entity_id, entity_type, refresh=False):
+        if not refresh and entity_id in self.cached:
+            return self.cached[entity_id]
+        if entity_id not in self.metadata:
+            raise LookupError(f"{entity_type.lname} {entity_id} not found")
+        return self.metadata[entity_id]
+
+    def get_group_variables(self, group_id):
+        self._call("group_variables", group_id)
+        return self.variables[group_id]
+
+    def get_entity_changes(self, entity_id, entity_type, config):
+        self._call("changes", entity_id)
+        return []
+
+    def confugure_entity(self, entity_id, entity_type, config):
+        self._call("settings", entity_id, config)
+        return True
+
+    def update_entity_variables(self, entity_id, entity_type, config_variables):
+        self._call("variables", entity_id, [var["key"] for var in config_variables])
+        return True
+
+    def update_entity_protected_branches(
+        self, entity_id, entity_type, config_protected_branches
+    ):
+        self._call("protected_branches", entity_id)
+        return False
+
+
+class AsyncFakeGitLab(FakeGitLab):
+    async def get_entity_metadata(self, *args, **kwargs):
+        return super().get_entity_metadata(*args, **kwargs)
+
+    async def get_group_variables(self, group_id):
+        return super().get_group_variables(group_id)
+
+    async def get_entity_changes(self, *args):
+        return super().get_entity_changes(*args)
+
+    async def confugure_entity(self, *args):
+        return super().confugure_entity(*args)
+
+    async def update_entity_variables(self, *args):
+        return super().update_entity_variables(*args)
+
+    async def update_entity_protected_branches(self, *args):
+        return super().update_entity_protected_branches(*args)
+
+
+@pytest.fixture(params=[FakeGitLab, AsyncFakeGitLab], ids=["sync", "async"])
+def client_class(request):
+    return request.param
+
+
+def _reconcile(pl, client, entity=10, config=CONFIG):
+    steps = pl._reconcile_steps(client, entity, Entity.PROJECT, config)
+
+    if isinstance(client, AsyncFakeGitLab):
+        return asyncio.run(_run_steps_async(steps))
+    return _run_steps(steps)
+
+
+@pytest.mark.parametrize(
+    "options, expected",
+    [
+        pytest.param(
+            {},
+            [("settings", 10, {"description": "app"}), ("variables", 10, ["A", "B"])],
+            id="apply",
+        ),
+        pytest.param(
+            {"dedup_inherited": True},
+            [
+                ("group_variables", 2),
+                ("group_variables", 1),
+                ("settings", 10, {"description": "app"}),
+                ("variables", 10, ["B"]),
+            ],
+            id="dedup-inherited",
+        ),
+        pytest.param({"plan_file": "plan.json"}, [("changes", 10)], id="plan"),
+    ],
+)
+def test_reconcile_calls(client_class, options, expected):
+    client = client_class()
+
+    _reconcile(Pivlabform(None, HOST, RunOptions(**options)), client)
+
+    assert client.calls == expected
+
+
+def test_resume_skips_journaled_resources(client_class, tmp_path):
+    journal = str(tmp_path / "run.journal")
+
+    failed = client_class(fail="variables")
+    pl = Pivlabform(None, HOST, RunOptions(journal=journal))
+    with pytest.raises(GitLabRequestError):
+        _reconcile(pl, failed)
+    pl.journal.close(completed=False)
+
+    resumed = client_class()
+    _reconcile(
+        Pivlabform(None, HOST, RunOptions(journal=journal, resume=True)), resumed
+    )
+
+    assert resumed.calls == [("variables", 10, ["A", "B"])]
+
+
+@pytest.mark.parametrize("ignored, kept", [(None, False), ("variables", True)])
+def test_journal_kept_after_ignored_request_errors(
+    client_class, tmp_path, ignored, kept
+):
+    journal = tmp_path / "run.journal"
+    pl = Pivlabform(None, HOST, RunOptions(journal=str(journal)))
+
+    _reconcile(pl, client_class(ignored=ignored))
+    pl._close_journal()
+
+    assert journal.exists() == kept
+
+
+def test_unavailable_entity_is_skipped_with_state(client_class, tmp_path):
+    client = client_class()
+    pl = Pivlabform(None, HOST, RunOptions(state_file=str(tmp_path / "state.json")))
+
+    _reconcile(pl, client, entity=404)
+
+    assert client.calls == []
+
+
+@pytest.mark.parametrize(
+    "updated_at, expected",
+    [
+        pytest.param("2026-01-01T00:00:00Z", [], id="unchanged-skipped"),
+        pytest.param(
+            "2026-01-02T00:00:00Z",
+            [("settings", 10, {"description": "app"}), ("variables", 10, ["A", "B"])],
+            id="changed-in-gitlab",
+        ),
+    ],
+)
+def test_state_skip_reads_current_metadata(
+    client_class, tmp_path, updated_at, expected
+):
+    client = client_class()
+    pl = Pivlabform(None, HOST, RunOptions(state_file=str(tmp_path / "state.json")))
+    _reconcile(pl, client)
+    client.calls.clear()
+
+    # e.g. an inventory refreshed before the entity was changed in GitLab
+    client.cached = dict(client.metadata)
+    client.metadata[10] = client.metadata[10].model_copy(
+        update={"updated_at": updated_at}
+    )
+    _reconcile(pl, client)
+
+    assert client.calls == expected
+
+
+def test_async_request_error_fails_only_the_entity():
+    client = AsyncFakeGitLab(fail="settings")
+    pl = Pivlabform(None, HOST)
+
+    records, error = asyncio.run(
+        pl._process_entity_async(client, 10, Entity.PROJECT, CONFIG)
+    )
+
+    assert error == "request failed: settings failed"
+    assert client.calls == [("settings", 10, {"description": "app"})]